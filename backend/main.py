@@ -23,6 +23,7 @@ from backend.modules.email.router import router as email_router
 from backend.routes.csp import router as csp_router
 from shared_core.middleware.auth import dev_auth
 from shared_core.middleware.supabase_auth import supabase_auth
+from shared_core.modules.agent_orchestrator.router import get_orchestrator
 from shared_core.modules.agent_orchestrator.router import router as agent_orchestrator_router
 from shared_core.modules.ai.router import router as ai_router
 from shared_core.modules.clients.router import router as clients_router
@@ -32,7 +33,7 @@ from shared_core.modules.notion.router import router as notion_router
 from shared_core.modules.ocr.router import router as ocr_router
 from shared_core.modules.receipts.router import router as receipts_router
 from shared_core.modules.supabase.router import router as supabase_router
-from shared_core.utils.db import Base, engine
+from shared_core.utils.db import Base, engine, upgrade_schema
 
 settings = get_settings()
 logger = logging.getLogger("converto.backend")
@@ -103,8 +104,12 @@ async def lifespan(_: FastAPI) -> AsyncIterator[None]:
     configure_logging()
     logger.info("Ensuring database schema is up to date")
     Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
     logger.info("Database schema ready")
+    workflow_engine = get_orchestrator().workflow_engine
+    await workflow_engine.start()
     yield
+    await workflow_engine.close()
 
 
 def create_app() -> FastAPI:
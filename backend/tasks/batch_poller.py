@@ -0,0 +1,53 @@
+"""Batch poller: keeps OpenAI Batch API jobs moving across restarts.
+
+Usage:
+    python -m backend.tasks.batch_poller            # run forever
+    python -m backend.tasks.batch_poller --once     # poll pending groups once (cron)
+
+Groups submitted with ``on_complete`` enqueue their outbox event when they
+finish; results are read with ``OpenAIBatchProcessor.collect(group_id)``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+
+from shared_core.modules.ai.batch import POLL_INTERVAL_S, OpenAIBatchProcessor
+
+LOGGER = logging.getLogger("converto.tasks.batch_poller")
+
+
+def _configure_logging() -> None:
+    if logging.getLogger().handlers:
+        return
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    )
+
+
+async def run(once: bool = False, interval: float = POLL_INTERVAL_S) -> None:
+    processor = OpenAIBatchProcessor()
+    while True:
+        finished = await processor.poll_pending()
+        if finished:
+            LOGGER.info("batch groups finished: %s", ", ".join(finished))
+        if once:
+            return
+        await asyncio.sleep(interval)
+
+
+def main() -> None:
+    _configure_logging()
+    parser = argparse.ArgumentParser(description="Poll pending OpenAI batch jobs")
+    parser.add_argument("--once", action="store_true", help="Poll once and exit")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL_S)
+    args = parser.parse_args()
+    asyncio.run(run(once=args.once, interval=args.interval))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Orchestrator worker: runs workflow steps published to Redis Streams.
+
+Usage:
+    ORCHESTRATOR_BACKEND=redis python -m backend.tasks.orchestrator_worker
+    ORCHESTRATOR_BACKEND=redis python -m backend.tasks.orchestrator_worker --concurrency 32
+
+Run as many workers (on as many nodes) as needed; they share the
+``orchestrator-workers`` consumer group. The API must run with the same
+``ORCHESTRATOR_BACKEND=redis`` / ``REDIS_URL`` settings.
+
+Set ORCHESTRATOR_METRICS_PORT to expose Prometheus metrics from the worker.
+SIGTERM/SIGINT stop reading new steps and let running steps finish.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import sys
+
+from prometheus_client import start_http_server
+
+from shared_core.modules.agent_orchestrator.distributed import WORKER_CONCURRENCY, StepWorker
+from shared_core.modules.agent_orchestrator.router import get_orchestrator
+
+LOGGER = logging.getLogger("converto.tasks.orchestrator_worker")
+
+
+def _configure_logging() -> None:
+    if logging.getLogger().handlers:
+        return
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    )
+
+
+async def run(concurrency: int = WORKER_CONCURRENCY, consumer: str | None = None) -> int:
+    engine = get_orchestrator().workflow_engine
+    if engine.backend is None:
+        LOGGER.error("ORCHESTRATOR_BACKEND=redis is required for the orchestrator worker")
+        return 1
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    worker = StepWorker(engine, engine.backend, consumer=consumer, concurrency=concurrency)
+    await worker.run(stop)
+    await engine.events.close()
+    return 0
+
+
+def main() -> None:
+    _configure_logging()
+    parser = argparse.ArgumentParser(description="Run workflow steps from Redis Streams")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY)
+    parser.add_argument("--consumer", default=None, help="Consumer name (default: host-pid)")
+    args = parser.parse_args()
+
+    metrics_port = os.getenv("ORCHESTRATOR_METRICS_PORT")
+    if metrics_port:
+        start_http_server(int(metrics_port))
+        LOGGER.info("Orchestrator worker metrics on :%s", metrics_port)
+
+    sys.exit(asyncio.run(run(concurrency=args.concurrency, consumer=args.consumer)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Outbox dispatcher worker: runs post-commit side effects in batches.
+
+Usage:
+    python -m backend.tasks.outbox_dispatcher            # run forever
+    python -m backend.tasks.outbox_dispatcher --once     # drain one batch (cron)
+
+Set OUTBOX_METRICS_PORT to expose Prometheus lag metrics from the worker.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+
+from prometheus_client import start_http_server
+
+from shared_core.modules.outbox import dispatch_batch, lag_stats
+from shared_core.utils.db import SessionLocal
+
+LOGGER = logging.getLogger("converto.tasks.outbox_dispatcher")
+
+BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+POLL_INTERVAL_S = float(os.getenv("OUTBOX_POLL_INTERVAL_S", "1.0"))
+STATS_EVERY_S = 30.0
+
+
+def _configure_logging() -> None:
+    if logging.getLogger().handlers:
+        return
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    )
+
+
+async def run(once: bool = False, batch_size: int = BATCH_SIZE) -> None:
+    loop = asyncio.get_running_loop()
+    last_stats = 0.0
+    while True:
+        with SessionLocal() as db:
+            handled = await dispatch_batch(db, batch_size)
+            now = loop.time()
+            if once or now - last_stats >= STATS_EVERY_S:
+                stats = lag_stats(db)
+                LOGGER.info("outbox stats: %s", stats)
+                last_stats = now
+        if once:
+            return
+        if handled < batch_size:
+            await asyncio.sleep(POLL_INTERVAL_S)
+
+
+def main() -> None:
+    _configure_logging()
+    parser = argparse.ArgumentParser(description="Dispatch transactional outbox events")
+    parser.add_argument("--once", action="store_true", help="Process one batch and exit")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    metrics_port = os.getenv("OUTBOX_METRICS_PORT")
+    if metrics_port:
+        start_http_server(int(metrics_port))
+        LOGGER.info("Outbox metrics on :%s", metrics_port)
+
+    asyncio.run(run(once=args.once, batch_size=args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+/**
+ * React hook for live workflow execution status.
+ * Subscribes to the orchestrator's Server-Sent Events stream instead of
+ * polling GET /api/v1/agent-orchestrator/workflows/{id}/status.
+ */
+import { useEffect, useState } from 'react';
+
+export interface WorkflowStepState {
+  step_id: string;
+  agent_id: string;
+  status: string;
+  error: string | null;
+}
+
+export interface WorkflowState {
+  execution_id: string;
+  status: string;
+  error: string | null;
+  queue_position?: number | null;
+  steps: WorkflowStepState[];
+}
+
+interface WorkflowEvent {
+  event: 'workflow' | 'step';
+  execution_id: string;
+  status: string;
+  error: string | null;
+  completed_steps: number;
+  total_steps: number;
+  step?: WorkflowStepState;
+}
+
+const TERMINAL_STATUSES = ['completed', 'failed', 'cancelled'];
+
+export function useWorkflowEvents(executionId: string | null) {
+  const [state, setState] = useState<WorkflowState | null>(null);
+  const [connected, setConnected] = useState(false);
+  const [error, setError] = useState<Error | null>(null);
+
+  useEffect(() => {
+    if (!executionId) return;
+
+    const apiUrl = process.env.NEXT_PUBLIC_API_URL || 'https://api.converto.fi';
+    const source = new EventSource(
+      `${apiUrl}/api/v1/agent-orchestrator/workflows/${executionId}/events`
+    );
+    let finished = false;
+
+    const applyEvent = (event: WorkflowEvent) => {
+      setState((prev) => {
+        if (!prev) return prev;
+        const steps = event.step
+          ? prev.steps.map((s) => (s.step_id === event.step!.step_id ? event.step! : s))
+          : prev.steps;
+        return { ...prev, status: event.status, error: event.error, queue_position: null, steps };
+      });
+      if (event.event === 'workflow' && TERMINAL_STATUSES.includes(event.status)) {
+        finished = true;
+        source.close();
+        setConnected(false);
+      }
+    };
+
+    source.addEventListener('snapshot', (e) => {
+      const snapshot = JSON.parse((e as MessageEvent).data) as WorkflowState;
+      setState(snapshot);
+      setConnected(true);
+      setError(null);
+      if (TERMINAL_STATUSES.includes(snapshot.status)) {
+        finished = true;
+        source.close();
+        setConnected(false);
+      }
+    });
+    source.addEventListener('workflow', (e) => applyEvent(JSON.parse((e as MessageEvent).data)));
+    source.addEventListener('step', (e) => applyEvent(JSON.parse((e as MessageEvent).data)));
+
+    source.onerror = () => {
+      // Server closes the stream after the final event; EventSource reconnects otherwise
+      if (finished) return;
+      setConnected(false);
+      setError(new Error('Workflow event stream interrupted, reconnecting'));
+    };
+
+    return () => {
+      source.close();
+    };
+  }, [executionId]);
+
+  return { state, connected, error };
+}
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""Fill ``receipts.search_text`` for rows stored before the search column existed.
+
+Rows without ``search_text`` never match the ``q`` filter of the receipts
+listing. Adds the column first on databases that predate it (see
+``shared_core.utils.db.upgrade_schema``). Safe to re-run; only rows where
+the column is NULL are touched:
+
+    DATABASE_URL=postgresql+psycopg://... python scripts/backfill_receipt_search_text.py
+"""
+
+import argparse
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, ".")
+
+from shared_core.modules.receipts.store import backfill_search_text
+from shared_core.utils.db import SessionLocal, upgrade_schema
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    upgrade_schema()
+    with SessionLocal() as db:
+        updated = backfill_search_text(db, batch_size=args.batch_size)
+    print(f"search_text filled for {updated} receipts")
+
+
+if __name__ == "__main__":
+    main()
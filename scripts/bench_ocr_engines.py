@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""OCR engine benchmark - throughput, latency and receipt field accuracy.
+
+Runs a labeled receipt corpus through each OCR engine and the local field
+extractor (``shared_core.modules.ocr.extract``). The corpus is a directory of
+images plus ``labels.jsonl`` with one object per image:
+
+    {"file": "kmarket_01.jpg", "vendor": "K-Market", "total_amount": 12.40,
+     "receipt_date": "2025-01-02", "vat_rate": 14.0}
+
+Only the fields present in a label are scored. Example:
+
+    python scripts/bench_ocr_engines.py corpus/ --engines pytesseract,tesserocr,onnx
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, ".")
+
+from shared_core.modules.ocr.engines import ENGINES, get_engine
+from shared_core.modules.ocr.extract import extract_receipt
+
+FIELDS = ("vendor", "business_id", "receipt_date", "total_amount", "vat_amount", "vat_rate")
+
+
+def load_corpus(root: Path) -> list[tuple[bytes, dict]]:
+    corpus = []
+    with open(root / "labels.jsonl", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                label = json.loads(line)
+                corpus.append(((root / label["file"]).read_bytes(), label))
+    return corpus
+
+
+def field_matches(field: str, expected, got) -> bool:
+    if got is None:
+        return False
+    if field in ("total_amount", "vat_amount", "vat_rate"):
+        return abs(float(got) - float(expected)) <= 0.011
+    if field == "vendor":
+        return str(expected).lower() in str(got).lower()
+    return str(got) == str(expected)
+
+
+def bench_engine(name: str, corpus: list[tuple[bytes, dict]], workers: int, warmup: int) -> dict:
+    engine = get_engine(name)
+    for img, _ in corpus[:warmup]:
+        extract_receipt(img, engine)
+
+    def _one(item: tuple[bytes, dict]) -> tuple[float, dict]:
+        t0 = time.perf_counter()
+        result = extract_receipt(item[0], engine)
+        return (time.perf_counter() - t0) * 1000, result
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        runs = list(pool.map(_one, corpus))
+    wall = time.perf_counter() - t0
+
+    hits = {f: 0 for f in FIELDS}
+    seen = {f: 0 for f in FIELDS}
+    for (_, result), (_, label) in zip(runs, corpus):
+        for f in FIELDS:
+            if f in label:
+                seen[f] += 1
+                hits[f] += field_matches(f, label[f], result.get(f))
+
+    timings = sorted(ms for ms, _ in runs)
+    q = statistics.quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+    scored = sum(seen.values())
+    return {
+        "engine": name,
+        "images": len(corpus),
+        "throughput_per_s": len(corpus) / wall if wall else 0.0,
+        "p50_ms": q[49],
+        "p95_ms": q[94],
+        "p99_ms": q[98],
+        "accuracy": sum(hits.values()) / scored if scored else 0.0,
+        "field_accuracy": {f: hits[f] / seen[f] for f in FIELDS if seen[f]},
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark OCR engines on a labeled corpus")
+    parser.add_argument("corpus", type=Path, help="Directory with images and labels.jsonl")
+    parser.add_argument("--engines", default="pytesseract", help=f"Comma list of {sorted(ENGINES)}")
+    parser.add_argument("--workers", type=int, default=1, help="Concurrent images per engine")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed images per engine")
+    parser.add_argument("--min-accuracy", type=float, default=None, help="Accuracy bar (0-1)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        print("❌ Empty corpus")
+        return 1
+
+    results = []
+    for name in [e.strip() for e in args.engines.split(",") if e.strip()]:
+        try:
+            results.append(bench_engine(name, corpus, args.workers, args.warmup))
+        except RuntimeError as e:
+            print(f"⚠️  {name}: {e}")
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"\n📊 {len(corpus)} images, {args.workers} worker(s)")
+        for r in results:
+            fields = "  ".join(f"{f}={a:.0%}" for f, a in r["field_accuracy"].items())
+            print(
+                f"   {r['engine']:<12} {r['throughput_per_s']:6.2f} img/s   "
+                f"p50 {r['p50_ms']:7.1f} ms  p95 {r['p95_ms']:7.1f} ms  p99 {r['p99_ms']:7.1f} ms   "
+                f"accuracy {r['accuracy']:.1%}"
+            )
+            print(f"   {'':<12} {fields}")
+
+    eligible = [
+        r for r in results if args.min_accuracy is None or r["accuracy"] >= args.min_accuracy
+    ]
+    if not eligible:
+        print(f"❌ No engine meets accuracy {args.min_accuracy}")
+        return 1
+    best = max(eligible, key=lambda r: r["throughput_per_s"])
+    print(f"✅ Fastest engine meeting the bar: {best['engine']} (OCR_ENGINE={best['engine']})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
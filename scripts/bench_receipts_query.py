@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""Receipts listing benchmark - keyset pagination, filters and vendor search.
+
+Seeds a single tenant with N receipts (default 1M) and measures latency of
+``shared_core.modules.receipts.store.list_receipts`` for a mix of realistic
+dashboard queries. Run against PostgreSQL to validate the p95 target:
+
+    DATABASE_URL=postgresql+psycopg://... python scripts/bench_receipts_query.py --rows 1000000
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import date, timedelta
+
+# Add parent directory to path for imports
+sys.path.insert(0, ".")
+
+from shared_core.modules.receipts.models import UUID_DEFAULT, Receipt
+from shared_core.modules.receipts.store import build_search_text, list_receipts
+from shared_core.utils.db import Base, SessionLocal, engine, upgrade_schema
+
+VENDORS = ["K-Market", "S-Market", "Prisma", "Shell", "Neste", "Verkkokauppa", "Apteekki", "Alko"]
+ITEMS = ["Kahvi", "Maito", "Leipä", "Diesel", "Bensiini", "Näppäimistö", "Särkylääke", "Paperi"]
+CATEGORIES = ["groceries", "transportation", "technology", "healthcare", "other"]
+STATUSES = ["processed", "reviewed", "approved", "rejected"]
+
+
+def seed(tenant_id: str, rows: int, chunk: int = 10_000) -> None:
+    """Insert synthetic receipts with executemany-sized chunks."""
+    start = date.today() - timedelta(days=3 * 365)
+    table = Receipt.__table__
+    inserted = 0
+    t0 = time.perf_counter()
+    with engine.begin() as conn:
+        while inserted < rows:
+            batch = []
+            for _ in range(min(chunk, rows - inserted)):
+                vendor = f"{random.choice(VENDORS)} {random.randint(1, 500)}"
+                items = [{"name": random.choice(ITEMS)} for _ in range(random.randint(1, 4))]
+                total = round(random.uniform(1, 2000), 2)
+                batch.append(
+                    {
+                        "id": UUID_DEFAULT(),
+                        "tenant_id": tenant_id,
+                        "vendor": vendor,
+                        "total_amount": total,
+                        "vat_amount": round(total * 0.2, 2),
+                        "vat_rate": 25.5,
+                        "receipt_date": start + timedelta(days=random.randint(0, 3 * 365)),
+                        "items": items,
+                        "confidence": 0.9,
+                        "category": random.choice(CATEGORIES),
+                        "status": random.choice(STATUSES),
+                        "search_text": build_search_text(vendor, items),
+                    }
+                )
+            conn.execute(table.insert(), batch)
+            inserted += len(batch)
+            print(f"  seeded {inserted}/{rows}", end="\r")
+    print(f"\n✅ Seeded {rows} receipts in {time.perf_counter() - t0:.1f}s")
+
+
+def random_query(tenant_id: str) -> dict:
+    kind = random.choice(["latest", "category", "status", "range", "amount", "search", "deep"])
+    params: dict = {"limit": 50}
+    if kind == "category":
+        params["category"] = random.choice(CATEGORIES)
+    elif kind == "status":
+        params["status"] = random.choice(STATUSES)
+    elif kind == "range":
+        d = date.today() - timedelta(days=random.randint(30, 900))
+        params["date_from"], params["date_to"] = d, d + timedelta(days=30)
+    elif kind == "amount":
+        lo = random.uniform(1, 1500)
+        params["min_amount"], params["max_amount"] = lo, lo + 100
+    elif kind == "search":
+        params["q"] = random.choice(VENDORS + ITEMS).lower()[:5]
+    params["_deep"] = kind == "deep"
+    return params
+
+
+def run(tenant_id: str, iterations: int) -> list[float]:
+    timings: list[float] = []
+    db = SessionLocal()
+    try:
+        for _ in range(iterations):
+            params = random_query(tenant_id)
+            deep = params.pop("_deep")
+            t0 = time.perf_counter()
+            rows, cursor = list_receipts(db, tenant_id, **params)
+            # Deep pagination: follow the cursor a few pages to show constant cost
+            if deep:
+                for _ in range(5):
+                    if not cursor:
+                        break
+                    t0 = time.perf_counter()
+                    rows, cursor = list_receipts(db, tenant_id, limit=50, cursor=cursor)
+            timings.append((time.perf_counter() - t0) * 1000)
+    finally:
+        db.close()
+    return timings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark receipts listing queries")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Receipts to seed")
+    parser.add_argument("--iterations", type=int, default=500, help="Queries to time")
+    parser.add_argument("--tenant", default=None, help="Reuse an already seeded tenant")
+    parser.add_argument("--p95-target-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    tenant_id = args.tenant or f"bench_{uuid.uuid4().hex[:8]}"
+    if not args.tenant:
+        seed(tenant_id, args.rows)
+        if engine.url.get_backend_name().startswith("postgres"):
+            with engine.begin() as conn:
+                conn.exec_driver_sql("ANALYZE receipts")
+
+    run(tenant_id, 20)  # warm up caches
+    timings = sorted(run(tenant_id, args.iterations))
+    q = statistics.quantiles(timings, n=100)
+    print(f"\n📊 {len(timings)} queries on tenant {tenant_id}")
+    print(f"   p50: {q[49]:.2f} ms   p95: {q[94]:.2f} ms   p99: {q[98]:.2f} ms")
+    print(f"   max: {timings[-1]:.2f} ms")
+
+    if q[94] > args.p95_target_ms:
+        print(f"❌ p95 above target {args.p95_target_ms} ms")
+        return 1
+    print(f"✅ p95 within target {args.p95_target_ms} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Local vector store benchmark - HNSW recall and latency against exact search.
+
+Fills a throwaway ``LocalVectorStore`` with clustered random vectors (a rough
+stand-in for embeddings of similar receipts/decisions), then runs the same
+queries through exact NumPy search and the HNSW index and reports
+recall@k plus p50/p95/p99 latency for both. HNSW needs ``hnswlib``:
+
+    pip install hnswlib
+    python scripts/bench_vector_store.py --rows 100000 --dim 1536 --min-recall 0.95
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.insert(0, ".")
+
+from shared_core.modules.finance_agent import vector_store
+from shared_core.modules.finance_agent.vector_store import LocalVectorStore
+
+CONTENT_TYPES = ["decision", "positive_decision", "receipt"]
+
+
+def seed(
+    store: LocalVectorStore, rows: int, dim: int, clusters: int, chunk: int = 10_000
+) -> np.ndarray:
+    rng = np.random.default_rng(42)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    t0 = time.perf_counter()
+    for start in range(0, rows, chunk):
+        n = min(chunk, rows - start)
+        labels = rng.integers(0, clusters, n)
+        block = centers[labels] + 0.35 * rng.normal(size=(n, dim)).astype(np.float32)
+        store.upsert(
+            [
+                (f"m{start + i}", block[i], {"content_type": CONTENT_TYPES[(start + i) % 3]})
+                for i in range(n)
+            ]
+        )
+        print(f"  seeded {start + n}/{rows}", end="\r")
+    print(f"\n✅ Seeded {rows} vectors in {time.perf_counter() - t0:.1f}s")
+    return centers
+
+
+def timed(store: LocalVectorStore, queries: np.ndarray, k: int, exact: bool, types):
+    hits, timings = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        res = store.query(q, top_k=k, content_types=types, exact=exact)
+        timings.append((time.perf_counter() - t0) * 1000)
+        hits.append({r["id"] for r in res})
+    return hits, sorted(timings)
+
+
+def report(name: str, timings: list) -> None:
+    q = statistics.quantiles(timings, n=100)
+    print(f"   {name:<6} p50: {q[49]:.2f} ms   p95: {q[94]:.2f} ms   p99: {q[98]:.2f} ms")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark local vector store search")
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--content-type", default=None, help="Also filter on content_type")
+    parser.add_argument("--dir", default=None, help="Store directory (default: temp dir)")
+    parser.add_argument("--min-recall", type=float, default=0.9)
+    args = parser.parse_args()
+
+    try:
+        import hnswlib  # noqa: F401
+    except ImportError:
+        print("❌ hnswlib not installed: HNSW search falls back to exact, nothing to compare")
+        return 1
+
+    directory = args.dir or tempfile.mkdtemp(prefix="bench_vectors_")
+    store = LocalVectorStore("bench", directory=directory)
+    centers = seed(store, args.rows, args.dim, args.clusters)
+    print(f"   store: {os.path.join(directory, 'bench')}")
+
+    rng = np.random.default_rng(7)
+    picks = rng.integers(0, args.clusters, args.queries)
+    queries = centers[picks] + 0.35 * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+    types = [args.content_type] if args.content_type else None
+
+    vector_store.HNSW_MIN_ROWS = 0
+    t0 = time.perf_counter()
+    store.query(queries[0], top_k=1)  # builds / loads the HNSW graph
+    print(f"   HNSW build/load: {time.perf_counter() - t0:.1f}s")
+
+    truth, exact_ms = timed(store, queries, args.k, True, types)
+    approx, approx_ms = timed(store, queries, args.k, False, types)
+    recall = sum(len(t & a) / max(len(t), 1) for t, a in zip(truth, approx)) / len(truth)
+
+    print(f"\n📊 {args.queries} queries, k={args.k}, {args.rows} x {args.dim}")
+    report("exact", exact_ms)
+    report("hnsw", approx_ms)
+    print(f"   recall@{args.k}: {recall:.4f}")
+
+    if recall < args.min_recall:
+        print(f"❌ recall below {args.min_recall} (raise VECTOR_HNSW_EF_SEARCH?)")
+        return 1
+    print(f"✅ recall ≥ {args.min_recall}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,6 +9,7 @@ import sys
 # Add parent directory to path for imports
 sys.path.insert(0, ".")
 
+from shared_core.modules.agent_orchestrator.events import TERMINAL_STATUSES
 from shared_core.modules.agent_orchestrator.orchestrator import AgentOrchestrator
 from shared_core.modules.agent_orchestrator.router import _register_default_agents
 
@@ -72,31 +73,44 @@ async def run_workflow(args):
     print(f"   Created: {execution.created_at}")
     print()
 
-    # Poll for completion
+    # Follow status events until the workflow finishes
     if args.wait:
         print("⏳ Waiting for completion...")
-        max_wait = 60  # seconds
-        start_time = asyncio.get_event_loop().time()
-
-        while (asyncio.get_event_loop().time() - start_time) < max_wait:
-            await asyncio.sleep(1)
-            exec_status = orchestrator.get_workflow_status(execution.execution_id)
-
-            if exec_status in ["completed", "failed"]:
-                result = orchestrator.get_workflow_result(execution.execution_id)
-                print(f"\n✅ Workflow {exec_status}!")
-                if result:
-                    print(f"   Result: {json.dumps(result, indent=2)}")
-                break
+        engine = orchestrator.workflow_engine
+        status_icons = {"running": "🔄", "completed": "✅", "failed": "❌", "skipped": "⏭️"}
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + args.timeout
+
+        async with engine.events.subscribe(execution.execution_id) as subscription:
+            # Tilanne tilauksen alkaessa - workflow on voinut jo valmistua
+            current = await engine.get_execution(execution.execution_id)
+            exec_status = current.status.value if current else None
+
+            while exec_status not in TERMINAL_STATUSES and loop.time() < deadline:
+                event = await subscription.get(timeout=deadline - loop.time())
+                if event is None:
+                    continue
+                if event["event"] == "step":
+                    step = event["step"]
+                    icon = status_icons.get(step["status"], "❓")
+                    print(f"   {icon} {step['step_id']} ({step['agent_id']}) - {step['status']}")
+                exec_status = event["status"]
+
+        if exec_status in TERMINAL_STATUSES:
+            result = await orchestrator.get_workflow_result(execution.execution_id)
+            print(f"\n✅ Workflow {exec_status}!")
+            if result:
+                print(f"   Result: {json.dumps(result, indent=2)}")
         else:
             print("\n⏱️  Timeout waiting for completion")
+        await engine.close()
 
 
 async def get_status(args):
     """Get workflow execution status."""
     orchestrator = setup_orchestrator()
 
-    execution = orchestrator.workflow_engine.get_execution(args.execution_id)
+    execution = await orchestrator.workflow_engine.get_execution(args.execution_id)
 
     if not execution:
         print(f"❌ Execution not found: {args.execution_id}")
@@ -173,6 +187,9 @@ def main():
     run_parser.add_argument("--name", help="Execution name")
     run_parser.add_argument("--variables", help="Initial variables (JSON)")
     run_parser.add_argument("--wait", action="store_true", help="Wait for completion")
+    run_parser.add_argument(
+        "--timeout", type=float, default=60, help="Seconds to wait with --wait (default: 60)"
+    )
     run_parser.set_defaults(func=run_workflow)
 
     # Get status
@@ -4,7 +4,7 @@ This module provides multi-agent workflow orchestration, allowing different
 AI agents to work together in coordinated workflows.
 """
 
-from .agent_registry import AgentMetadata, AgentRegistry
+from .agent_registry import AgentMetadata, AgentPriority, AgentRegistry
 from .inter_agent_comm import InterAgentMessaging, MessageType
 from .orchestrator import AgentOrchestrator
 from .workflow_engine import WorkflowEngine, WorkflowStatus, WorkflowTemplate
@@ -13,6 +13,7 @@ __all__ = [
     "AgentOrchestrator",
     "AgentRegistry",
     "AgentMetadata",
+    "AgentPriority",
     "WorkflowEngine",
     "WorkflowTemplate",
     "WorkflowStatus",
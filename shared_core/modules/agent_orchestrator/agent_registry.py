@@ -22,6 +22,15 @@ class AgentType(str, Enum):
     INVOICE = "invoice"
 
 
+class AgentPriority(str, Enum):
+    """Agent priority levels."""
+
+    LOW = "low"
+    NORMAL = "normal"
+    HIGH = "high"
+    CRITICAL = "critical"
+
+
 @dataclass
 class AgentMetadata:
     """Metadata for an agent."""
@@ -43,10 +52,18 @@ class AgentMetadata:
     fallback_agent_id: str | None = None  # Fallback agent if this one fails
     max_retries: int = 3  # Maximum retry attempts
     timeout_ms: int = 30000  # Timeout in milliseconds
+    max_concurrency: int | None = None  # In-flight executions across all workflows (None = no limit)
+    cacheable: bool = False  # Same input (and version) -> same result; enables the step cache
+    cache_ttl_s: int | None = None  # Step cache TTL (None = STEP_CACHE_TTL_S)
+    cache_variables: list[str] = None  # Workflow variables read from context, part of the cache key
+    hedge_percentile: float | None = None  # Hedge calls still running past this latency quantile
+    hedge_budget: float = 0.05  # Max share of calls that may launch a hedge
 
     def __post_init__(self):
         if self.tags is None:
             self.tags = []
+        if self.cache_variables is None:
+            self.cache_variables = []
 
 
 class Agent(ABC):
@@ -75,6 +92,25 @@ class Agent(ABC):
         """Validate input data for the agent."""
         pass
 
+    async def execute_hedge(
+        self, input_data: dict[str, Any], context: dict[str, Any]
+    ) -> dict[str, Any]:
+        """Hedge attempt raced against a call that runs slower than usual.
+
+        Defaults to a duplicate :meth:`execute`; agents with a cheaper
+        (possibly less accurate) path override this and mark the result
+        ``"degraded": True``.
+        """
+        return await self.execute(input_data, context)
+
+    def cache_identity(self, input_data: dict[str, Any]) -> Any:
+        """Value identifying the input for the step result cache.
+
+        Cacheable agents whose input refers to external state (e.g. a file
+        path) override this to include a fingerprint of that state.
+        """
+        return input_data
+
 
 class AgentRegistry:
     """Registry for managing agents in the system."""
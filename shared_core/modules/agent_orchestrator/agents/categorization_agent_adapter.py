@@ -69,6 +69,34 @@ class CategorizationAgentAdapter(Agent):
             logger.error(f"Categorization Agent execution failed: {e}")
             raise
 
+    async def execute_hedge(
+        self, input_data: dict[str, Any], context: dict[str, Any]
+    ) -> dict[str, Any]:
+        """Rule-based categorization raced against a slow AI call.
+
+        Args:
+            input_data: Input data (receipt_data, merchant_name, items)
+            context: Execution context
+
+        Returns:
+            Categorization result marked as degraded
+        """
+        receipt_data = input_data.get("receipt_data", {})
+        merchant_name = input_data.get("merchant_name") or receipt_data.get("merchant_name", "")
+        items = input_data.get("items") or receipt_data.get("items", [])
+        ocr_text = input_data.get("ocr_text") or receipt_data.get("ocr_text", "")
+
+        category, tags = self._categorize_rule_based(merchant_name, items, ocr_text)
+        return {
+            "category": category,
+            "tags": tags,
+            "confidence": 0.6,
+            "merchant_name": merchant_name,
+            "suggested_tags": self._suggest_tags(category, merchant_name, items),
+            "success": True,
+            "degraded": True,
+        }
+
     async def _categorize_with_ai(
         self, merchant_name: str, items: list[dict[str, Any]], ocr_text: str
     ) -> tuple[str | None, list[str], float]:
@@ -244,11 +272,20 @@ Respond with JSON:
                     "tags": {"type": "array", "description": "List of tags"},
                     "confidence": {"type": "number", "description": "Categorization confidence"},
                     "suggested_tags": {"type": "array", "description": "Suggested additional tags"},
+                    "degraded": {
+                        "type": "boolean",
+                        "description": "Rule-based result returned by a hedge",
+                    },
                 },
             },
             dependencies=["ocr_agent"],  # Depends on OCR for text
             cost_per_request=0.001,  # OpenAI API cost
             avg_response_time_ms=1500,
+            max_concurrency=8,  # Shared OpenAI quota
+            cacheable=True,
+            cache_ttl_s=3600,
+            hedge_percentile=0.95,  # Rule-based hedge costs nothing
+            hedge_budget=0.2,
         )
 
     async def validate_input(self, input_data: dict[str, Any]) -> bool:
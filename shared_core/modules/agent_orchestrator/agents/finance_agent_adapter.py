@@ -3,8 +3,11 @@
 import logging
 from typing import Any, Dict, Optional
 
-from shared_core.modules.finance_agent.service import FinanceAgentService
-from shared_core.modules.finance_agent.models import AgentContextRequest
+from shared_core.modules.finance_agent.service import (
+    FinanceAgentService,
+    get_finance_agent_service,
+)
+from shared_core.modules.receipts.features import get_spending_features
 
 from ..agent_registry import Agent, AgentMetadata, AgentType
 
@@ -21,12 +24,9 @@ class FinanceAgentAdapter(Agent):
 
     @property
     def service(self) -> FinanceAgentService:
-        """Get or create FinanceAgentService instance."""
+        """Get the shared per-tenant FinanceAgentService."""
         if self._service is None:
-            self._service = FinanceAgentService(
-                tenant_id=self.tenant_id,
-                user_id=self.user_id
-            )
+            self._service = get_finance_agent_service(self.tenant_id)
         return self._service
 
     async def execute(self, input_data: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
@@ -50,40 +50,43 @@ class FinanceAgentAdapter(Agent):
                 if not db:
                     raise ValueError("Database session not available")
 
-            # Analyze receipts
-            days_back = input_data.get("days_back", 30)
-            insights = self.service.analyze_receipts(db, days_back=days_back)
-
-            # Convert insights to dict
-            insights_data = [
-                    {
-                        "type": insight.type,
-                        "title": insight.title,
-                        "description": insight.description,
-                        "confidence": insight.confidence,
-                        "metadata": insight.metadata,
+            variables = context.get("workflow_variables") or {}
+            tenant_id = variables.get("tenant_id") or self.tenant_id
+            service = (
+                self.service if tenant_id == self.tenant_id else get_finance_agent_service(tenant_id)
+            )
+            days_back = int(input_data.get("days_back") or variables.get("days_back") or 30)
+            features = get_spending_features(db, tenant_id)
+
+            # Deductible breakdown for the tax workflow: answered from the feature store
+            if "expenses" in input_data:
+                window = features.window(days_back)
+                return {
+                    "deductibles": {
+                        "period_days": days_back,
+                        "totals": window["deductible"],
+                        "by_vat_rate": window["deductible_by_vat_rate"],
                     }
-                    for insight in insights
-                ]
-            else:
-                insights_data = []
-
-            # Detect spending alerts
-            alerts = self.service.detect_spending_alerts(db)
-            alerts_data = [
-                {
-                    "type": alert.type,
-                    "message": alert.message,
-                    "severity": alert.severity,
-                    "metadata": alert.metadata,
                 }
-                for alert in alerts
-            ]
+
+            # Analyze receipts
+            insights = await service.analyze_receipts(
+                db, days_back=days_back, user_id=self.user_id
+            )
+            alerts = service.detect_spending_alerts(db)
 
             return {
-                "insights": insights_data,
-                "alerts": alerts_data,
+                "insights": [insight.dict() for insight in insights],
+                "alerts": [alert.dict() for alert in alerts],
+                "expenses": {
+                    **features.window(days_back),
+                    "recurring_vendors": features.recurring_vendors(),
+                },
                 "recommendations": [
+                    (insight.metadata or {}).get("recommendation")
+                    for insight in insights
+                    if (insight.metadata or {}).get("recommendation")
+                ] or [
                     "Monitor spending trends",
                     "Review recurring expenses",
                     "Optimize tax deductions",
@@ -131,6 +134,10 @@ class FinanceAgentAdapter(Agent):
             dependencies=[],  # FinanceAgent doesn't depend on other agents
             cost_per_request=0.001,  # Estimated cost per request
             avg_response_time_ms=2000,  # Average response time
+            max_concurrency=4,  # Shared OpenAI quota
+            cacheable=True,  # Reads receipts; short TTL bounds staleness
+            cache_ttl_s=300,
+            cache_variables=["days_back"],
         )
 
     async def validate_input(self, input_data: Dict[str, Any]) -> bool:
@@ -1,18 +1,30 @@
 """Adapter to make OCR Service compatible with Agent Orchestrator."""
 
+import asyncio
 import base64
-import json
 import logging
+import os
+import time
 from typing import Any
 
+from openai import AsyncOpenAI
+
+from shared_core.modules.ocr import tiering
+from shared_core.modules.ocr.extract import extract_receipt
 from shared_core.modules.ocr.privacy import blur_faces_and_plates
-from shared_core.modules.ocr.service import run_ocr_bytes
 
 from ..agent_registry import Agent, AgentMetadata, AgentType
 
 logger = logging.getLogger("converto.agent_orchestrator")
 
 
+def _local_confidence(local: dict[str, Any]) -> float:
+    """Mean confidence of the key fields from the local parse (0.6 if none found)."""
+    conf = local.get("field_confidence", {})
+    values = [conf[k] for k in ("total_amount", "receipt_date", "vendor") if k in conf]
+    return round(sum(values) / len(values), 3) if values else 0.6
+
+
 class OCRAgentAdapter(Agent):
     """Adapter to make OCR Service compatible with Agent Orchestrator."""
 
@@ -57,62 +69,68 @@ class OCRAgentAdapter(Agent):
                     "No receipt data provided (receipt_bytes, receipt_file, or receipt_url required)"
                 )
 
-            # Blur faces and license plates for privacy
-            safe_bytes = blur_faces_and_plates(receipt_bytes)
+            started = time.perf_counter()
+
+            # Blur faces and license plates for privacy (CPU-bound: off the event loop
+            # so hedge timers and step timeouts can still fire)
+            safe_bytes = await asyncio.to_thread(blur_faces_and_plates, receipt_bytes)
+
+            # Run OCR with word boxes and parse receipt fields locally
+            local = await asyncio.to_thread(extract_receipt, safe_bytes)
+            ocr_text = local.pop("ocr_text")
 
-            # Run OCR
-            ocr_text = run_ocr_bytes(safe_bytes)
+            # Tiered extraction: vision only when the local parse does not validate
+            policy = input_data.get("vision_policy") or (
+                "auto" if input_data.get("use_vision", True) else "never"
+            )
+            decision = tiering.decide(local)
+            if policy == "always":
+                decision.tier = "vision_full"
+            elif policy == "never":
+                decision.tier = "local"
 
-            # Run vision enrichment if needed (for receipts, not power devices)
             vision_data = None
-            if input_data.get("use_vision", True):
+            # Mittareihin kirjataan toteutunut taso, ei päätöstä
+            tier = "local"
+            openai_api_key = os.getenv("OPENAI_API_KEY")
+            if decision.tier != "local" and openai_api_key:
                 try:
-                    # Use a receipt-specific vision prompt
-                    import os
-
-                    from openai import AsyncOpenAI
-
-                    openai_api_key = os.getenv("OPENAI_API_KEY")
-                    if openai_api_key:
-                        client = AsyncOpenAI(api_key=openai_api_key)
-                        import base64
-
-                        b64_image = base64.b64encode(safe_bytes).decode()
-
-                        response = await client.chat.completions.create(
-                            model="gpt-4o-mini",
-                            messages=[
-                                {
-                                    "role": "user",
-                                    "content": [
-                                        {
-                                            "type": "text",
-                                            "text": "Extract receipt data from this image. Return JSON with: merchant_name, date, total_amount, vat_amount, vat_rate, items (array of {name, price}).",
-                                        },
-                                        {
-                                            "type": "image_url",
-                                            "image_url": {
-                                                "url": f"data:image/jpeg;base64,{b64_image}"
-                                            },
-                                        },
-                                    ],
-                                }
-                            ],
-                            response_format={"type": "json_object"},
-                            temperature=0.2,
+                    client = AsyncOpenAI(api_key=openai_api_key)
+                    if decision.tier == "vision_crop":
+                        crop = tiering.crop_fields(safe_bytes, local, decision.failing)
+                        answer = await tiering.vision_json(
+                            client, crop, tiering.crop_prompt(decision.failing)
                         )
-                        vision_data = json.loads(response.choices[0].message.content)
+                        local = tiering.apply_vision_fields(local, answer, decision.failing)
+                    else:
+                        vision_data = await tiering.vision_json(
+                            client, safe_bytes, tiering.FULL_PROMPT
+                        )
+                    tier = decision.tier
                 except Exception as e:
                     logger.warning(f"Vision enrichment failed: {e}")
+            tiering.record("receipt", tier, decision.failing, time.perf_counter() - started)
 
             # Extract structured data
             extracted_data = {
                 "ocr_text": ocr_text,
                 "vision_data": vision_data,
+                "local_data": local,
                 "raw_bytes_length": len(receipt_bytes),
+                "extraction_tier": tier,
+                "escalated_fields": decision.failing if tier != "local" else [],
+                "merchant_name": local.get("vendor"),
+                "business_id": local.get("business_id"),
+                "date": local.get("receipt_date"),
+                "total_amount": local.get("total_amount"),
+                "vat_amount": local.get("vat_amount"),
+                "vat_rate": local.get("vat_rate"),
+                "items": [
+                    {"name": it["name"], "price": it["total_price"]} for it in local["items"]
+                ],
             }
 
-            # Try to extract common receipt fields
+            # Vision fields override the local parse when available
             if vision_data:
                 extracted_data.update(
                     {
@@ -127,7 +145,11 @@ class OCRAgentAdapter(Agent):
 
             return {
                 "extracted_data": extracted_data,
-                "confidence": vision_data.get("confidence", 0.8) if vision_data else 0.6,
+                "confidence": (
+                    vision_data.get("confidence", 0.8)
+                    if vision_data
+                    else _local_confidence(local)
+                ),
                 "success": True,
             }
 
@@ -162,9 +184,15 @@ class OCRAgentAdapter(Agent):
                     "receipt_url": {"type": "string", "description": "URL to receipt image"},
                     "use_vision": {
                         "type": "boolean",
-                        "description": "Whether to use OpenAI Vision for enrichment",
+                        "description": "Whether OpenAI Vision may be used for enrichment",
                         "default": True,
                     },
+                    "vision_policy": {
+                        "type": "string",
+                        "enum": ["auto", "always", "never"],
+                        "description": "auto = vision only for fields the local OCR could not validate",
+                        "default": "auto",
+                    },
                 },
             },
             output_schema={
@@ -181,8 +209,24 @@ class OCRAgentAdapter(Agent):
             dependencies=[],
             cost_per_request=0.02,  # Estimated cost (Vision API)
             avg_response_time_ms=3000,
+            max_concurrency=8,  # Shared OpenAI quota
+            cacheable=True,  # Same image -> same extraction
+            cache_ttl_s=3600,
+            hedge_percentile=0.95,  # Duplicate attempt; budget bounds the extra Vision cost
+            hedge_budget=0.05,
         )
 
+    def cache_identity(self, input_data: dict[str, Any]) -> Any:
+        """Include the file's size and mtime so a replaced file is not served from cache."""
+        path = input_data.get("receipt_file")
+        if not path or "receipt_bytes" in input_data:
+            return input_data
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return input_data
+        return {**input_data, "receipt_file_stat": [stat.st_size, stat.st_mtime_ns]}
+
     async def validate_input(self, input_data: dict[str, Any]) -> bool:
         """Validate input data for OCR Agent.
 
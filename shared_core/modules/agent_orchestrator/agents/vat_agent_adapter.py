@@ -33,6 +33,9 @@ class VATAgentAdapter(Agent):
             VAT calculation result
         """
         try:
+            if self._is_aggregate(input_data):
+                return self._aggregate(input_data, context)
+
             receipt_data = input_data.get("receipt_data", {})
             total_amount = input_data.get("total_amount") or receipt_data.get("total_amount")
 
@@ -71,6 +74,67 @@ class VATAgentAdapter(Agent):
             logger.error(f"VAT Agent execution failed: {e}")
             raise
 
+    @staticmethod
+    def _is_aggregate(input_data: dict[str, Any]) -> bool:
+        """Period totals (no single receipt) or tax workflow deductibles."""
+        receipt_data = input_data.get("receipt_data")
+        return "deductibles" in input_data or (
+            "total_amount" not in input_data and not isinstance(receipt_data, dict)
+        )
+
+    def _aggregate(self, input_data: dict[str, Any], context: dict[str, Any]) -> dict[str, Any]:
+        """VAT totals for a period from the tenant's spending feature store.
+
+        Workflows pass ``tenant_id`` (and optionally ``days_back``) as workflow
+        variables; receipts are not re-read or re-summed per step.
+        """
+        from shared_core.modules.receipts.features import get_spending_features
+        from shared_core.utils.db import SessionLocal
+
+        variables = context.get("workflow_variables") or {}
+        tenant_id = variables.get("tenant_id")
+        if not tenant_id:
+            raise ValueError("tenant_id workflow variable is required for VAT totals")
+        days_back = int(input_data.get("days_back") or variables.get("days_back") or 30)
+
+        db = context.get("db")
+        if db is not None:
+            features = get_spending_features(db, tenant_id)
+        else:
+            # Oma sessio suljetaan heti; piirteet ovat muistissa sen jälkeen
+            with SessionLocal() as db:
+                features = get_spending_features(db, tenant_id)
+        window = features.window(days_back)
+
+        if "deductibles" in input_data:
+            deductible = window["deductible"]
+            return {
+                "savings": {
+                    "period_days": days_back,
+                    "reclaimable_vat": round(deductible["vat"], 2),
+                    "deductible_net": round(deductible["net"], 2),
+                    "by_vat_rate": {
+                        rate: round(v["vat"], 2)
+                        for rate, v in window["deductible_by_vat_rate"].items()
+                    },
+                },
+                "success": True,
+            }
+
+        totals = window["totals"]
+        return {
+            "total_vat": {
+                "period_days": days_back,
+                "total_amount": round(totals["amount"], 2),
+                "total_vat": round(totals["vat"], 2),
+                "net_amount": round(totals["net"], 2),
+                "by_vat_rate": {
+                    rate: round(v["vat"], 2) for rate, v in window["by_vat_rate"].items()
+                },
+            },
+            "success": True,
+        }
+
     def _determine_vat_rate(
         self, receipt_data: dict[str, Any], input_data: dict[str, Any]
     ) -> float:
@@ -178,6 +242,10 @@ class VATAgentAdapter(Agent):
         Returns:
             True if valid, False otherwise
         """
+        # Period totals come from the spending feature store
+        if self._is_aggregate(input_data):
+            return True
+
         # Must have total_amount
         has_total = "total_amount" in input_data or (
             "receipt_data" in input_data and "total_amount" in input_data["receipt_data"]
@@ -0,0 +1,566 @@
+"""Distributed workflow execution on Redis Streams.
+
+Enabled with ``ORCHESTRATOR_BACKEND=redis``. The API process only submits
+executions; steps run in ``orchestrator-worker`` processes
+(``python -m backend.tasks.orchestrator_worker``) on any node:
+
+* execution state lives in one Redis hash per execution, so every API
+  worker sees the same status;
+* a step is a stream message ``{execution_id, step_id}`` on the stream of
+  the execution's priority, consumed by the ``orchestrator-workers``
+  consumer group - any worker can run any step;
+* completing a step is one Lua script: it stores the result and output
+  variables, decrements the dependents' pending-dependency counters and
+  publishes the dependents that became ready, so fan-out is atomic even
+  when sibling steps finish on different workers;
+* messages are acked after the step is stored. A worker that dies leaves
+  its messages pending; other workers claim them after
+  ``ORCHESTRATOR_CLAIM_IDLE_MS`` and a step is given up after
+  ``ORCHESTRATOR_MAX_ATTEMPTS`` deliveries.
+
+Hash layout (``orchestrator:exec:<id>``): ``status``, ``error``,
+``created_at``, ``started_at``, ``completed_at``, ``meta`` (JSON: template,
+step definitions, dependents), ``remaining`` and per step ``state:<id>``,
+``deps:<id>``, ``started:<id>``, ``attempts:<id>``, ``step:<id>`` (JSON
+result/error) plus ``var:<name>`` per workflow variable.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Any
+
+from prometheus_client import Counter, Histogram
+
+from shared_core.utils.redis import get_async_redis_client
+
+from .scheduler import (
+    MAX_QUEUED,
+    MAX_RUNNING,
+    PRIORITY_ORDER,
+    TENANT_MAX_QUEUED,
+    TENANT_MAX_RUNNING,
+    SchedulerSaturated,
+)
+from .workflow_engine import StepStatus, WorkflowExecution, WorkflowStatus, build_steps
+
+if TYPE_CHECKING:
+    from .workflow_engine import WorkflowEngine, WorkflowStep
+
+logger = logging.getLogger("converto.agent_orchestrator.distributed")
+
+BACKEND = os.getenv("ORCHESTRATOR_BACKEND", "local").lower()
+PREFIX = os.getenv("ORCHESTRATOR_REDIS_PREFIX", "orchestrator")
+GROUP = "orchestrator-workers"
+EXECUTION_TTL_S = int(os.getenv("ORCHESTRATOR_EXECUTION_TTL_S", str(7 * 24 * 3600)))
+STREAM_MAXLEN = int(os.getenv("ORCHESTRATOR_STREAM_MAXLEN", "100000"))
+RECENT_EXECUTIONS = 1000
+WORKER_CONCURRENCY = int(os.getenv("ORCHESTRATOR_WORKER_CONCURRENCY", "16"))
+BLOCK_MS = 1000
+CLAIM_IDLE_MS = int(os.getenv("ORCHESTRATOR_CLAIM_IDLE_MS", "300000"))
+CLAIM_EVERY_S = 30.0
+MAX_ATTEMPTS = int(os.getenv("ORCHESTRATOR_MAX_ATTEMPTS", "3"))
+
+ORCHESTRATOR_STEPS = Counter(
+    "orchestrator_worker_steps_total", "Steps handled by orchestrator workers", ["outcome"]
+)
+ORCHESTRATOR_STEP_SECONDS = Histogram(
+    "orchestrator_worker_step_seconds",
+    "Step run time in orchestrator workers",
+    ["agent_id"],
+    buckets=(0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60),
+)
+
+# Ajetaan vain jos suoritus on käynnissä ja steppi odottaa (tai jäi kesken kaatuneelta workerilta)
+START_STEP = """
+local status = redis.call('HGET', KEYS[1], 'status')
+if status == 'queued' then
+  redis.call('HSET', KEYS[1], 'status', 'running', 'started_at', ARGV[2])
+elseif status ~= 'running' then
+  return 0
+end
+local state = redis.call('HGET', KEYS[1], 'state:' .. ARGV[1])
+if state ~= 'pending' and state ~= 'running' then
+  return 0
+end
+if redis.call('HINCRBY', KEYS[1], 'attempts:' .. ARGV[1], 1) > tonumber(ARGV[3]) then
+  return -1
+end
+redis.call('HSET', KEYS[1], 'state:' .. ARGV[1], 'running', 'started:' .. ARGV[1], ARGV[2])
+return 1
+"""
+
+COMPLETE_STEP = """
+if redis.call('HGET', KEYS[1], 'state:' .. ARGV[2]) ~= 'running' then
+  return 0
+end
+redis.call('HSET', KEYS[1], 'state:' .. ARGV[2], 'completed', 'step:' .. ARGV[2], ARGV[3])
+local i = 7
+for _ = 1, tonumber(ARGV[6]) do
+  redis.call('HSET', KEYS[1], 'var:' .. ARGV[i], ARGV[i + 1])
+  i = i + 2
+end
+if redis.call('HGET', KEYS[1], 'status') ~= 'running' then
+  return 1
+end
+for j = i, #ARGV do
+  if redis.call('HINCRBY', KEYS[1], 'deps:' .. ARGV[j], -1) == 0 then
+    redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[5], '*',
+      'execution_id', ARGV[1], 'step_id', ARGV[j])
+  end
+end
+if redis.call('HINCRBY', KEYS[1], 'remaining', -1) == 0 then
+  redis.call('HSET', KEYS[1], 'status', 'completed', 'completed_at', ARGV[4])
+  redis.call('SREM', KEYS[3], ARGV[1])
+  redis.call('SREM', KEYS[4], ARGV[1])
+  return 2
+end
+return 1
+"""
+
+FAIL_STEP = """
+local state = redis.call('HGET', KEYS[1], 'state:' .. ARGV[2])
+if not state or state == 'completed' or state == 'failed' then
+  return 0
+end
+redis.call('HSET', KEYS[1], 'state:' .. ARGV[2], 'failed', 'step:' .. ARGV[2], ARGV[3])
+local status = redis.call('HGET', KEYS[1], 'status')
+if status == 'running' or status == 'queued' then
+  redis.call('HSET', KEYS[1], 'status', 'failed', 'error', ARGV[5], 'completed_at', ARGV[4])
+  redis.call('SREM', KEYS[2], ARGV[1])
+  redis.call('SREM', KEYS[3], ARGV[1])
+  return 2
+end
+return 1
+"""
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, default=str)
+
+
+def _parse_dt(value: str | None) -> datetime | None:
+    return datetime.fromisoformat(value) if value else None
+
+
+class RedisExecutionBackend:
+    """Execution state and step queue shared by all orchestrator processes."""
+
+    def __init__(self, client, prefix: str = PREFIX):
+        self.redis = client
+        self.prefix = prefix
+        self._start = client.register_script(START_STEP)
+        self._complete = client.register_script(COMPLETE_STEP)
+        self._fail = client.register_script(FAIL_STEP)
+
+    def _key(self, execution_id: str) -> str:
+        return f"{self.prefix}:exec:{execution_id}"
+
+    def _stream(self, priority: str) -> str:
+        return f"{self.prefix}:steps:{priority}"
+
+    def _active(self, tenant_id: str | None = None) -> str:
+        return f"{self.prefix}:active" + (f":{tenant_id}" if tenant_id else "")
+
+    async def ensure_groups(self) -> None:
+        """Create the consumer group on every priority stream."""
+        for priority in PRIORITY_ORDER:
+            try:
+                await self.redis.xgroup_create(
+                    self._stream(priority.value), GROUP, id="0", mkstream=True
+                )
+            except Exception as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+
+    async def submit(
+        self,
+        execution: WorkflowExecution,
+        step_defs: list[dict[str, Any]],
+        indegree: dict[str, int],
+        dependents: dict[str, list[str]],
+    ) -> None:
+        """Store a new execution and publish its root steps.
+
+        Raises:
+            SchedulerSaturated: If too many executions are unfinished
+                cluster-wide or for the tenant
+        """
+        tenant_id = execution.metadata["tenant_id"]
+        tenant_limit = TENANT_MAX_RUNNING + TENANT_MAX_QUEUED
+        if await self.redis.scard(self._active()) >= MAX_RUNNING + MAX_QUEUED:
+            raise SchedulerSaturated("Workflow queue is full, retry later")
+        if await self.redis.scard(self._active(tenant_id)) >= tenant_limit:
+            raise SchedulerSaturated(f"Too many queued workflows for tenant {tenant_id}")
+
+        execution.status = WorkflowStatus.QUEUED
+        execution_id = execution.execution_id
+        fields = {
+            "status": execution.status.value,
+            "created_at": execution.created_at.isoformat(),
+            "remaining": len(execution.steps),
+            "meta": _dumps(
+                {
+                    "template_id": execution.template_id,
+                    "name": execution.name,
+                    "metadata": execution.metadata,
+                    "steps": step_defs,
+                    "dependents": dependents,
+                }
+            ),
+        }
+        for step in execution.steps:
+            fields[f"state:{step.step_id}"] = StepStatus.PENDING.value
+            fields[f"deps:{step.step_id}"] = indegree[step.step_id]
+        for name, value in execution.variables.items():
+            fields[f"var:{name}"] = _dumps(value)
+
+        stream = self._stream(execution.metadata["priority"])
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._key(execution_id), mapping=fields)
+            pipe.expire(self._key(execution_id), EXECUTION_TTL_S)
+            pipe.zadd(f"{self.prefix}:executions", {execution_id: time.time()})
+            pipe.zremrangebyrank(f"{self.prefix}:executions", 0, -RECENT_EXECUTIONS - 1)
+            pipe.sadd(self._active(), execution_id)
+            pipe.sadd(self._active(tenant_id), execution_id)
+            for step in execution.steps:
+                if indegree[step.step_id] == 0:
+                    pipe.xadd(
+                        stream,
+                        {"execution_id": execution_id, "step_id": step.step_id},
+                        maxlen=STREAM_MAXLEN,
+                        approximate=True,
+                    )
+            await pipe.execute()
+
+    async def load_with_graph(
+        self, execution_id: str
+    ) -> tuple[WorkflowExecution, dict[str, list[str]]] | None:
+        """Rebuild an execution (and its reverse adjacency) from Redis."""
+        data = await self.redis.hgetall(self._key(execution_id))
+        if not data:
+            return None
+        return self._from_hash(execution_id, data)
+
+    async def load(self, execution_id: str) -> WorkflowExecution | None:
+        loaded = await self.load_with_graph(execution_id)
+        return loaded[0] if loaded else None
+
+    async def list_recent(self, limit: int = 100) -> list[WorkflowExecution]:
+        """Most recently submitted executions (newest first)."""
+        ids = await self.redis.zrevrange(f"{self.prefix}:executions", 0, limit - 1)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for execution_id in ids:
+                pipe.hgetall(self._key(execution_id))
+            rows = await pipe.execute()
+        return [
+            self._from_hash(execution_id, data)[0]
+            for execution_id, data in zip(ids, rows, strict=False)
+            if data
+        ]
+
+    def _from_hash(
+        self, execution_id: str, data: dict[str, str]
+    ) -> tuple[WorkflowExecution, dict[str, list[str]]]:
+        meta = json.loads(data["meta"])
+        steps = build_steps(meta["steps"])
+        for step in steps:
+            step.status = StepStatus(data.get(f"state:{step.step_id}", StepStatus.PENDING.value))
+            step.started_at = _parse_dt(data.get(f"started:{step.step_id}"))
+            stored = json.loads(data.get(f"step:{step.step_id}") or "{}")
+            step.result = stored.get("result")
+            step.error = stored.get("error")
+            step.completed_at = _parse_dt(stored.get("completed_at"))
+
+        execution = WorkflowExecution(
+            execution_id=execution_id,
+            template_id=meta["template_id"],
+            name=meta["name"],
+            status=WorkflowStatus(data["status"]),
+            steps=steps,
+            variables={
+                key[4:]: json.loads(value)
+                for key, value in data.items()
+                if key.startswith("var:")
+            },
+            created_at=_parse_dt(data["created_at"]),
+            started_at=_parse_dt(data.get("started_at")),
+            completed_at=_parse_dt(data.get("completed_at")),
+            error=data.get("error"),
+            metadata=meta["metadata"],
+        )
+        return execution, meta["dependents"]
+
+    async def start_step(self, execution_id: str, step_id: str) -> int:
+        """Claim a step for running.
+
+        Returns:
+            1 to run it, 0 to skip (finished step or execution), -1 when the
+            step has used up its delivery attempts
+        """
+        return int(
+            await self._start(
+                keys=[self._key(execution_id)],
+                args=[step_id, datetime.utcnow().isoformat(), MAX_ATTEMPTS],
+            )
+        )
+
+    async def complete_step(
+        self,
+        execution: WorkflowExecution,
+        step: WorkflowStep,
+        outputs: dict[str, Any],
+        children: list[str],
+    ) -> bool:
+        """Store a step result and publish the dependents it unblocked.
+
+        Returns:
+            True if this step finished the execution
+        """
+        args: list[Any] = [
+            execution.execution_id,
+            step.step_id,
+            _dumps({"result": step.result, "completed_at": datetime.utcnow().isoformat()}),
+            datetime.utcnow().isoformat(),
+            STREAM_MAXLEN,
+            len(outputs),
+        ]
+        for name, value in outputs.items():
+            args += [name, _dumps(value)]
+        args += children
+
+        tenant_id = execution.metadata["tenant_id"]
+        finished = await self._complete(
+            keys=[
+                self._key(execution.execution_id),
+                self._stream(execution.metadata["priority"]),
+                self._active(),
+                self._active(tenant_id),
+            ],
+            args=args,
+        )
+        return int(finished) == 2
+
+    async def fail_step(self, execution: WorkflowExecution, step: WorkflowStep, error: str) -> None:
+        """Mark a step and its execution failed."""
+        now = datetime.utcnow().isoformat()
+        tenant_id = execution.metadata["tenant_id"]
+        await self._fail(
+            keys=[
+                self._key(execution.execution_id),
+                self._active(),
+                self._active(tenant_id),
+            ],
+            args=[
+                execution.execution_id,
+                step.step_id,
+                _dumps({"error": error, "completed_at": now}),
+                now,
+                f"Step {step.step_id} failed: {error}",
+            ],
+        )
+
+    async def read(
+        self, consumer: str, count: int, block_ms: int = BLOCK_MS
+    ) -> list[tuple[str, str, dict[str, str]]]:
+        """New step messages, highest priority stream first."""
+        for priority in PRIORITY_ORDER:
+            response = await self.redis.xreadgroup(
+                GROUP, consumer, {self._stream(priority.value): ">"}, count=count
+            )
+            if response:
+                return self._flatten(response)
+        response = await self.redis.xreadgroup(
+            GROUP,
+            consumer,
+            {self._stream(p.value): ">" for p in PRIORITY_ORDER},
+            count=count,
+            block=block_ms,
+        )
+        return self._flatten(response or [])
+
+    @staticmethod
+    def _flatten(response) -> list[tuple[str, str, dict[str, str]]]:
+        return [
+            (stream, message_id, fields)
+            for stream, messages in response
+            for message_id, fields in messages
+        ]
+
+    async def claim_stale(self, consumer: str, count: int) -> list[tuple[str, str, dict[str, str]]]:
+        """Take over messages left pending by workers that went away."""
+        claimed = []
+        for priority in PRIORITY_ORDER:
+            stream = self._stream(priority.value)
+            response = await self.redis.xautoclaim(
+                stream, GROUP, consumer, min_idle_time=CLAIM_IDLE_MS, start_id="0-0", count=count
+            )
+            for message_id, fields in response[1]:
+                if fields:
+                    claimed.append((stream, message_id, fields))
+                else:
+                    # Viesti on jo trimmattu streamista
+                    await self.ack(stream, message_id)
+        return claimed
+
+    async def touch(self, consumer: str, messages: list[tuple[str, str]]) -> None:
+        """Reset the idle time of in-flight messages so they are not claimed."""
+        by_stream: dict[str, list[str]] = {}
+        for stream, message_id in messages:
+            by_stream.setdefault(stream, []).append(message_id)
+        for stream, ids in by_stream.items():
+            await self.redis.xclaim(stream, GROUP, consumer, 0, ids, justid=True)
+
+    async def ack(self, stream: str, message_id: str) -> None:
+        await self.redis.xack(stream, GROUP, message_id)
+
+    async def stats(self) -> dict[str, Any]:
+        """Unfinished executions and undelivered/pending step messages."""
+        streams = {}
+        for priority in PRIORITY_ORDER:
+            try:
+                groups = await self.redis.xinfo_groups(self._stream(priority.value))
+            except Exception:
+                groups = []
+            group = next((g for g in groups if g.get("name") == GROUP), {})
+            streams[priority.value] = {
+                "pending": group.get("pending", 0),
+                "lag": group.get("lag"),
+            }
+        return {
+            "backend": "redis",
+            "active_executions": await self.redis.scard(self._active()),
+            "max_active_executions": MAX_RUNNING + MAX_QUEUED,
+            "streams": streams,
+        }
+
+
+class StepWorker:
+    """Consumes step messages and runs them with the engine's agents."""
+
+    def __init__(
+        self,
+        engine: WorkflowEngine,
+        backend: RedisExecutionBackend,
+        consumer: str | None = None,
+        concurrency: int = WORKER_CONCURRENCY,
+    ):
+        self.engine = engine
+        self.backend = backend
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.concurrency = concurrency
+        self._in_flight: dict[asyncio.Task, tuple[str, str]] = {}
+
+    async def run(self, stop: asyncio.Event | None = None) -> None:
+        """Process steps until ``stop`` is set, then finish the running ones."""
+        stop = stop or asyncio.Event()
+        await self.backend.ensure_groups()
+        loop = asyncio.get_running_loop()
+        last_claim = 0.0
+        logger.info(f"Orchestrator worker {self.consumer} started ({self.concurrency} slots)")
+
+        while not stop.is_set():
+            free = self.concurrency - len(self._in_flight)
+            if free <= 0:
+                await asyncio.wait(
+                    self._in_flight, timeout=BLOCK_MS / 1000, return_when=asyncio.FIRST_COMPLETED
+                )
+                continue
+
+            messages = []
+            if loop.time() - last_claim >= CLAIM_EVERY_S:
+                last_claim = loop.time()
+                await self.backend.touch(self.consumer, list(self._in_flight.values()))
+                messages = await self.backend.claim_stale(self.consumer, free)
+            if not messages:
+                messages = await self.backend.read(self.consumer, free)
+
+            for stream, message_id, fields in messages:
+                task = asyncio.create_task(self._handle(stream, message_id, fields))
+                self._in_flight[task] = (stream, message_id)
+                task.add_done_callback(self._in_flight.pop)
+
+        if self._in_flight:
+            await asyncio.wait(self._in_flight)
+        logger.info(f"Orchestrator worker {self.consumer} stopped")
+
+    async def _handle(self, stream: str, message_id: str, fields: dict[str, str]) -> None:
+        try:
+            await self._process(fields["execution_id"], fields["step_id"])
+        except Exception as e:
+            # Jätetään kuittaamatta: toinen worker ottaa viestin CLAIM_IDLE_MS:n jälkeen
+            ORCHESTRATOR_STEPS.labels(outcome="error").inc()
+            logger.error(f"Step message {message_id} could not be processed: {e}")
+            return
+        await self.backend.ack(stream, message_id)
+
+    async def _process(self, execution_id: str, step_id: str) -> None:
+        started = await self.backend.start_step(execution_id, step_id)
+        if started == 0:
+            ORCHESTRATOR_STEPS.labels(outcome="skipped").inc()
+            return
+
+        loaded = await self.backend.load_with_graph(execution_id)
+        if loaded is None:
+            return
+        execution, dependents = loaded
+        step_map = {step.step_id: step for step in execution.steps}
+        step = step_map[step_id]
+
+        if started < 0:
+            ORCHESTRATOR_STEPS.labels(outcome="abandoned").inc()
+            await self._fail(execution, step, f"Step abandoned after {MAX_ATTEMPTS} attempts")
+            return
+
+        t0 = time.perf_counter()
+        try:
+            result = await self.engine._execute_step(step, execution, step_map)
+        except Exception as e:
+            ORCHESTRATOR_STEPS.labels(outcome="failed").inc()
+            logger.error(f"Step {step_id} of {execution_id} failed: {e}")
+            await self._fail(execution, step, str(e))
+            return
+        finally:
+            ORCHESTRATOR_STEP_SECONDS.labels(agent_id=step.agent_id).observe(
+                time.perf_counter() - t0
+            )
+
+        step.result = result
+        step.status = StepStatus.COMPLETED
+        # Julkaistaan ennen riippuvien steppien jonotusta, jotta järjestys säilyy
+        self.engine.events.publish(execution, step)
+        finished = await self.backend.complete_step(
+            execution, step, self.engine.map_outputs(step, result), dependents[step_id]
+        )
+        ORCHESTRATOR_STEPS.labels(outcome="completed").inc()
+        if finished:
+            execution.status = WorkflowStatus.COMPLETED
+            self.engine.events.publish(execution)
+            logger.info(f"Workflow {execution_id} completed successfully")
+
+    async def _fail(self, execution: WorkflowExecution, step: WorkflowStep, error: str) -> None:
+        await self.backend.fail_step(execution, step, error)
+        step.status = StepStatus.FAILED
+        step.error = error
+        execution.status = WorkflowStatus.FAILED
+        execution.error = f"Step {step.step_id} failed: {error}"
+        self.engine.events.publish(execution, step)
+        self.engine.events.publish(execution)
+
+
+def get_execution_backend() -> RedisExecutionBackend | None:
+    """Redis backend when ``ORCHESTRATOR_BACKEND=redis``, else None (in-process)."""
+    if BACKEND != "redis":
+        return None
+    client = get_async_redis_client()
+    if client is None:
+        logger.warning("ORCHESTRATOR_BACKEND=redis but redis is not installed, running in-process")
+        return None
+    return RedisExecutionBackend(client)
+
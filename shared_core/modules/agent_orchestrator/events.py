@@ -0,0 +1,158 @@
+"""Workflow status events - push channel for execution and step transitions.
+
+The engine publishes an event whenever an execution or one of its steps
+changes state. With Redis available the events are fanned out through
+pub/sub (channel ``orchestrator:events:<execution_id>``), so any API
+worker can stream any execution; without Redis they are delivered to
+subscribers in the same process.
+
+Event shape::
+
+    {"event": "workflow" | "step", "execution_id": ..., "status": ...,
+     "error": ..., "completed_steps": 2, "total_steps": 4, "at": ...,
+     "step": {"step_id", "agent_id", "status", "error"}}   # step events only
+
+Publishing never waits on Redis: events go through an in-process outbox
+drained by one task, which also keeps them in order.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, AsyncIterator
+
+from prometheus_client import Gauge
+
+from shared_core.utils.redis import PubSubManager, pubsub_manager
+
+if TYPE_CHECKING:
+    from .workflow_engine import WorkflowExecution, WorkflowStep
+
+logger = logging.getLogger("converto.agent_orchestrator.events")
+
+CHANNEL_PREFIX = "orchestrator:events:"
+HEARTBEAT_S = float(os.getenv("WORKFLOW_EVENTS_HEARTBEAT_S", "15"))
+OUTBOX_MAX = 10_000
+TERMINAL_STATUSES = frozenset({"completed", "failed", "cancelled"})
+
+WORKFLOW_EVENT_STREAMS = Gauge("workflow_event_streams", "Open workflow event streams")
+
+
+def build_event(execution: WorkflowExecution, step: WorkflowStep | None = None) -> dict[str, Any]:
+    """Event describing the current state of an execution (and one of its steps)."""
+    event: dict[str, Any] = {
+        "event": "step" if step is not None else "workflow",
+        "execution_id": execution.execution_id,
+        "status": execution.status.value,
+        "error": execution.error,
+        "completed_steps": sum(s.status.value == "completed" for s in execution.steps),
+        "total_steps": len(execution.steps),
+        "at": datetime.utcnow().isoformat(),
+    }
+    if step is not None:
+        event["step"] = {
+            "step_id": step.step_id,
+            "agent_id": step.agent_id,
+            "status": step.status.value,
+            "error": step.error,
+        }
+    return event
+
+
+def format_sse(event: str, data: dict[str, Any]) -> str:
+    """Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class _LocalSubscription:
+    def __init__(self) -> None:
+        self.queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+
+    async def get(self, timeout: float | None = None) -> dict[str, Any] | None:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class WorkflowEventBus:
+    """Publishes execution events and lets clients subscribe per execution."""
+
+    def __init__(self, pubsub: PubSubManager | None = None):
+        self.pubsub = pubsub or pubsub_manager
+        self._local: dict[str, set[_LocalSubscription]] = defaultdict(set)
+        self._outbox: asyncio.Queue[dict[str, Any]] | None = None
+        self._publisher: asyncio.Task | None = None
+
+    @property
+    def distributed(self) -> bool:
+        return self.pubsub.async_redis is not None
+
+    def publish(self, execution: WorkflowExecution, step: WorkflowStep | None = None) -> None:
+        """Publish the execution's (or step's) current state."""
+        event = build_event(execution, step)
+        if not self.distributed:
+            for subscription in self._local.get(execution.execution_id, ()):
+                subscription.queue.put_nowait(event)
+            return
+
+        if self._publisher is None or self._publisher.done():
+            self._outbox = asyncio.Queue(OUTBOX_MAX)
+            self._publisher = asyncio.create_task(self._publish_loop(self._outbox))
+        try:
+            self._outbox.put_nowait(event)
+        except asyncio.QueueFull:
+            # Tila on silti luettavissa status-rajapinnasta; pudotetaan mieluummin kuin jumitetaan
+            logger.warning(f"Event outbox full, dropping event for {execution.execution_id}")
+
+    async def _publish_loop(self, outbox: asyncio.Queue[dict[str, Any]]) -> None:
+        while True:
+            event = await outbox.get()
+            await self.pubsub.apublish(CHANNEL_PREFIX + event["execution_id"], event)
+            outbox.task_done()
+
+    @asynccontextmanager
+    async def subscribe(self, execution_id: str) -> AsyncIterator[Any]:
+        """Receive the events of one execution for the duration of the block.
+
+        Args:
+            execution_id: Execution identifier
+
+        Yields:
+            Subscription whose ``get(timeout)`` returns the next event or None
+        """
+        WORKFLOW_EVENT_STREAMS.inc()
+        try:
+            if self.distributed:
+                async with self.pubsub.asubscribe(CHANNEL_PREFIX + execution_id) as subscription:
+                    yield subscription
+                return
+
+            subscription = _LocalSubscription()
+            self._local[execution_id].add(subscription)
+            try:
+                yield subscription
+            finally:
+                self._local[execution_id].discard(subscription)
+                if not self._local[execution_id]:
+                    del self._local[execution_id]
+        finally:
+            WORKFLOW_EVENT_STREAMS.dec()
+
+    async def close(self, timeout: float = 5.0) -> None:
+        """Deliver queued events, then stop the publisher."""
+        if self._publisher is None:
+            return
+        try:
+            await asyncio.wait_for(self._outbox.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Timed out delivering workflow events on shutdown")
+        self._publisher.cancel()
+        await asyncio.gather(self._publisher, return_exceptions=True)
+        self._publisher = None
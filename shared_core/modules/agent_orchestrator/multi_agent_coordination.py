@@ -1,24 +1,15 @@
 """Multi-Agent Coordination Enhancements - Advanced orchestration features."""
 
 import logging
-from enum import Enum
 from typing import Any
 
-from .agent_registry import AgentRegistry
+from .agent_registry import AgentPriority, AgentRegistry  # noqa: F401
+from .resilience import RetryStrategy  # noqa: F401
 from .workflow_engine import WorkflowStep
 
 logger = logging.getLogger("converto.agent_orchestrator")
 
 
-class AgentPriority(str, Enum):
-    """Agent priority levels."""
-
-    LOW = "low"
-    NORMAL = "normal"
-    HIGH = "high"
-    CRITICAL = "critical"
-
-
 class RoutingCondition:
     """Condition for conditional routing."""
 
@@ -189,55 +180,3 @@ class ParallelExecutor:
             return int(reliability_score + cost_score)
 
         return sorted(steps, key=get_priority, reverse=True)
-
-
-class RetryStrategy:
-    """Retry strategy for failed agent executions."""
-
-    def __init__(self, max_retries: int = 3, backoff_factor: float = 2.0):
-        self.max_retries = max_retries
-        self.backoff_factor = backoff_factor
-
-    async def execute_with_retry(
-        self,
-        agent_executor,
-        input_data: dict[str, Any],
-        context: dict[str, Any],
-        step: WorkflowStep,
-    ) -> dict[str, Any]:
-        """Execute agent with retry logic.
-
-        Args:
-            agent_executor: Function to execute agent
-            input_data: Agent input data
-            context: Execution context
-            step: Workflow step
-
-        Returns:
-            Agent execution result
-        """
-        agent_metadata = context.get("agent_metadata")
-        max_retries = agent_metadata.max_retries if agent_metadata else self.max_retries
-
-        last_error = None
-
-        for attempt in range(max_retries + 1):
-            try:
-                result = await agent_executor(input_data, context)
-                return result
-            except Exception as e:
-                last_error = e
-                if attempt < max_retries:
-                    wait_time = self.backoff_factor**attempt
-                    logger.warning(
-                        f"Agent {step.agent_id} failed (attempt {attempt + 1}/{max_retries + 1}), "
-                        f"retrying in {wait_time}s..."
-                    )
-                    await asyncio.sleep(wait_time)
-                else:
-                    logger.error(f"Agent {step.agent_id} failed after {max_retries + 1} attempts")
-
-        raise last_error or Exception("Unknown error")
-
-
-import asyncio
@@ -3,7 +3,7 @@
 import logging
 from typing import Any
 
-from .agent_registry import AgentRegistry, AgentType
+from .agent_registry import AgentPriority, AgentRegistry, AgentType
 from .inter_agent_comm import InterAgentMessaging
 from .workflow_engine import WorkflowEngine, WorkflowExecution, WorkflowStatus, WorkflowTemplate
 
@@ -37,7 +37,11 @@ class AgentOrchestrator:
         self.workflow_engine.register_template(template)
 
     async def execute_workflow(
-        self, template_id: str, initial_variables: dict[str, Any], execution_name: str | None = None
+        self,
+        template_id: str,
+        initial_variables: dict[str, Any],
+        execution_name: str | None = None,
+        priority: AgentPriority = AgentPriority.NORMAL,
     ) -> WorkflowExecution:
         """Execute a workflow.
 
@@ -45,6 +49,7 @@ class AgentOrchestrator:
             template_id: Template identifier
             initial_variables: Initial workflow variables
             execution_name: Optional name for this execution
+            priority: Scheduling priority
 
         Returns:
             Workflow execution instance
@@ -53,9 +58,10 @@ class AgentOrchestrator:
             template_id=template_id,
             initial_variables=initial_variables,
             execution_name=execution_name,
+            priority=priority,
         )
 
-    def get_workflow_status(self, execution_id: str) -> WorkflowStatus | None:
+    async def get_workflow_status(self, execution_id: str) -> WorkflowStatus | None:
         """Get workflow execution status.
 
         Args:
@@ -64,10 +70,10 @@ class AgentOrchestrator:
         Returns:
             Workflow status or None if not found
         """
-        execution = self.workflow_engine.get_execution(execution_id)
+        execution = await self.workflow_engine.get_execution(execution_id)
         return execution.status if execution else None
 
-    def get_workflow_result(self, execution_id: str) -> dict[str, Any] | None:
+    async def get_workflow_result(self, execution_id: str) -> dict[str, Any] | None:
         """Get workflow execution result.
 
         Args:
@@ -76,7 +82,7 @@ class AgentOrchestrator:
         Returns:
             Workflow result (final variables) or None if not found/completed
         """
-        execution = self.workflow_engine.get_execution(execution_id)
+        execution = await self.workflow_engine.get_execution(execution_id)
 
         if execution and execution.status == WorkflowStatus.COMPLETED:
             return execution.variables
@@ -102,7 +108,7 @@ class AgentOrchestrator:
         """
         return self.workflow_engine.list_templates()
 
-    def list_workflow_executions(
+    async def list_workflow_executions(
         self, template_id: str | None = None, status: WorkflowStatus | None = None
     ) -> list[WorkflowExecution]:
         """List workflow executions.
@@ -114,7 +120,7 @@ class AgentOrchestrator:
         Returns:
             List of workflow executions
         """
-        return self.workflow_engine.list_executions(template_id, status)
+        return await self.workflow_engine.list_executions(template_id, status)
 
     async def send_message(
         self,
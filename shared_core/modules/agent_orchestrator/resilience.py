@@ -0,0 +1,422 @@
+"""Agent call resilience - timeouts, retries, circuit breakers and hedging.
+
+Every agent call made by :class:`WorkflowEngine` goes through
+:class:`AgentInvoker`:
+
+* each attempt is bounded by ``AgentMetadata.timeout_ms``;
+* failed attempts are retried up to ``AgentMetadata.max_retries`` times with
+  exponential backoff and full jitter (:class:`RetryStrategy`), so callers
+  that failed together do not retry together;
+* a per-agent :class:`CircuitBreaker` opens when the error rate over the
+  last ``AGENT_BREAKER_WINDOW`` attempts reaches
+  ``AGENT_BREAKER_ERROR_RATE``. While open, calls fail fast with
+  :class:`CircuitOpen` (the engine then routes the step to
+  ``AgentMetadata.fallback_agent_id``); after ``AGENT_BREAKER_OPEN_S`` one
+  probe call is let through to decide whether to close it again;
+* agents with ``AgentMetadata.hedge_percentile`` are hedged: when an attempt
+  is still running at that quantile of the agent's recent latencies, a
+  second attempt (:meth:`Agent.execute_hedge`) is raced against it and the
+  loser is cancelled. Each call earns ``AgentMetadata.hedge_budget`` hedge
+  tokens (:class:`HedgePolicy`), so at most that share of calls is hedged.
+
+Breaker state, attempt latency, failures and hedges are exported to Prometheus.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from .agent_registry import Agent, AgentMetadata, AgentRegistry
+from .scheduler import AgentSlots
+
+logger = logging.getLogger("converto.agent_orchestrator.resilience")
+
+BREAKER_WINDOW = int(os.getenv("AGENT_BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("AGENT_BREAKER_MIN_CALLS", "10"))
+BREAKER_ERROR_RATE = float(os.getenv("AGENT_BREAKER_ERROR_RATE", "0.5"))
+BREAKER_OPEN_S = float(os.getenv("AGENT_BREAKER_OPEN_S", "30"))
+RETRY_BASE_DELAY_S = float(os.getenv("AGENT_RETRY_BASE_DELAY_S", "0.5"))
+RETRY_MAX_DELAY_S = float(os.getenv("AGENT_RETRY_MAX_DELAY_S", "10"))
+HEDGE_WINDOW = int(os.getenv("AGENT_HEDGE_WINDOW", "200"))
+HEDGE_MIN_SAMPLES = int(os.getenv("AGENT_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MAX_TOKENS = 10.0
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+AGENT_CIRCUIT_STATE = Gauge(
+    "agent_circuit_state", "Agent circuit breaker state (0=closed, 1=half-open, 2=open)",
+    ["agent_id"],
+)
+AGENT_CALL_LATENCY = Histogram(
+    "agent_call_latency_seconds",
+    "Agent call attempt latency",
+    ["agent_id", "outcome"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60),
+)
+AGENT_CALL_FAILURES = Counter(
+    "agent_call_failures_total", "Failed agent call attempts", ["agent_id", "reason"]
+)
+AGENT_HEDGES = Counter("agent_hedges_total", "Hedged agent attempts", ["agent_id", "outcome"])
+AGENT_FALLBACKS = Counter(
+    "agent_fallbacks_total", "Steps routed to a fallback agent", ["agent_id", "fallback_agent_id"]
+)
+
+
+class CircuitOpen(RuntimeError):
+    """Raised instead of calling an agent whose circuit is open."""
+
+
+class CircuitBreaker:
+    """Rolling error-rate circuit breaker for one agent."""
+
+    def __init__(
+        self,
+        agent_id: str,
+        window: int = BREAKER_WINDOW,
+        min_calls: int = BREAKER_MIN_CALLS,
+        error_rate: float = BREAKER_ERROR_RATE,
+        open_s: float = BREAKER_OPEN_S,
+    ):
+        self.agent_id = agent_id
+        self.min_calls = min_calls
+        self.threshold = error_rate
+        self.open_s = open_s
+        self.state = CLOSED
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probe_at: float | None = None
+        AGENT_CIRCUIT_STATE.labels(agent_id=agent_id).set(0)
+
+    @property
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def allow(self) -> bool:
+        """Whether a call may be attempted now."""
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now - self._opened_at < self.open_s:
+                return False
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            # Yksi koekutsu kerrallaan; jumiin jäänyt koe vapautuu open_s:n jälkeen
+            if self._probe_at is not None and now - self._probe_at < self.open_s:
+                return False
+            self._probe_at = now
+        return True
+
+    def record(self, ok: bool) -> None:
+        """Record the outcome of an attempt let through by :meth:`allow`."""
+        if self.state == HALF_OPEN:
+            self._probe_at = None
+            if ok:
+                self._outcomes.clear()
+                self._set_state(CLOSED)
+            else:
+                self._open()
+            return
+        self._outcomes.append(ok)
+        if (
+            self.state == CLOSED
+            and len(self._outcomes) >= self.min_calls
+            and self.error_rate >= self.threshold
+        ):
+            self._open()
+
+    def _open(self) -> None:
+        self._opened_at = time.monotonic()
+        if self.state != OPEN:
+            logger.warning(
+                f"Circuit for agent {self.agent_id} opened "
+                f"(error rate {self.error_rate:.0%} over {len(self._outcomes)} calls)"
+            )
+        self._set_state(OPEN)
+
+    def _set_state(self, state: str) -> None:
+        if state == CLOSED and self.state != CLOSED:
+            logger.info(f"Circuit for agent {self.agent_id} closed")
+        self.state = state
+        AGENT_CIRCUIT_STATE.labels(agent_id=self.agent_id).set(_STATE_VALUE[state])
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "state": self.state,
+            "error_rate": round(self.error_rate, 3),
+            "calls": len(self._outcomes),
+        }
+
+
+class HedgePolicy:
+    """Hedge delay (latency quantile) and hedge budget for one agent."""
+
+    def __init__(
+        self,
+        agent_id: str,
+        percentile: float,
+        budget: float,
+        window: int = HEDGE_WINDOW,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+    ):
+        self.agent_id = agent_id
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._delay: float | None = None
+        self._stale = 0
+        self._tokens = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self._latencies.append(seconds)
+        self._stale += 1
+
+    def delay(self) -> float | None:
+        """Seconds to wait before hedging (None until enough samples)."""
+        if len(self._latencies) < self.min_samples:
+            return None
+        # Kvantiili lasketaan uudelleen vasta kun ikkuna on muuttunut tarpeeksi
+        if self._delay is None or self._stale >= 10:
+            ordered = sorted(self._latencies)
+            self._delay = ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+            self._stale = 0
+        return self._delay
+
+    def earn(self) -> None:
+        """Credit the budget for one call."""
+        self._tokens = min(HEDGE_MAX_TOKENS, self._tokens + self.budget)
+
+    def spend(self) -> bool:
+        """Take one hedge token if available."""
+        if self._tokens < 1.0:
+            return False
+        self._tokens -= 1.0
+        return True
+
+    def stats(self) -> dict[str, Any]:
+        delay = self.delay()
+        return {
+            "hedge_delay_ms": round(delay * 1000) if delay is not None else None,
+            "hedge_tokens": round(self._tokens, 2),
+            "latency_samples": len(self._latencies),
+        }
+
+
+class RetryStrategy:
+    """Retry strategy for failed agent executions (exponential backoff, full jitter)."""
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        backoff_factor: float = 2.0,
+        base_delay_s: float = RETRY_BASE_DELAY_S,
+        max_delay_s: float = RETRY_MAX_DELAY_S,
+    ):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.base_delay_s = base_delay_s
+        self.max_delay_s = max_delay_s
+
+    def delay(self, attempt: int) -> float:
+        """Backoff before retry number ``attempt + 1`` (0-based attempt)."""
+        cap = min(self.max_delay_s, self.base_delay_s * self.backoff_factor**attempt)
+        return random.uniform(0, cap)
+
+    async def execute_with_retry(
+        self,
+        agent_executor: Callable[[dict[str, Any], dict[str, Any]], Awaitable[dict[str, Any]]],
+        input_data: dict[str, Any],
+        context: dict[str, Any],
+        step: Any = None,
+        agent_metadata: AgentMetadata | None = None,
+    ) -> dict[str, Any]:
+        """Execute agent with retry logic.
+
+        Args:
+            agent_executor: Function to execute agent
+            input_data: Agent input data
+            context: Execution context
+            step: Workflow step (used for logging)
+            agent_metadata: Metadata providing ``max_retries`` (falls back to
+                ``context["agent_metadata"]``, then to the strategy default)
+
+        Returns:
+            Agent execution result
+
+        Raises:
+            CircuitOpen: Immediately, without further retries
+        """
+        agent_metadata = agent_metadata or context.get("agent_metadata")
+        max_retries = agent_metadata.max_retries if agent_metadata else self.max_retries
+        agent_id = agent_metadata.agent_id if agent_metadata else getattr(step, "agent_id", "?")
+
+        for attempt in range(max_retries + 1):
+            try:
+                return await agent_executor(input_data, context)
+            except CircuitOpen:
+                raise
+            except Exception:
+                if attempt >= max_retries:
+                    logger.error(f"Agent {agent_id} failed after {max_retries + 1} attempts")
+                    raise
+                wait_time = self.delay(attempt)
+                logger.warning(
+                    f"Agent {agent_id} failed (attempt {attempt + 1}/{max_retries + 1}), "
+                    f"retrying in {wait_time:.2f}s..."
+                )
+                await asyncio.sleep(wait_time)
+        raise RuntimeError("unreachable")
+
+
+class AgentInvoker:
+    """Calls agents with timeout, retry and circuit breaking."""
+
+    def __init__(
+        self,
+        agent_registry: AgentRegistry,
+        agent_slots: AgentSlots,
+        retry: RetryStrategy | None = None,
+    ):
+        self.agent_registry = agent_registry
+        self.agent_slots = agent_slots
+        self.retry = retry or RetryStrategy()
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._hedges: dict[str, HedgePolicy] = {}
+
+    def breaker(self, agent_id: str) -> CircuitBreaker:
+        if agent_id not in self._breakers:
+            self._breakers[agent_id] = CircuitBreaker(agent_id)
+        return self._breakers[agent_id]
+
+    def hedge_policy(self, metadata: AgentMetadata) -> HedgePolicy:
+        if metadata.agent_id not in self._hedges:
+            self._hedges[metadata.agent_id] = HedgePolicy(
+                metadata.agent_id, metadata.hedge_percentile, metadata.hedge_budget
+            )
+        return self._hedges[metadata.agent_id]
+
+    async def invoke(
+        self, agent: Agent, input_data: dict[str, Any], context: dict[str, Any]
+    ) -> dict[str, Any]:
+        """Execute an agent under its timeout, retry and breaker policy.
+
+        Args:
+            agent: Agent to execute
+            input_data: Agent input data
+            context: Execution context passed to the agent
+
+        Returns:
+            Agent execution result
+
+        Raises:
+            CircuitOpen: If the agent's circuit is open
+            TimeoutError: If the last attempt timed out
+        """
+        metadata = agent.get_metadata()
+        agent_id = metadata.agent_id
+        breaker = self.breaker(agent_id)
+        timeout_s = metadata.timeout_ms / 1000 if metadata.timeout_ms else None
+
+        async def attempt(input_data: dict[str, Any], context: dict[str, Any]) -> dict[str, Any]:
+            if not breaker.allow():
+                AGENT_CALL_FAILURES.labels(agent_id=agent_id, reason="circuit_open").inc()
+                raise CircuitOpen(f"Circuit open for agent {agent_id}")
+            async with self.agent_slots.slot(agent_id):
+                t0 = time.perf_counter()
+                try:
+                    if metadata.hedge_percentile:
+                        call = self._execute_hedged(agent, metadata, input_data, context)
+                    else:
+                        call = agent.execute(input_data, context)
+                    result = await asyncio.wait_for(call, timeout_s)
+                except asyncio.TimeoutError:
+                    self._record(breaker, t0, "timeout")
+                    raise TimeoutError(
+                        f"Agent {agent_id} timed out after {metadata.timeout_ms} ms"
+                    ) from None
+                except Exception:
+                    self._record(breaker, t0, "error")
+                    raise
+                self._record(breaker, t0, "success")
+                return result
+
+        return await self.retry.execute_with_retry(
+            attempt, input_data, context, agent_metadata=metadata
+        )
+
+    async def _execute_hedged(
+        self,
+        agent: Agent,
+        metadata: AgentMetadata,
+        input_data: dict[str, Any],
+        context: dict[str, Any],
+    ) -> dict[str, Any]:
+        """Run the agent, racing a hedge once the call outlives the hedge delay."""
+        policy = self.hedge_policy(metadata)
+        policy.earn()
+        delay = policy.delay()
+        t0 = time.perf_counter()
+        primary = asyncio.ensure_future(agent.execute(input_data, context))
+        hedge: asyncio.Future | None = None
+        try:
+            if delay is not None:
+                await asyncio.wait({primary}, timeout=delay)
+            if not primary.done() and delay is not None:
+                # Varakutsu tarvitsee oman paikan; täydellä agentilla sitä ei käynnistetä
+                if not await self.agent_slots.try_acquire(metadata.agent_id):
+                    AGENT_HEDGES.labels(agent_id=metadata.agent_id, outcome="no_slot").inc()
+                elif not policy.spend():
+                    self.agent_slots.release(metadata.agent_id)
+                    AGENT_HEDGES.labels(agent_id=metadata.agent_id, outcome="over_budget").inc()
+                else:
+                    AGENT_HEDGES.labels(agent_id=metadata.agent_id, outcome="launched").inc()
+                    hedge = asyncio.ensure_future(agent.execute_hedge(input_data, context))
+                    # Callback vapauttaa paikan myös, jos tehtävä perutaan ennen käynnistymistä
+                    hedge.add_done_callback(lambda _: self.agent_slots.release(metadata.agent_id))
+            if hedge is None:
+                result = await primary
+                policy.observe(time.perf_counter() - t0)
+                return result
+
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        won = "hedge_won" if task is hedge else "primary_won"
+                        AGENT_HEDGES.labels(agent_id=metadata.agent_id, outcome=won).inc()
+                        # Hävinnyt perutaan; sen kesto on vähintään tähän asti kulunut aika
+                        policy.observe(time.perf_counter() - t0)
+                        return task.result()
+            # Molemmat epäonnistuivat - varsinaisen kutsun virhe on kuvaavampi
+            raise primary.exception()
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    @staticmethod
+    def _record(breaker: CircuitBreaker, t0: float, outcome: str) -> None:
+        AGENT_CALL_LATENCY.labels(agent_id=breaker.agent_id, outcome=outcome).observe(
+            time.perf_counter() - t0
+        )
+        if outcome != "success":
+            AGENT_CALL_FAILURES.labels(agent_id=breaker.agent_id, reason=outcome).inc()
+        breaker.record(outcome == "success")
+
+    def stats(self) -> dict[str, Any]:
+        """Breaker (and hedge) state per agent that has been called."""
+        stats = {agent_id: b.stats() for agent_id, b in self._breakers.items()}
+        for agent_id, policy in self._hedges.items():
+            stats.setdefault(agent_id, {}).update(policy.stats())
+        return stats
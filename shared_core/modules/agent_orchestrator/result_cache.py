@@ -0,0 +1,213 @@
+"""Step result cache - memoized agent calls for idempotent agents.
+
+Agents opt in with ``AgentMetadata.cacheable``. A result is keyed on
+
+* agent id and agent version (a new version never sees old results),
+* the workflow's ``tenant_id`` plus the workflow variables the agent reads
+  from its context (``AgentMetadata.cache_variables``),
+* a SHA-256 of the canonicalized agent input (sorted JSON; bytes are
+  hashed, not serialized) - or of ``Agent.cache_identity(input)`` when
+  the input refers to external state such as a file.
+
+Entries expire after ``AgentMetadata.cache_ttl_s`` (default
+``STEP_CACHE_TTL_S``) and the least recently used ones are evicted beyond
+``STEP_CACHE_MAX_ENTRIES``. Concurrent calls with the same key share one
+agent execution, so overlapping workflows run an expensive step once.
+
+Failed executions (exceptions or ``success: False``) and degraded results
+(``degraded: True``, e.g. a rule-based hedge that won the race) are never
+cached.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from prometheus_client import Counter, Gauge
+
+from .agent_registry import AgentMetadata
+
+logger = logging.getLogger("converto.agent_orchestrator.result_cache")
+
+DEFAULT_TTL_S = float(os.getenv("STEP_CACHE_TTL_S", "600"))
+MAX_ENTRIES = int(os.getenv("STEP_CACHE_MAX_ENTRIES", "1024"))
+ENABLED = os.getenv("STEP_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+
+STEP_CACHE_LOOKUPS = Counter(
+    "step_cache_lookups_total", "Step result cache lookups", ["agent_id", "outcome"]
+)
+STEP_CACHE_ENTRIES = Gauge("step_cache_entries", "Step results held in the cache")
+
+
+def _canonical(value: Any) -> Any:
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        # Kuvatiedostoja ei sarjallisteta avaimeen, vain niiden tiiviste
+        return {"sha256": hashlib.sha256(value).hexdigest()}
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [_canonical(v) for v in value]
+        return sorted(items, key=repr) if isinstance(value, (set, frozenset)) else items
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def cache_key(
+    metadata: AgentMetadata, agent_input: dict[str, Any], variables: dict[str, Any]
+) -> str:
+    """Cache key for one agent call.
+
+    Args:
+        metadata: Metadata of the agent being called
+        agent_input: Agent input (or its ``Agent.cache_identity``)
+        variables: Workflow variables visible to the agent
+
+    Returns:
+        Hex digest identifying the call
+    """
+    scope = {name: variables.get(name) for name in ["tenant_id", *metadata.cache_variables]}
+    payload = json.dumps(
+        [metadata.agent_id, metadata.version, _canonical(scope), _canonical(agent_input)],
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class StepResultCache:
+    """In-process TTL + LRU cache of agent results with in-flight sharing."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, default_ttl_s: float = DEFAULT_TTL_S):
+        self.max_entries = max_entries
+        self.default_ttl_s = default_ttl_s
+        # key -> (expires_at, agent_id, result)
+        self._entries: OrderedDict[str, tuple[float, str, dict[str, Any]]] = OrderedDict()
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        """Cached result for ``key`` (a private copy), or None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, _, result = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            STEP_CACHE_ENTRIES.set(len(self._entries))
+            return None
+        self._entries.move_to_end(key)
+        return copy.deepcopy(result)
+
+    def put(
+        self, key: str, agent_id: str, result: dict[str, Any], ttl_s: float | None = None
+    ) -> None:
+        """Store a result for ``ttl_s`` seconds (default TTL when None)."""
+        ttl = self.default_ttl_s if ttl_s is None else ttl_s
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, agent_id, copy.deepcopy(result))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        STEP_CACHE_ENTRIES.set(len(self._entries))
+
+    async def get_or_run(
+        self,
+        metadata: AgentMetadata,
+        key: str,
+        run: Callable[[], Awaitable[dict[str, Any]]],
+    ) -> tuple[dict[str, Any], bool]:
+        """Return the cached result for ``key`` or run the agent once.
+
+        Args:
+            metadata: Metadata of the agent (TTL, metric labels)
+            key: Key from :func:`cache_key`
+            run: Executes the agent
+
+        Returns:
+            Tuple of (result, served_from_cache)
+        """
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            STEP_CACHE_LOOKUPS.labels(agent_id=metadata.agent_id, outcome="hit").inc()
+            return cached, True
+
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            try:
+                result = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # Ensimmäinen kutsuja peruttiin - ajetaan itse
+                return await self.get_or_run(metadata, key, run)
+            self.hits += 1
+            STEP_CACHE_LOOKUPS.labels(agent_id=metadata.agent_id, outcome="shared").inc()
+            return result, True
+
+        self.misses += 1
+        STEP_CACHE_LOOKUPS.labels(agent_id=metadata.agent_id, outcome="miss").inc()
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await run()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Odottajat saavat saman virheen; estetään "exception never retrieved" -varoitus
+            future.exception()
+            raise
+        else:
+            if (
+                isinstance(result, dict)
+                and result.get("success", True) is not False
+                and not result.get("degraded")
+            ):
+                self.put(key, metadata.agent_id, result, metadata.cache_ttl_s)
+            # Odottajille oma kopio, jottei kutsujan muutokset näy niille
+            future.set_result(copy.deepcopy(result))
+            return result, False
+        finally:
+            self._in_flight.pop(key, None)
+
+    def invalidate(self, agent_id: str | None = None) -> int:
+        """Drop cached results (all, or those of one agent).
+
+        Returns:
+            Number of entries removed
+        """
+        if agent_id is None:
+            removed = len(self._entries)
+            self._entries.clear()
+        else:
+            stale = [k for k, (_, owner, _) in self._entries.items() if owner == agent_id]
+            for k in stale:
+                del self._entries[k]
+            removed = len(stale)
+        STEP_CACHE_ENTRIES.set(len(self._entries))
+        return removed
+
+    def stats(self) -> dict[str, Any]:
+        """Cache size and hit counters."""
+        total = self.hits + self.misses
+        return {
+            "enabled": ENABLED,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
@@ -5,15 +5,18 @@ from __future__ import annotations
 import logging
 from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
 from shared_core.utils.db import get_session
 
-from .agent_registry import AgentType
+from .agent_registry import AgentPriority, AgentType
+from .events import HEARTBEAT_S, TERMINAL_STATUSES, format_sse
 from .orchestrator import AgentOrchestrator
-from .workflow_engine import WorkflowStatus
+from .scheduler import SchedulerSaturated
+from .workflow_engine import WorkflowEngine, WorkflowExecution, WorkflowStatus
 
 logger = logging.getLogger("converto.agent_orchestrator")
 
@@ -69,6 +72,7 @@ class ExecuteWorkflowRequest(BaseModel):
         default_factory=dict, description="Initial workflow variables"
     )
     execution_name: str | None = Field(None, description="Optional execution name")
+    priority: AgentPriority = Field(AgentPriority.NORMAL, description="Scheduling priority")
 
 
 class WorkflowExecutionResponse(BaseModel):
@@ -81,6 +85,7 @@ class WorkflowExecutionResponse(BaseModel):
     created_at: str
     started_at: str | None = None
     completed_at: str | None = None
+    queue_position: int | None = None
 
 
 class AgentMetadataResponse(BaseModel):
@@ -125,6 +130,7 @@ async def execute_workflow(
             template_id=request.template_id,
             initial_variables=request.initial_variables,
             execution_name=request.execution_name,
+            priority=request.priority,
         )
 
         return WorkflowExecutionResponse(
@@ -135,8 +141,14 @@ async def execute_workflow(
             created_at=execution.created_at.isoformat(),
             started_at=execution.started_at.isoformat() if execution.started_at else None,
             completed_at=execution.completed_at.isoformat() if execution.completed_at else None,
+            queue_position=orchestrator.workflow_engine.scheduler.position(execution.execution_id)
+            or None,
         )
 
+    except SchedulerSaturated as e:
+        raise HTTPException(
+            status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)}
+        )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -158,17 +170,22 @@ async def get_workflow_status(
     Returns:
         Workflow status
     """
-    execution = orchestrator.workflow_engine.get_execution(execution_id)
+    execution = await orchestrator.workflow_engine.get_execution(execution_id)
 
     if not execution:
         raise HTTPException(status_code=404, detail="Workflow execution not found")
 
+    return _status_payload(orchestrator.workflow_engine, execution)
+
+
+def _status_payload(engine: WorkflowEngine, execution: WorkflowExecution) -> dict[str, Any]:
     return {
         "execution_id": execution.execution_id,
         "status": execution.status.value,
         "started_at": execution.started_at.isoformat() if execution.started_at else None,
         "completed_at": execution.completed_at.isoformat() if execution.completed_at else None,
         "error": execution.error,
+        "queue_position": engine.scheduler.position(execution.execution_id) or None,
         "steps": [
             {
                 "step_id": step.step_id,
@@ -181,6 +198,55 @@ async def get_workflow_status(
     }
 
 
+@router.get("/workflows/{execution_id}/events")
+async def stream_workflow_events(
+    execution_id: str,
+    request: Request,
+    orchestrator: AgentOrchestrator = Depends(get_orchestrator),
+) -> StreamingResponse:
+    """Stream workflow and step state transitions (Server-Sent Events).
+
+    The first event (``snapshot``) has the same shape as the status
+    endpoint; ``workflow`` and ``step`` events follow as they happen, and
+    the stream ends after the execution reaches a terminal status.
+
+    Args:
+        execution_id: Execution identifier
+        request: Incoming request (used to detect disconnects)
+        orchestrator: Agent orchestrator instance
+
+    Returns:
+        ``text/event-stream`` response
+    """
+    engine = orchestrator.workflow_engine
+    if not await engine.get_execution(execution_id):
+        raise HTTPException(status_code=404, detail="Workflow execution not found")
+
+    async def generate():
+        async with engine.events.subscribe(execution_id) as subscription:
+            # Tila luetaan vasta tilauksen jälkeen, jottei välissä tapahtunut siirtymä katoa
+            execution = await engine.get_execution(execution_id)
+            snapshot = _status_payload(engine, execution)
+            yield format_sse("snapshot", snapshot)
+            if snapshot["status"] in TERMINAL_STATUSES:
+                return
+
+            while not await request.is_disconnected():
+                event = await subscription.get(timeout=HEARTBEAT_S)
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event["event"], event)
+                if event["event"] == "workflow" and event["status"] in TERMINAL_STATUSES:
+                    return
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/workflows/{execution_id}/result")
 async def get_workflow_result(
     execution_id: str,
@@ -195,10 +261,10 @@ async def get_workflow_result(
     Returns:
         Workflow result (final variables)
     """
-    result = orchestrator.get_workflow_result(execution_id)
+    result = await orchestrator.get_workflow_result(execution_id)
 
     if result is None:
-        execution = orchestrator.workflow_engine.get_execution(execution_id)
+        execution = await orchestrator.workflow_engine.get_execution(execution_id)
         if not execution:
             raise HTTPException(status_code=404, detail="Workflow execution not found")
 
@@ -211,6 +277,31 @@ async def get_workflow_result(
     return result
 
 
+@router.get("/scheduler")
+async def get_scheduler_stats(
+    orchestrator: AgentOrchestrator = Depends(get_orchestrator),
+) -> dict[str, Any]:
+    """Get workflow counts, step cache statistics and agent circuit states.
+
+    Args:
+        orchestrator: Agent orchestrator instance
+
+    Returns:
+        Scheduler state (running, queue depth per priority, per-tenant counts),
+        step cache counters and agent circuit breaker states
+    """
+    engine = orchestrator.workflow_engine
+    if engine.backend is not None:
+        stats = await engine.backend.stats()
+    else:
+        stats = engine.scheduler.stats()
+    return {
+        **stats,
+        "step_cache": engine.result_cache.stats(),
+        "circuits": engine.invoker.stats(),
+    }
+
+
 @router.get("/agents", response_model=list[AgentMetadataResponse])
 async def list_agents(
     agent_type: str | None = None,
@@ -286,7 +377,7 @@ async def list_executions(
         List of workflow executions
     """
     status_enum = WorkflowStatus(status) if status else None
-    executions = orchestrator.list_workflow_executions(template_id, status_enum)
+    executions = await orchestrator.list_workflow_executions(template_id, status_enum)
 
     return [
         {
@@ -0,0 +1,263 @@
+"""Execution scheduler - admission control and bounded concurrency.
+
+Workflow executions are not started directly; they are submitted here:
+
+* at most ``WORKFLOW_MAX_RUNNING`` executions run at once, the rest wait in
+  one FIFO queue per :class:`AgentPriority` (critical first);
+* a tenant may run ``WORKFLOW_TENANT_MAX_RUNNING`` executions at once -
+  its further executions wait without blocking other tenants;
+* when the queue (``WORKFLOW_MAX_QUEUED``) or the tenant's share of it
+  (``WORKFLOW_TENANT_MAX_QUEUED``) is full, :meth:`ExecutionScheduler.submit`
+  raises :class:`SchedulerSaturated` and the API answers 429.
+
+Agent calls inside running workflows are additionally bounded per agent by
+``AgentMetadata.max_concurrency`` (:class:`AgentSlots`).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from .agent_registry import AgentPriority, AgentRegistry
+
+if TYPE_CHECKING:
+    from .workflow_engine import WorkflowExecution
+
+logger = logging.getLogger("converto.agent_orchestrator.scheduler")
+
+MAX_RUNNING = int(os.getenv("WORKFLOW_MAX_RUNNING", "16"))
+MAX_QUEUED = int(os.getenv("WORKFLOW_MAX_QUEUED", "500"))
+TENANT_MAX_RUNNING = int(os.getenv("WORKFLOW_TENANT_MAX_RUNNING", "4"))
+TENANT_MAX_QUEUED = int(os.getenv("WORKFLOW_TENANT_MAX_QUEUED", "50"))
+RETRY_AFTER_S = int(os.getenv("WORKFLOW_RETRY_AFTER_S", "5"))
+
+PRIORITY_ORDER = (
+    AgentPriority.CRITICAL,
+    AgentPriority.HIGH,
+    AgentPriority.NORMAL,
+    AgentPriority.LOW,
+)
+
+WORKFLOW_ADMISSIONS = Counter(
+    "workflow_admissions_total", "Workflow submissions by outcome", ["outcome"]
+)
+WORKFLOW_QUEUE_DEPTH = Gauge(
+    "workflow_queue_depth", "Workflow executions waiting to start", ["priority"]
+)
+WORKFLOW_RUNNING = Gauge("workflow_running", "Workflow executions running")
+WORKFLOW_QUEUE_WAIT = Histogram(
+    "workflow_queue_wait_seconds",
+    "Time from submission to start",
+    ["priority"],
+    buckets=(0.01, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 300),
+)
+AGENT_IN_FLIGHT = Gauge("agent_in_flight", "Agent executions in flight", ["agent_id"])
+AGENT_SLOT_WAIT = Histogram(
+    "agent_slot_wait_seconds",
+    "Time spent waiting for an agent concurrency slot",
+    ["agent_id"],
+    buckets=(0.001, 0.01, 0.1, 0.5, 1, 2, 5, 10, 30),
+)
+
+
+class SchedulerSaturated(RuntimeError):
+    """Raised when a submission cannot even be queued."""
+
+    def __init__(self, message: str, retry_after: int = RETRY_AFTER_S):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class _Queued:
+    execution: WorkflowExecution
+    tenant_id: str
+    priority: AgentPriority
+    enqueued_at: float
+
+
+class ExecutionScheduler:
+    """Bounded pool of running workflow executions with priority queues."""
+
+    def __init__(
+        self,
+        run: Callable[[WorkflowExecution], Awaitable[None]],
+        max_running: int = MAX_RUNNING,
+        max_queued: int = MAX_QUEUED,
+        tenant_max_running: int = TENANT_MAX_RUNNING,
+        tenant_max_queued: int = TENANT_MAX_QUEUED,
+    ):
+        self._run = run
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.tenant_max_running = tenant_max_running
+        self.tenant_max_queued = tenant_max_queued
+        self._queues: dict[AgentPriority, deque[_Queued]] = {p: deque() for p in PRIORITY_ORDER}
+        self._queued_by_tenant: dict[str, int] = defaultdict(int)
+        self._running_by_tenant: dict[str, int] = defaultdict(int)
+        self._active = 0
+        # Viittaukset pitävät taskit hengissä (event loop säilyttää vain heikot viittaukset)
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def submit(
+        self,
+        execution: WorkflowExecution,
+        tenant_id: str,
+        priority: AgentPriority = AgentPriority.NORMAL,
+    ) -> int:
+        """Queue an execution and start it if a slot is free.
+
+        Args:
+            execution: Execution to run
+            tenant_id: Tenant the execution is accounted to
+            priority: Queue priority
+
+        Returns:
+            Queue position (0 = started)
+
+        Raises:
+            SchedulerSaturated: If the queue or the tenant's share of it is full
+        """
+        can_start = (
+            self._active < self.max_running
+            and self._running_by_tenant[tenant_id] < self.tenant_max_running
+        )
+        if not can_start and self.queued >= self.max_queued:
+            WORKFLOW_ADMISSIONS.labels(outcome="rejected").inc()
+            raise SchedulerSaturated("Workflow queue is full, retry later")
+        if not can_start and self._queued_by_tenant[tenant_id] >= self.tenant_max_queued:
+            WORKFLOW_ADMISSIONS.labels(outcome="rejected").inc()
+            raise SchedulerSaturated(f"Too many queued workflows for tenant {tenant_id}")
+
+        self._queues[priority].append(
+            _Queued(execution, tenant_id, priority, time.perf_counter())
+        )
+        self._queued_by_tenant[tenant_id] += 1
+        self._dispatch()
+
+        position = self.position(execution.execution_id)
+        WORKFLOW_ADMISSIONS.labels(outcome="queued" if position else "started").inc()
+        return position
+
+    def position(self, execution_id: str) -> int:
+        """1-based position in the dispatch order, 0 when not queued."""
+        ahead = 0
+        for priority in PRIORITY_ORDER:
+            for item in self._queues[priority]:
+                ahead += 1
+                if item.execution.execution_id == execution_id:
+                    return ahead
+        return 0
+
+    def stats(self) -> dict[str, Any]:
+        """Current pool and queue state."""
+        return {
+            "running": self._active,
+            "max_running": self.max_running,
+            "queued": {p.value: len(self._queues[p]) for p in PRIORITY_ORDER},
+            "max_queued": self.max_queued,
+            "running_by_tenant": {t: n for t, n in self._running_by_tenant.items() if n},
+            "queued_by_tenant": {t: n for t, n in self._queued_by_tenant.items() if n},
+        }
+
+    def _next(self) -> _Queued | None:
+        # Korkein prioriteetti ensin; tenantit, joiden kiintiö on täynnä, ohitetaan
+        for priority in PRIORITY_ORDER:
+            queue = self._queues[priority]
+            for i, item in enumerate(queue):
+                if self._running_by_tenant[item.tenant_id] < self.tenant_max_running:
+                    del queue[i]
+                    return item
+        return None
+
+    def _dispatch(self) -> None:
+        while self._active < self.max_running:
+            item = self._next()
+            if item is None:
+                break
+            self._queued_by_tenant[item.tenant_id] -= 1
+            self._running_by_tenant[item.tenant_id] += 1
+            self._active += 1
+            WORKFLOW_QUEUE_WAIT.labels(priority=item.priority.value).observe(
+                time.perf_counter() - item.enqueued_at
+            )
+            task = asyncio.create_task(self._run_item(item))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        self._update_gauges()
+
+    async def _run_item(self, item: _Queued) -> None:
+        try:
+            await self._run(item.execution)
+        except Exception as e:
+            logger.error(f"Workflow {item.execution.execution_id} crashed: {e}")
+        finally:
+            self._running_by_tenant[item.tenant_id] -= 1
+            self._active -= 1
+            self._dispatch()
+
+    def _update_gauges(self) -> None:
+        WORKFLOW_RUNNING.set(self._active)
+        for priority in PRIORITY_ORDER:
+            WORKFLOW_QUEUE_DEPTH.labels(priority=priority.value).set(len(self._queues[priority]))
+
+
+class AgentSlots:
+    """Per-agent in-flight limits from ``AgentMetadata.max_concurrency``."""
+
+    def __init__(self, agent_registry: AgentRegistry):
+        self.agent_registry = agent_registry
+        self._semaphores: dict[str, asyncio.Semaphore | None] = {}
+
+    def _semaphore(self, agent_id: str) -> asyncio.Semaphore | None:
+        # Luodaan ensimmäisellä käytöllä, jotta semafori sidotaan ajossa olevaan looppiin
+        if agent_id not in self._semaphores:
+            metadata = self.agent_registry.get_metadata(agent_id)
+            limit = metadata.max_concurrency if metadata else None
+            self._semaphores[agent_id] = asyncio.Semaphore(limit) if limit else None
+        return self._semaphores[agent_id]
+
+    @asynccontextmanager
+    async def slot(self, agent_id: str) -> AsyncIterator[None]:
+        """Hold one of the agent's slots for the duration of the block."""
+        semaphore = self._semaphore(agent_id)
+        t0 = time.perf_counter()
+        if semaphore is not None:
+            await semaphore.acquire()
+        AGENT_SLOT_WAIT.labels(agent_id=agent_id).observe(time.perf_counter() - t0)
+        AGENT_IN_FLIGHT.labels(agent_id=agent_id).inc()
+        try:
+            yield
+        finally:
+            self.release(agent_id)
+
+    async def try_acquire(self, agent_id: str) -> bool:
+        """Take a slot only if one is free right now (release with :meth:`release`)."""
+        semaphore = self._semaphore(agent_id)
+        if semaphore is not None:
+            if semaphore.locked():
+                return False
+            # Vapaa semafori ei odota, joten tarkistus ja otto ovat atomisia
+            await semaphore.acquire()
+        AGENT_IN_FLIGHT.labels(agent_id=agent_id).inc()
+        return True
+
+    def release(self, agent_id: str) -> None:
+        """Return a slot taken with :meth:`slot` or :meth:`try_acquire`."""
+        AGENT_IN_FLIGHT.labels(agent_id=agent_id).dec()
+        semaphore = self._semaphores.get(agent_id)
+        if semaphore is not None:
+            semaphore.release()
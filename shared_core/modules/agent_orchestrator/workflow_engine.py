@@ -2,21 +2,42 @@
 
 import asyncio
 import logging
+import os
+from collections import deque
 from dataclasses import dataclass, field
-from datetime import datetime
+from datetime import datetime, timezone
 from enum import Enum
-from typing import Any
+from typing import TYPE_CHECKING, Any
 from uuid import uuid4
 
-from .agent_registry import AgentRegistry
+from .agent_registry import Agent, AgentPriority, AgentRegistry
+from .events import WorkflowEventBus
+from .resilience import AGENT_FALLBACKS, AgentInvoker
+from .result_cache import ENABLED as STEP_CACHE_ENABLED
+from .result_cache import StepResultCache, cache_key
+from .scheduler import AgentSlots, ExecutionScheduler, SchedulerSaturated
+from .workflow_persistence import (
+    RESUME_RETRY_S,
+    RESUME_STALE_S,
+    CheckpointWriter,
+    claim_execution,
+    find_resumable_executions,
+)
+
+if TYPE_CHECKING:
+    from .distributed import RedisExecutionBackend
 
 logger = logging.getLogger("converto.agent_orchestrator")
 
+# Rinnakkain ajettavien steppien yläraja per workflow (template voi ylikirjoittaa)
+MAX_PARALLEL_STEPS = int(os.getenv("WORKFLOW_MAX_PARALLEL_STEPS", "8"))
+
 
 class WorkflowStatus(str, Enum):
     """Workflow execution status."""
 
     PENDING = "pending"
+    QUEUED = "queued"
     RUNNING = "running"
     COMPLETED = "completed"
     FAILED = "failed"
@@ -60,6 +81,7 @@ class WorkflowTemplate:
     steps: list[dict[str, Any]]  # Step definitions
     version: str = "1.0.0"
     tags: list[str] = field(default_factory=list)
+    max_concurrency: int | None = None  # Parallel steps per execution (default: MAX_PARALLEL_STEPS)
 
 
 @dataclass
@@ -79,13 +101,65 @@ class WorkflowExecution:
     metadata: dict[str, Any] = field(default_factory=dict)
 
 
+def _naive_utc(value: datetime | None) -> datetime | None:
+    # Moottori käyttää naiiveja UTC-aikoja; PostgreSQL palauttaa timezone=True-sarakkeet aware-muodossa
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _parse_dt(value: str | None) -> datetime | None:
+    return _naive_utc(datetime.fromisoformat(value)) if value else None
+
+
+def build_steps(step_defs: list[dict[str, Any]]) -> list[WorkflowStep]:
+    """Create fresh workflow steps from template step definitions.
+
+    Args:
+        step_defs: ``WorkflowTemplate.steps``
+
+    Returns:
+        Pending workflow steps
+    """
+    return [
+        WorkflowStep(
+            step_id=step_def["step_id"],
+            agent_id=step_def["agent_id"],
+            input_mapping=step_def.get("input_mapping", {}),
+            output_mapping=step_def.get("output_mapping", {}),
+            dependencies=step_def.get("dependencies", []),
+            condition=step_def.get("condition"),
+        )
+        for step_def in step_defs
+    ]
+
+
 class WorkflowEngine:
     """Engine for executing multi-agent workflows."""
 
-    def __init__(self, agent_registry: AgentRegistry):
+    def __init__(
+        self,
+        agent_registry: AgentRegistry,
+        backend: "RedisExecutionBackend | None" = None,
+    ):
+        from .distributed import get_execution_backend
+
         self.agent_registry = agent_registry
+        # None = executions run in this process (ExecutionScheduler)
+        self.backend = backend if backend is not None else get_execution_backend()
         self._templates: dict[str, WorkflowTemplate] = {}
+        # template_id -> (in-degree per step, dependents per step)
+        self._graphs: dict[str, tuple[dict[str, int], dict[str, list[str]]]] = {}
         self._executions: dict[str, WorkflowExecution] = {}
+        self.scheduler = ExecutionScheduler(self._run_workflow)
+        self.agent_slots = AgentSlots(agent_registry)
+        self.invoker = AgentInvoker(agent_registry, self.agent_slots)
+        self.result_cache = StepResultCache()
+        self.events = WorkflowEventBus()
+        self.checkpoints = CheckpointWriter()
+        self._recovery_task: asyncio.Task | None = None
+        # Jatkettavaksi otetut, jotka eivät vielä mahtuneet schedulerin jonoon
+        self._unsubmitted: dict[str, WorkflowExecution] = {}
         self._load_default_templates()
 
     def register_template(self, template: WorkflowTemplate) -> None:
@@ -93,10 +167,63 @@ class WorkflowEngine:
 
         Args:
             template: Workflow template to register
+
+        Raises:
+            ValueError: If step IDs are duplicated, a dependency is unknown or
+                the dependencies contain a cycle
         """
+        self._graphs[template.template_id] = self._build_graph(template)
         self._templates[template.template_id] = template
         logger.info(f"Registered workflow template: {template.template_id} ({template.name})")
 
+    @staticmethod
+    def _build_graph(
+        template: WorkflowTemplate,
+    ) -> tuple[dict[str, int], dict[str, list[str]]]:
+        """Validate a template's step graph and precompute its scheduling index.
+
+        Args:
+            template: Workflow template
+
+        Returns:
+            In-degree per step and reverse adjacency (step -> dependent steps)
+        """
+        indegree: dict[str, int] = {}
+        for step_def in template.steps:
+            step_id = step_def["step_id"]
+            if step_id in indegree:
+                raise ValueError(f"Duplicate step_id in {template.template_id}: {step_id}")
+            indegree[step_id] = 0
+
+        dependents: dict[str, list[str]] = {step_id: [] for step_id in indegree}
+        for step_def in template.steps:
+            for dep_id in set(step_def.get("dependencies", [])):
+                if dep_id not in indegree:
+                    raise ValueError(
+                        f"Step {step_def['step_id']} in {template.template_id} "
+                        f"depends on unknown step: {dep_id}"
+                    )
+                dependents[dep_id].append(step_def["step_id"])
+                indegree[step_def["step_id"]] += 1
+
+        # Kahn: jos kaikkia steppejä ei saada järjestettyä, verkossa on sykli
+        remaining = dict(indegree)
+        queue = deque(step_id for step_id, degree in remaining.items() if degree == 0)
+        visited = 0
+        while queue:
+            visited += 1
+            for child in dependents[queue.popleft()]:
+                remaining[child] -= 1
+                if remaining[child] == 0:
+                    queue.append(child)
+        if visited != len(indegree):
+            cyclic = sorted(step_id for step_id, degree in remaining.items() if degree > 0)
+            raise ValueError(
+                f"Dependency cycle in workflow template {template.template_id}: {cyclic}"
+            )
+
+        return indegree, dependents
+
     def get_template(self, template_id: str) -> WorkflowTemplate | None:
         """Get a workflow template by ID.
 
@@ -117,34 +244,35 @@ class WorkflowEngine:
         return list(self._templates.values())
 
     async def execute_workflow(
-        self, template_id: str, initial_variables: dict[str, Any], execution_name: str | None = None
+        self,
+        template_id: str,
+        initial_variables: dict[str, Any],
+        execution_name: str | None = None,
+        priority: AgentPriority = AgentPriority.NORMAL,
     ) -> WorkflowExecution:
         """Execute a workflow from a template.
 
+        The execution is handed to the scheduler; it starts right away when a
+        slot is free and is returned with status ``queued`` otherwise.
+
         Args:
             template_id: Template identifier
             initial_variables: Initial workflow variables
             execution_name: Optional name for this execution
+            priority: Scheduling priority
 
         Returns:
             Workflow execution instance
+
+        Raises:
+            SchedulerSaturated: If the execution queue is full
         """
         template = self.get_template(template_id)
         if not template:
             raise ValueError(f"Workflow template not found: {template_id}")
 
         # Create workflow steps from template
-        steps = []
-        for step_def in template.steps:
-            step = WorkflowStep(
-                step_id=step_def["step_id"],
-                agent_id=step_def["agent_id"],
-                input_mapping=step_def.get("input_mapping", {}),
-                output_mapping=step_def.get("output_mapping", {}),
-                dependencies=step_def.get("dependencies", []),
-                condition=step_def.get("condition"),
-            )
-            steps.append(step)
+        steps = build_steps(template.steps)
 
         # Validate dependencies
         agent_ids = [step.agent_id for step in steps]
@@ -161,75 +289,276 @@ class WorkflowEngine:
             variables=initial_variables.copy(),
             created_at=datetime.utcnow(),
         )
-
+        tenant_id = str(initial_variables.get("tenant_id") or "default")
+        execution.metadata.update({"tenant_id": tenant_id, "priority": priority.value})
+
+        if self.backend is not None:
+            # Any orchestrator worker picks up the steps (see distributed.py)
+            indegree, dependents = self._graphs[template_id]
+            await self.backend.submit(execution, template.steps, indegree, dependents)
+            self.events.publish(execution)
+            return execution
+
+        position = self.scheduler.submit(execution, tenant_id, priority)
+        if position:
+            execution.status = WorkflowStatus.QUEUED
+            execution.metadata["queue_position"] = position
         self._executions[execution.execution_id] = execution
-
-        # Execute workflow asynchronously
-        asyncio.create_task(self._run_workflow(execution))
+        self._checkpoint(execution)
+        self.events.publish(execution)
 
         return execution
 
+    def _checkpoint(self, execution: WorkflowExecution) -> None:
+        """Queue a durable checkpoint (in-process mode; Redis keeps its own state)."""
+        if self.backend is None:
+            self.checkpoints.mark(execution)
+
+    async def start(self) -> None:
+        """Resume orphaned executions and keep watching for them.
+
+        Call once from the application startup hook.
+        """
+        if self.backend is not None or self._recovery_task is not None:
+            return
+        await self.resume_incomplete()
+        self._recovery_task = asyncio.create_task(self._recovery_loop())
+
+    async def close(self) -> None:
+        """Stop recovery and flush pending checkpoints (application shutdown)."""
+        if self._recovery_task is not None:
+            self._recovery_task.cancel()
+            await asyncio.gather(self._recovery_task, return_exceptions=True)
+            self._recovery_task = None
+        await self.checkpoints.close()
+        await self.events.close()
+
+    async def _recovery_loop(self) -> None:
+        while True:
+            # Täyden jonon takia odottavia yritetään uudelleen tiheämmin
+            await asyncio.sleep(RESUME_RETRY_S if self._unsubmitted else RESUME_STALE_S / 2)
+            try:
+                await self.resume_incomplete()
+            except Exception as e:
+                logger.error(f"Workflow recovery scan failed: {e}")
+
+    def _claim_orphans(self) -> list[dict[str, Any]]:
+        owner = self.checkpoints.owner
+        with self.checkpoints.session_factory() as db:
+            claimed = []
+            for record in find_resumable_executions(db, owner):
+                row = {
+                    "id": record.id,
+                    "template_id": record.template_id,
+                    "name": record.name,
+                    "created_at": _naive_utc(record.created_at),
+                    "started_at": _naive_utc(record.started_at),
+                    "variables": record.final_variables or record.initial_variables or {},
+                    "steps_data": record.steps_data or {},
+                }
+                if claim_execution(db, record, owner):
+                    claimed.append(row)
+            return claimed
+
+    async def resume_incomplete(self) -> int:
+        """Resume executions left unfinished by a stopped process.
+
+        Steps whose results were checkpointed are not run again; their
+        results feed the remaining steps as if they had just completed.
+        Claimed executions that do not fit the scheduler queue are kept
+        and submitted again on the next recovery pass.
+
+        Returns:
+            Number of executions resumed
+        """
+        resumed = self._submit_unsubmitted()
+        for row in await asyncio.to_thread(self._claim_orphans):
+            saved_steps = row["steps_data"].get("steps", {})
+            metadata = row["steps_data"].get("metadata", {})
+            metadata.pop("queue_position", None)
+            metadata["resumed_at"] = datetime.utcnow().isoformat()
+
+            template = self._templates.get(row["template_id"])
+            steps = build_steps(template.steps) if template else []
+            for step in steps:
+                saved = saved_steps.get(step.step_id) or {}
+                if saved.get("status") == StepStatus.COMPLETED.value:
+                    step.status = StepStatus.COMPLETED
+                    step.result = saved.get("result")
+                    step.started_at = _parse_dt(saved.get("started_at"))
+                    step.completed_at = _parse_dt(saved.get("completed_at"))
+
+            execution = WorkflowExecution(
+                execution_id=row["id"],
+                template_id=row["template_id"],
+                name=row["name"],
+                status=WorkflowStatus.PENDING,
+                steps=steps,
+                variables=row["variables"],
+                created_at=row["created_at"] or datetime.utcnow(),
+                started_at=row["started_at"],
+                metadata=metadata,
+            )
+            self._executions[execution.execution_id] = execution
+
+            if template is None:
+                execution.status = WorkflowStatus.FAILED
+                execution.error = f"Cannot resume: template {row['template_id']} not registered"
+                execution.completed_at = datetime.utcnow()
+                self._checkpoint(execution)
+                continue
+
+            execution.status = WorkflowStatus.QUEUED
+            if self._submit_resumed(execution):
+                resumed += 1
+            self._checkpoint(execution)
+            self.events.publish(execution)
+            done = sum(step.status == StepStatus.COMPLETED for step in steps)
+            logger.info(
+                f"Resumed workflow {execution.execution_id} "
+                f"({done}/{len(steps)} steps already completed)"
+            )
+        return resumed
+
+    def _submit_resumed(self, execution: WorkflowExecution) -> bool:
+        """Hand a claimed execution to the scheduler, or keep it for a retry."""
+        priority = AgentPriority(execution.metadata.get("priority", AgentPriority.NORMAL.value))
+        tenant_id = execution.metadata.get("tenant_id") or "default"
+        try:
+            position = self.scheduler.submit(execution, tenant_id, priority)
+        except SchedulerSaturated:
+            # Omistamme suorituksen jo (heartbeat pitää sen tuoreena), joten
+            # kukaan muu ei jatka sitä - yritetään tässä prosessissa uudelleen
+            self._unsubmitted[execution.execution_id] = execution
+            return False
+        self._unsubmitted.pop(execution.execution_id, None)
+        if position:
+            execution.metadata["queue_position"] = position
+        else:
+            execution.status = WorkflowStatus.PENDING
+        return True
+
+    def _submit_unsubmitted(self) -> int:
+        submitted = 0
+        for execution in list(self._unsubmitted.values()):
+            if not self._submit_resumed(execution):
+                break
+            self._checkpoint(execution)
+            self.events.publish(execution)
+            submitted += 1
+        return submitted
+
     async def _run_workflow(self, execution: WorkflowExecution) -> None:
         """Run a workflow execution (internal method).
 
+        Steps are scheduled from the template's dependency index: each step
+        starts as soon as its last dependency completes, up to the workflow's
+        concurrency cap. The first failure cancels the steps still running.
+
         Args:
             execution: Workflow execution to run
         """
         execution.status = WorkflowStatus.RUNNING
-        execution.started_at = datetime.utcnow()
+        execution.started_at = execution.started_at or datetime.utcnow()
+        self._checkpoint(execution)
+        self.events.publish(execution)
+        running: dict[asyncio.Task, WorkflowStep] = {}
 
         try:
-            # Build dependency graph
+            template = self._templates[execution.template_id]
+            indegree, dependents = self._graphs[execution.template_id]
+            indegree = dict(indegree)
+            limit = max(1, template.max_concurrency or MAX_PARALLEL_STEPS)
+
             step_map = {step.step_id: step for step in execution.steps}
-            ready_steps = self._get_ready_steps(execution.steps)
+            # Jatketussa suorituksessa valmiit stepit on jo laskettu riippuvuuksista pois
+            for step in execution.steps:
+                if step.status == StepStatus.COMPLETED:
+                    for child_id in dependents[step.step_id]:
+                        indegree[child_id] -= 1
+            ready = deque(
+                step.step_id
+                for step in execution.steps
+                if step.status == StepStatus.PENDING and indegree[step.step_id] == 0
+            )
 
-            while ready_steps:
-                # Execute ready steps in parallel
-                tasks = [
-                    self._execute_step(step, execution.variables, step_map) for step in ready_steps
-                ]
+            while ready or running:
+                while ready and len(running) < limit:
+                    step = step_map[ready.popleft()]
+                    task = asyncio.create_task(self._execute_step(step, execution, step_map))
+                    running[task] = step
+                self._checkpoint(execution)
 
-                results = await asyncio.gather(*tasks, return_exceptions=True)
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
 
-                # Update step results
-                for step, result in zip(ready_steps, results, strict=False):
-                    if isinstance(result, Exception):
+                failed = False
+                for task in done:
+                    step = running.pop(task)
+                    error = task.exception()
+                    if error is not None:
                         step.status = StepStatus.FAILED
-                        step.error = str(result)
-                        logger.error(f"Step {step.step_id} failed: {result}")
-                    else:
-                        step.status = StepStatus.COMPLETED
-                        step.result = result
-
-                # Check if any step failed
-                if any(step.status == StepStatus.FAILED for step in ready_steps):
+                        step.error = str(error)
+                        logger.error(f"Step {step.step_id} failed: {error}")
+                        self.events.publish(execution, step)
+                        failed = True
+                        continue
+
+                    step.status = StepStatus.COMPLETED
+                    step.result = task.result()
+                    self.events.publish(execution, step)
+                    for child_id in dependents[step.step_id]:
+                        indegree[child_id] -= 1
+                        if indegree[child_id] == 0:
+                            ready.append(child_id)
+
+                if failed:
+                    await self._cancel_steps(execution, running)
                     execution.status = WorkflowStatus.FAILED
                     execution.error = "One or more steps failed"
                     execution.completed_at = datetime.utcnow()
                     return
 
-                # Get next ready steps
-                ready_steps = self._get_ready_steps(execution.steps)
-
             # All steps completed successfully
             execution.status = WorkflowStatus.COMPLETED
             execution.completed_at = datetime.utcnow()
             logger.info(f"Workflow {execution.execution_id} completed successfully")
 
         except Exception as e:
+            await self._cancel_steps(execution, running)
             execution.status = WorkflowStatus.FAILED
             execution.error = str(e)
             execution.completed_at = datetime.utcnow()
             logger.error(f"Workflow {execution.execution_id} failed: {e}")
 
+        finally:
+            self._checkpoint(execution)
+            self.events.publish(execution)
+
+    async def _cancel_steps(
+        self, execution: WorkflowExecution, running: dict[asyncio.Task, WorkflowStep]
+    ) -> None:
+        """Cancel in-flight steps after a sibling failed."""
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        for step in running.values():
+            step.status = StepStatus.SKIPPED
+            step.error = "Cancelled after another step failed"
+            step.completed_at = datetime.utcnow()
+            self.events.publish(execution, step)
+        running.clear()
+
     async def _execute_step(
-        self, step: WorkflowStep, variables: dict[str, Any], step_map: dict[str, WorkflowStep]
+        self,
+        step: WorkflowStep,
+        execution: WorkflowExecution,
+        step_map: dict[str, WorkflowStep],
     ) -> dict[str, Any]:
         """Execute a single workflow step.
 
         Args:
             step: Step to execute
-            variables: Workflow variables
+            execution: Workflow execution the step belongs to
             step_map: Map of step_id to WorkflowStep
 
         Returns:
@@ -237,23 +566,24 @@ class WorkflowEngine:
         """
         step.status = StepStatus.RUNNING
         step.started_at = datetime.utcnow()
+        self.events.publish(execution, step)
+        variables = execution.variables
 
         try:
-            # Build agent input from workflow variables
+            # Build agent input: agent input key -> workflow variable or "step:<id>[:<key>]"
             agent_input = {}
-            for var_name, input_key in step.input_mapping.items():
-                if var_name in variables:
-                    agent_input[input_key] = variables[var_name]
-                elif var_name.startswith("step:"):
+            for input_key, source in step.input_mapping.items():
+                if source.startswith("step:"):
                     # Reference to another step's output
-                    step_id = var_name.split(":")[1]
+                    _, step_id, *output_key = source.split(":", 2)
                     dep_step = step_map.get(step_id)
                     if dep_step and dep_step.result:
-                        output_key = var_name.split(":")[2] if ":" in var_name[5:] else None
-                        if output_key and output_key in dep_step.result:
-                            agent_input[input_key] = dep_step.result[output_key]
-                        else:
+                        if output_key and output_key[0] in dep_step.result:
+                            agent_input[input_key] = dep_step.result[output_key[0]]
+                        elif not output_key:
                             agent_input[input_key] = dep_step.result
+                elif source in variables:
+                    agent_input[input_key] = variables[source]
 
             # Get agent and execute
             agent = self.agent_registry.get_agent(step.agent_id)
@@ -268,27 +598,27 @@ class WorkflowEngine:
             context = {
                 "workflow_variables": variables,
                 "step_id": step.step_id,
-                "execution_id": step.step_id,  # Simplified
+                "execution_id": execution.execution_id,
             }
 
-            result = await agent.execute(agent_input, context)
+            try:
+                result = await self._call_agent(step, execution, agent, agent_input, context)
+            except Exception as e:
+                metadata = self.agent_registry.get_metadata(step.agent_id)
+                fallback_id = metadata.fallback_agent_id if metadata else None
+                fallback = self.agent_registry.get_agent(fallback_id) if fallback_id else None
+                if fallback is None or not await fallback.validate_input(agent_input):
+                    raise
+                logger.warning(
+                    f"Step {step.step_id}: agent {step.agent_id} failed ({e}), "
+                    f"using fallback {fallback_id}"
+                )
+                AGENT_FALLBACKS.labels(agent_id=step.agent_id, fallback_agent_id=fallback_id).inc()
+                execution.metadata.setdefault("fallback_steps", {})[step.step_id] = fallback_id
+                result = await self._call_agent(step, execution, fallback, agent_input, context)
 
             # Map agent output to workflow variables
-            for output_key, var_name in step.output_mapping.items():
-                if output_key in result:
-                    variables[var_name] = result[output_key]
-                # Handle nested keys (e.g., "step:ocr_extract:extracted_data")
-                elif "." in output_key:
-                    # Try to access nested key
-                    keys = output_key.split(".")
-                    current = result
-                    for key in keys:
-                        if isinstance(current, dict) and key in current:
-                            current = current[key]
-                        else:
-                            break
-                    else:
-                        variables[var_name] = current
+            variables.update(self.map_outputs(step, result))
 
             step.completed_at = datetime.utcnow()
             return result
@@ -299,35 +629,60 @@ class WorkflowEngine:
             step.completed_at = datetime.utcnow()
             raise
 
-    def _get_ready_steps(self, steps: list[WorkflowStep]) -> list[WorkflowStep]:
-        """Get steps that are ready to execute (dependencies satisfied).
+    async def _call_agent(
+        self,
+        step: WorkflowStep,
+        execution: WorkflowExecution,
+        agent: Agent,
+        agent_input: dict[str, Any],
+        context: dict[str, Any],
+    ) -> dict[str, Any]:
+        """Run one agent for a step through the result cache and the invoker."""
 
-        Args:
-            steps: List of workflow steps
+        async def run() -> dict[str, Any]:
+            return await self.invoker.invoke(agent, agent_input, context)
 
-        Returns:
-            List of ready steps
-        """
-        ready = []
+        metadata = agent.get_metadata()
+        if not (STEP_CACHE_ENABLED and metadata.cacheable):
+            return await run()
 
-        for step in steps:
-            if step.status != StepStatus.PENDING:
-                continue
+        key = cache_key(metadata, agent.cache_identity(agent_input), execution.variables)
+        result, cached = await self.result_cache.get_or_run(metadata, key, run)
+        if cached:
+            execution.metadata.setdefault("cached_steps", []).append(step.step_id)
+            logger.debug(f"Step {step.step_id} served from cache ({metadata.agent_id})")
+        return result
 
-            # Check if all dependencies are completed
-            deps_completed = True
-            for dep_id in step.dependencies:
-                dep_step = next((s for s in steps if s.step_id == dep_id), None)
-                if not dep_step or dep_step.status != StepStatus.COMPLETED:
-                    deps_completed = False
-                    break
+    @staticmethod
+    def map_outputs(step: WorkflowStep, result: dict[str, Any]) -> dict[str, Any]:
+        """Workflow variables set by a step's output mapping.
 
-            if deps_completed:
-                ready.append(step)
+        Args:
+            step: Completed step
+            result: Agent execution result
 
-        return ready
+        Returns:
+            Variable name -> value
+        """
+        outputs = {}
+        for output_key, var_name in step.output_mapping.items():
+            if output_key in result:
+                outputs[var_name] = result[output_key]
+            # Handle nested keys (e.g., "extracted_data.vendor")
+            elif "." in output_key:
+                # Try to access nested key
+                keys = output_key.split(".")
+                current = result
+                for key in keys:
+                    if isinstance(current, dict) and key in current:
+                        current = current[key]
+                    else:
+                        break
+                else:
+                    outputs[var_name] = current
+        return outputs
 
-    def get_execution(self, execution_id: str) -> WorkflowExecution | None:
+    async def get_execution(self, execution_id: str) -> WorkflowExecution | None:
         """Get a workflow execution by ID.
 
         Args:
@@ -336,9 +691,11 @@ class WorkflowEngine:
         Returns:
             Workflow execution or None if not found
         """
+        if self.backend is not None:
+            return await self.backend.load(execution_id)
         return self._executions.get(execution_id)
 
-    def list_executions(
+    async def list_executions(
         self, template_id: str | None = None, status: WorkflowStatus | None = None
     ) -> list[WorkflowExecution]:
         """List workflow executions, optionally filtered.
@@ -350,7 +707,10 @@ class WorkflowEngine:
         Returns:
             List of workflow executions
         """
-        executions = list(self._executions.values())
+        if self.backend is not None:
+            executions = await self.backend.list_recent()
+        else:
+            executions = list(self._executions.values())
 
         if template_id:
             executions = [e for e in executions if e.template_id == template_id]
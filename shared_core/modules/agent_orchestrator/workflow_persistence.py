@@ -1,18 +1,45 @@
 """Workflow Persistence - Save and load workflows from database."""
 
+import asyncio
+import json
 import logging
-from datetime import datetime
-from typing import Any
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any
 from uuid import uuid4
 
-from sqlalchemy import JSON, Boolean, Column, DateTime, Float, Integer, String, Text
+from sqlalchemy import (
+    JSON,
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    Integer,
+    String,
+    Text,
+    or_,
+    update,
+)
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import func
 
-from shared_core.utils.db import Base
+from shared_core.utils.db import Base, SessionLocal, register_added_columns
+
+if TYPE_CHECKING:
+    from .workflow_engine import WorkflowExecution
 
 logger = logging.getLogger("converto.agent_orchestrator")
 
+CHECKPOINT_INTERVAL_S = float(os.getenv("WORKFLOW_CHECKPOINT_INTERVAL_S", "0.5"))
+# Keskeneräiset suoritukset kirjoitetaan uudelleen tällä välillä (elossaolomerkki)
+CHECKPOINT_HEARTBEAT_S = float(os.getenv("WORKFLOW_CHECKPOINT_HEARTBEAT_S", "30"))
+# Suoritus, jonka checkpoint on tätä vanhempi, katsotaan orvoksi ja jatketaan
+RESUME_STALE_S = float(os.getenv("WORKFLOW_RESUME_STALE_S", "120"))
+# Otettu mutta täyden jonon takia odottava suoritus yritetään uudelleen tällä välillä
+RESUME_RETRY_S = float(os.getenv("WORKFLOW_RESUME_RETRY_S", "5"))
+INCOMPLETE_STATUSES = ("pending", "queued", "running", "resuming")
+
 
 class SavedWorkflow(Base):
     """Saved workflow definition in database."""
@@ -72,6 +99,13 @@ class WorkflowExecutionRecord(Base):
     started_at = Column(DateTime(timezone=True), nullable=True)
     completed_at = Column(DateTime(timezone=True), nullable=True)
 
+    # Checkpoint: omistava prosessi ja viimeisin elossaolomerkki
+    owner = Column(String(128), nullable=True)
+    checkpointed_at = Column(DateTime, nullable=True, index=True)
+
+
+register_added_columns(WorkflowExecutionRecord.__table__, "owner", "checkpointed_at")
+
 
 class WorkflowScheduler:
     """Schedule workflows to run automatically."""
@@ -340,3 +374,216 @@ def record_execution(
 
     logger.debug(f"Workflow execution recorded: {execution_id} ({status})")
     return record
+
+
+def _plain(value: Any) -> Any:
+    """JSON-safe copy (datetimes and other objects as strings)."""
+    return json.loads(json.dumps(value, default=str))
+
+
+class CheckpointWriter:
+    """Batched, asynchronous checkpoints of workflow executions.
+
+    :meth:`mark` only records that an execution changed; a background task
+    snapshots the changed executions every ``CHECKPOINT_INTERVAL_S`` and
+    upserts them into ``workflow_executions`` in one transaction on a worker
+    thread, so step transitions add no database latency. Unfinished
+    executions are re-written every ``CHECKPOINT_HEARTBEAT_S`` so other
+    processes can tell live executions from orphaned ones.
+
+    A row is only written while this writer still owns it; once another
+    process has claimed an execution (see :func:`claim_execution`) this
+    writer stops checkpointing it.
+    """
+
+    def __init__(self, session_factory=SessionLocal, owner: str | None = None):
+        self.session_factory = session_factory
+        self.owner = owner or f"{socket.gethostname()}:{uuid4().hex[:8]}"
+        self._dirty: dict[str, WorkflowExecution] = {}
+        self._live: dict[str, WorkflowExecution] = {}
+        self._initial: dict[str, dict[str, Any]] = {}
+        self._task: asyncio.Task | None = None
+
+    def mark(self, execution: "WorkflowExecution") -> None:
+        """Schedule a checkpoint of ``execution`` (call after every transition)."""
+        if execution.execution_id not in self._initial:
+            self._initial[execution.execution_id] = _plain(execution.variables)
+        self._dirty[execution.execution_id] = execution
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        last_heartbeat = loop.time()
+        while self._dirty or self._live:
+            await asyncio.sleep(CHECKPOINT_INTERVAL_S)
+            if loop.time() - last_heartbeat >= CHECKPOINT_HEARTBEAT_S:
+                last_heartbeat = loop.time()
+                for execution_id, execution in self._live.items():
+                    self._dirty.setdefault(execution_id, execution)
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write all pending checkpoints now."""
+        if not self._dirty:
+            return
+        batch, self._dirty = self._dirty, {}
+        # Snapshot otetaan event loopissa, jotta se on johdonmukainen
+        rows = []
+        for execution_id, execution in list(batch.items()):
+            try:
+                rows.append(self._snapshot(execution))
+            except Exception as e:
+                # Yksi rikkinäinen suoritus ei saa kaataa kirjoittajaa eikä muiden checkpointteja
+                logger.error(f"Workflow {execution_id} checkpoint snapshot failed: {e}")
+                del batch[execution_id]
+        if not rows:
+            return
+        try:
+            lost = await asyncio.to_thread(self._write, rows)
+        except Exception as e:
+            logger.error(f"Workflow checkpoint failed ({len(rows)} executions): {e}")
+            for execution_id, execution in batch.items():
+                self._dirty.setdefault(execution_id, execution)
+            return
+
+        for execution_id, execution in batch.items():
+            if execution.status.value in INCOMPLETE_STATUSES and execution_id not in lost:
+                self._live[execution_id] = execution
+            else:
+                self._live.pop(execution_id, None)
+                self._initial.pop(execution_id, None)
+        for execution_id in lost:
+            logger.warning(f"Workflow {execution_id} was taken over by another process")
+
+    async def close(self) -> None:
+        """Flush remaining checkpoints and stop the background task."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def _snapshot(self, execution: "WorkflowExecution") -> dict[str, Any]:
+        duration_ms = None
+        if execution.started_at and execution.completed_at:
+            duration_ms = (execution.completed_at - execution.started_at).total_seconds() * 1000
+        return {
+            "id": execution.execution_id,
+            "tenant_id": execution.metadata.get("tenant_id"),
+            "template_id": execution.template_id,
+            "name": execution.name,
+            "status": execution.status.value,
+            "initial_variables": self._initial.get(execution.execution_id),
+            "final_variables": _plain(execution.variables),
+            "steps_data": {
+                "steps": {
+                    step.step_id: {
+                        "agent_id": step.agent_id,
+                        "status": step.status.value,
+                        "result": _plain(step.result),
+                        "error": step.error,
+                        "started_at": step.started_at.isoformat() if step.started_at else None,
+                        "completed_at": (
+                            step.completed_at.isoformat() if step.completed_at else None
+                        ),
+                    }
+                    for step in execution.steps
+                },
+                "metadata": _plain(execution.metadata),
+            },
+            "owner": self.owner,
+            "checkpointed_at": datetime.utcnow(),
+            "duration_ms": duration_ms,
+            "error_message": execution.error,
+            "started_at": execution.started_at,
+            "completed_at": execution.completed_at,
+        }
+
+    def _write(self, rows: list[dict[str, Any]]) -> set[str]:
+        """Upsert rows this writer owns; returns ids now owned by someone else."""
+        lost = set()
+        with self.session_factory() as db:
+            for row in rows:
+                values = {k: v for k, v in row.items() if k not in ("id", "initial_variables")}
+                result = db.execute(
+                    update(WorkflowExecutionRecord)
+                    .where(
+                        WorkflowExecutionRecord.id == row["id"],
+                        or_(
+                            WorkflowExecutionRecord.owner == self.owner,
+                            WorkflowExecutionRecord.owner.is_(None),
+                        ),
+                    )
+                    .values(**values)
+                )
+                if result.rowcount:
+                    continue
+                if db.get(WorkflowExecutionRecord, row["id"]) is None:
+                    db.add(WorkflowExecutionRecord(**row))
+                else:
+                    lost.add(row["id"])
+            db.commit()
+        return lost
+
+
+def find_resumable_executions(db: Session, owner: str) -> list[WorkflowExecutionRecord]:
+    """Unfinished executions whose owning process is gone.
+
+    An execution is orphaned when its last checkpoint is older than
+    ``RESUME_STALE_S``. Live owners re-write their checkpoints every
+    ``CHECKPOINT_HEARTBEAT_S``, so sibling workers on the same host are
+    never mistaken for a dead process.
+
+    Args:
+        db: Database session
+        owner: Checkpoint owner of the calling process
+
+    Returns:
+        Execution records to resume
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=RESUME_STALE_S)
+    return (
+        db.query(WorkflowExecutionRecord)
+        .filter(
+            WorkflowExecutionRecord.status.in_(INCOMPLETE_STATUSES),
+            or_(WorkflowExecutionRecord.owner.is_(None), WorkflowExecutionRecord.owner != owner),
+            or_(
+                WorkflowExecutionRecord.checkpointed_at.is_(None),
+                WorkflowExecutionRecord.checkpointed_at < stale_before,
+            ),
+        )
+        .all()
+    )
+
+
+def claim_execution(db: Session, record: WorkflowExecutionRecord, owner: str) -> bool:
+    """Atomically take over an orphaned execution (only one process wins).
+
+    The claim succeeds only if the row still has the owner it had when it
+    was found and its checkpoint is still stale, so an owner that wrote a
+    heartbeat in the meantime keeps its execution.
+
+    Args:
+        db: Database session
+        record: Record returned by :func:`find_resumable_executions`
+        owner: Checkpoint owner of the calling process
+
+    Returns:
+        True if this process now owns the execution
+    """
+    table = WorkflowExecutionRecord
+    stale_before = datetime.utcnow() - timedelta(seconds=RESUME_STALE_S)
+    result = db.execute(
+        update(table)
+        .where(
+            table.id == record.id,
+            table.status == record.status,
+            table.owner.is_(None) if record.owner is None else table.owner == record.owner,
+            # Ehto toistetaan päivityksessä: rivi voi olla ladattu uudelleen commitin jälkeen
+            or_(table.checkpointed_at.is_(None), table.checkpointed_at < stale_before),
+        )
+        .values(status="resuming", owner=owner, checkpointed_at=datetime.utcnow())
+    )
+    db.commit()
+    return result.rowcount == 1
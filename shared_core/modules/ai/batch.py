@@ -1,28 +1,360 @@
-"""Batch API support for OpenAI to reduce costs and improve throughput."""
+"""Batch API support for OpenAI to reduce costs and improve throughput.
+
+Requests are written as JSONL (one ``custom_id`` per line) to temporary
+files that are split at the provider limits (requests and bytes per batch)
+and uploaded as streams. Every provider batch is stored as a
+:class:`~.models.BatchJob` row, so a restarted process can keep polling and
+collect results by ``group_id``. Results are streamed back line by line and
+mapped by ``custom_id``; requests that fail or are missing from the output
+are retried directly with bounded concurrency.
+
+Requests fall back to direct calls only when submission itself fails. Once
+a group is submitted, its requests are billed through the Batch API; if
+waiting or collecting fails afterwards, :class:`BatchPending` carries the
+group id so the caller (or the poller) can collect it later.
+
+A group submitted with ``on_complete="<outbox kind>"`` enqueues that outbox
+event (payload ``{"group_id": ...}``) once every batch in it is finished;
+``backend/tasks/batch_poller.py`` polls pending groups in the background.
+"""
 
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
 import os
-from typing import Any
+import tempfile
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
 
-from openai import OpenAI
+from openai import AsyncOpenAI
+from sqlalchemy.exc import IntegrityError
+
+from ...utils.db import Base, SessionLocal, engine
+from .models import BatchJob
 
 logger = logging.getLogger("converto.ai.batch")
 
+# OpenAI Batch API: 50 000 pyyntöä ja 200 MB per syötetiedosto
+MAX_REQUESTS_PER_BATCH = int(os.getenv("OPENAI_BATCH_MAX_REQUESTS", "50000"))
+MAX_BYTES_PER_BATCH = int(os.getenv("OPENAI_BATCH_MAX_BYTES", str(190 * 1024 * 1024)))
+POLL_INTERVAL_S = float(os.getenv("OPENAI_BATCH_POLL_INTERVAL_S", "30"))
+FALLBACK_CONCURRENCY = int(os.getenv("OPENAI_BATCH_FALLBACK_CONCURRENCY", "8"))
+# Kuinka kauan wait() odottaa ryhmää; 24h-ikkunan koko odotus jumittaisi kutsujan
+WAIT_TIMEOUT_S = float(os.getenv("OPENAI_BATCH_WAIT_TIMEOUT_S", "3600"))
+COMPLETION_WINDOW = "24h"
+
+TERMINAL = {"completed", "failed", "expired", "cancelled"}
+
+_tables_ready = False
+
+
+class BatchPending(RuntimeError):
+    """A submitted batch group could not be waited for or collected (yet)."""
+
+    def __init__(self, group_id: str, reason: str):
+        super().__init__(f"batch group {group_id} pending: {reason}")
+        self.group_id = group_id
+
+
+def ensure_tables_created() -> None:
+    global _tables_ready
+    if _tables_ready:
+        return
+    Base.metadata.create_all(bind=engine)
+    _tables_ready = True
+
+
+def build_lines(
+    bodies: Iterable[Dict[str, Any]], endpoint: str, custom_ids: Iterable[str]
+) -> Iterable[bytes]:
+    """JSONL request lines for the Batch API."""
+    for custom_id, body in zip(custom_ids, bodies):
+        line = {"custom_id": custom_id, "method": "POST", "url": endpoint, "body": body}
+        yield (json.dumps(line, ensure_ascii=False) + "\n").encode()
+
+
+def write_chunks(lines: Iterable[bytes]) -> List[Tuple[str, int]]:
+    """Write lines into temp JSONL files split at the batch limits: [(path, count)]."""
+    chunks: List[Tuple[str, int]] = []
+    it = iter(lines)
+    line = next(it, None)
+    try:
+        while line is not None:
+            count = size = 0
+            with tempfile.NamedTemporaryFile("wb", suffix=".jsonl", delete=False) as f:
+                chunks.append((f.name, 0))
+                # Ylisuurikin rivi menee omaan tiedostoonsa (count == 0)
+                while line is not None and (
+                    count == 0
+                    or (count < MAX_REQUESTS_PER_BATCH and size + len(line) <= MAX_BYTES_PER_BATCH)
+                ):
+                    f.write(line)
+                    count += 1
+                    size += len(line)
+                    line = next(it, None)
+            chunks[-1] = (f.name, count)
+    except BaseException:
+        for path, _ in chunks:
+            os.unlink(path)
+        raise
+    return chunks
+
 
 class OpenAIBatchProcessor:
     """Process OpenAI API requests in batches."""
 
-    def __init__(self, client: OpenAI | None = None):
+    def __init__(self, client: AsyncOpenAI | None = None):
         """Initialize batch processor.
 
         Args:
-            client: OpenAI client (optional, creates new if None)
+            client: Async OpenAI client (optional, creates new if None)
         """
-        self.client = client or OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.batch_size = int(os.getenv("OPENAI_BATCH_SIZE", "50"))
+        self.client = client or AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.poll_interval = POLL_INTERVAL_S
+
+    async def submit(
+        self,
+        bodies: Sequence[Dict[str, Any]],
+        endpoint: str = "/v1/chat/completions",
+        kind: str = "chat",
+        custom_ids: Optional[Sequence[str]] = None,
+        on_complete: Optional[str] = None,
+    ) -> str:
+        """Upload and create batches for ``bodies``. Returns the group id.
+
+        Each created batch is committed before the next upload starts, so a
+        crash mid-submission leaves the already created batches pollable.
+        """
+        ensure_tables_created()
+        group_id = str(uuid.uuid4())
+        ids = list(custom_ids) if custom_ids else [f"req-{i}" for i in range(len(bodies))]
+        if len(set(ids)) != len(ids):
+            raise ValueError("custom_ids must be unique")
+        chunks = write_chunks(build_lines(bodies, endpoint, ids))
+        meta = {"on_complete": on_complete} if on_complete else {}
+        created: List[str] = []
+        try:
+            for path, count in chunks:
+                with open(path, "rb") as fh:
+                    uploaded = await self.client.files.create(file=fh, purpose="batch")
+                batch = await self.client.batches.create(
+                    input_file_id=uploaded.id,
+                    endpoint=endpoint,
+                    completion_window=COMPLETION_WINDOW,
+                    metadata={"group_id": group_id, "kind": kind},
+                )
+                with SessionLocal() as db:
+                    db.add(
+                        BatchJob(
+                            group_id=group_id,
+                            kind=kind,
+                            endpoint=endpoint,
+                            provider_batch_id=batch.id,
+                            input_file_id=uploaded.id,
+                            status=batch.status,
+                            request_count=count,
+                            meta=meta,
+                        )
+                    )
+                    db.commit()
+                created.append(batch.id)
+                logger.info("Batch created: %s (%s requests, group %s)", batch.id, count, group_id)
+        except BaseException:
+            # Osittain luotu ryhmä perutaan, jotta suora varapolku ei maksa samoja pyyntöjä kahdesti
+            await self._cancel(group_id, created)
+            raise
+        finally:
+            for path, _ in chunks:
+                os.unlink(path)
+        return group_id
+
+    async def _cancel(self, group_id: str, batch_ids: List[str]) -> None:
+        for batch_id in batch_ids:
+            try:
+                await self.client.batches.cancel(batch_id)
+            except Exception as e:
+                logger.warning("Cancelling batch %s failed: %s", batch_id, e)
+        if batch_ids:
+            with SessionLocal() as db:
+                db.query(BatchJob).filter(BatchJob.group_id == group_id).update(
+                    {"status": "cancelled", "completed_at": datetime.utcnow()}
+                )
+                db.commit()
+
+    async def _refresh(self, job: BatchJob) -> None:
+        batch = await self.client.batches.retrieve(job.provider_batch_id)
+        job.status = batch.status
+        job.output_file_id = batch.output_file_id
+        job.error_file_id = batch.error_file_id
+        job.updated_at = datetime.utcnow()
+        if batch.status in TERMINAL and job.completed_at is None:
+            job.completed_at = job.updated_at
+            errors = getattr(batch, "errors", None)
+            if errors and getattr(errors, "data", None):
+                job.error = "; ".join(str(e.message) for e in errors.data)[:2000]
+
+    async def poll(self, group_id: str) -> bool:
+        """Refresh unfinished batches of a group. Returns True when all are terminal."""
+        ensure_tables_created()
+        with SessionLocal() as db:
+            jobs = db.query(BatchJob).filter(BatchJob.group_id == group_id).all()
+            if not jobs:
+                raise LookupError(f"unknown batch group {group_id}")
+            pending = [j for j in jobs if j.status not in TERMINAL]
+            for job in pending:
+                await self._refresh(job)
+            done = all(j.status in TERMINAL for j in jobs)
+            if pending and done:
+                self._notify_complete(db, jobs)
+            db.commit()
+            return done
+
+    @staticmethod
+    def _notify_complete(db: Any, jobs: List[BatchJob]) -> None:
+        on_complete = (jobs[0].meta or {}).get("on_complete")
+        if on_complete:
+            from ..outbox import enqueue
+
+            group_id = jobs[0].group_id
+            # wait() ja batch_poller voivat pollata samaa ryhmää yhtä aikaa; savepoint
+            # pitää tilapäivitykset, vaikka toinen ehti jonottaa tapahtuman ensin
+            try:
+                with db.begin_nested():
+                    enqueue(
+                        db,
+                        on_complete,
+                        {"group_id": group_id, "kind": jobs[0].kind},
+                        dedupe_key=f"ai.batch:{group_id}",
+                    )
+            except IntegrityError:
+                logger.info("batch group %s completion already enqueued", group_id)
+
+    async def poll_pending(self) -> List[str]:
+        """Poll every unfinished group (e.g. after a restart). Returns finished group ids."""
+        ensure_tables_created()
+        with SessionLocal() as db:
+            groups = [
+                g
+                for (g,) in db.query(BatchJob.group_id)
+                .filter(BatchJob.status.notin_(TERMINAL))
+                .distinct()
+            ]
+        finished = []
+        for group_id in groups:
+            try:
+                if await self.poll(group_id):
+                    finished.append(group_id)
+            except Exception as e:
+                logger.warning("Polling batch group %s failed: %s", group_id, e)
+        return finished
+
+    async def wait(self, group_id: str, timeout: Optional[float] = WAIT_TIMEOUT_S) -> None:
+        """Poll until every batch of the group is terminal.
+
+        Raises:
+            TimeoutError: If the group is not finished within ``timeout`` seconds
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout else None
+        while not await self.poll(group_id):
+            if deadline and loop.time() >= deadline:
+                raise TimeoutError(f"batch group {group_id} not finished")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _iter_file(self, file_id: str) -> AsyncIterator[Dict[str, Any]]:
+        async with self.client.files.with_streaming_response.content(file_id) as resp:
+            async for line in resp.iter_lines():
+                if line.strip():
+                    yield json.loads(line)
+
+    async def iter_results(
+        self, group_id: str
+    ) -> AsyncIterator[Tuple[str, Optional[Dict[str, Any]], Optional[Any]]]:
+        """Stream ``(custom_id, response_body, error)`` for every finished request."""
+        ensure_tables_created()
+        with SessionLocal() as db:
+            file_ids = [
+                fid
+                for job in db.query(BatchJob).filter(BatchJob.group_id == group_id)
+                for fid in (job.output_file_id, job.error_file_id)
+                if fid
+            ]
+        for file_id in file_ids:
+            async for row in self._iter_file(file_id):
+                response = row.get("response") or {}
+                if row.get("error") or response.get("status_code", 200) >= 400:
+                    yield row["custom_id"], None, row.get("error") or response.get("body")
+                else:
+                    yield row["custom_id"], response.get("body"), None
+
+    async def collect(
+        self,
+        group_id: str,
+        bodies: Optional[Dict[str, Dict[str, Any]]] = None,
+        endpoint: str = "/v1/chat/completions",
+    ) -> Dict[str, Dict[str, Any]]:
+        """Results by ``custom_id``.
+
+        When ``bodies`` (custom_id -> request body) is given, failed and missing
+        requests are retried directly with bounded concurrency.
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        async for custom_id, body, error in self.iter_results(group_id):
+            results[custom_id] = body if body is not None else {"error": error}
+        if bodies:
+            retry = {
+                cid: b
+                for cid, b in bodies.items()
+                if cid not in results or "error" in results[cid]
+            }
+            if retry:
+                logger.info("Retrying %s batch requests directly", len(retry))
+                results.update(await self.run_direct(retry, endpoint))
+        return results
+
+    async def run_direct(
+        self, bodies: Dict[str, Dict[str, Any]], endpoint: str = "/v1/chat/completions"
+    ) -> Dict[str, Dict[str, Any]]:
+        """Run requests without the Batch API, at most FALLBACK_CONCURRENCY at a time."""
+        sem = asyncio.Semaphore(FALLBACK_CONCURRENCY)
+
+        async def _one(custom_id: str, body: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+            async with sem:
+                try:
+                    if endpoint == "/v1/embeddings":
+                        response = await self.client.embeddings.create(**body)
+                    else:
+                        response = await self.client.chat.completions.create(**body)
+                    return custom_id, response.model_dump()
+                except Exception as e:
+                    logger.error(f"Individual request failed: {e}")
+                    return custom_id, {"error": str(e)}
+
+        pairs = await asyncio.gather(*(_one(cid, b) for cid, b in bodies.items()))
+        return dict(pairs)
+
+    async def _run(
+        self, bodies: List[Dict[str, Any]], endpoint: str, kind: str
+    ) -> List[Dict[str, Any]]:
+        ids = [f"req-{i}" for i in range(len(bodies))]
+        by_id = dict(zip(ids, bodies))
+        try:
+            group_id = await self.submit(bodies, endpoint, kind, ids)
+        except Exception as e:
+            logger.error(f"Batch submission failed, running requests directly: {e}")
+            results = await self.run_direct(by_id, endpoint)
+            return [results.get(cid, {"error": "missing"}) for cid in ids]
+        try:
+            await self.wait(group_id)
+            results = await self.collect(group_id, by_id, endpoint)
+        except Exception as e:
+            # Erä jatkuu OpenAI:lla; tulokset haetaan myöhemmin collect(group_id):llä
+            logger.error(f"Batch group {group_id} not collected: {e}")
+            raise BatchPending(group_id, str(e)) from e
+        return [results.get(cid, {"error": "missing"}) for cid in ids]
 
     async def process_chat_batch(
         self,
@@ -36,76 +368,25 @@ class OpenAIBatchProcessor:
             model: Model to use
 
         Returns:
-            List of response dicts
+            List of response bodies (or ``{"error": ...}``) in request order
+
+        Raises:
+            BatchPending: If the submitted batch could not be waited for or collected
         """
         if not requests:
             return []
-
-        # Create batch request file
-        batch_requests = []
+        bodies = []
         for req in requests:
-            batch_requests.append(
-                {
-                    "custom_id": f"request-{len(batch_requests)}",
-                    "method": "POST",
-                    "url": "/v1/chat/completions",
-                    "body": {
-                        "model": model,
-                        "messages": req.get("messages", []),
-                        "temperature": req.get("temperature", 0.7),
-                        "max_tokens": req.get("max_tokens", 1000),
-                    },
-                }
-            )
-
-        # Submit batch
-        try:
-            # Create batch file (upload to OpenAI)
-            batch_file = self.client.files.create(
-                file=json.dumps(batch_requests).encode(),
-                purpose="batch",
-            )
-
-            # Create batch
-            batch = self.client.batches.create(
-                input_file_id=batch_file.id,
-                endpoint="/v1/chat/completions",
-            )
-
-            logger.info(f"Batch created: {batch.id} ({len(requests)} requests)")
-
-            # Wait for completion (poll)
-            while batch.status in ["validating", "in_progress"]:
-                import asyncio
-
-                await asyncio.sleep(5)
-                batch = self.client.batches.retrieve(batch.id)
-
-            if batch.status == "completed":
-                # Retrieve results
-                output_file_id = batch.output_file_id
-                output_file = self.client.files.content(output_file_id)
-                results = json.loads(output_file.read())
-
-                # Parse responses
-                responses = []
-                for result in results.get("data", []):
-                    if result.get("status") == "completed":
-                        response_body = result.get("response", {}).get("body", {})
-                        responses.append(response_body)
-                    else:
-                        logger.warning(f"Request failed: {result.get('error')}")
-                        responses.append({"error": result.get("error")})
-
-                return responses
-            else:
-                logger.error(f"Batch failed: {batch.status}")
-                return []
-
-        except Exception as e:
-            logger.error(f"Batch processing failed: {e}")
-            # Fallback to individual requests
-            return await self._fallback_individual(requests, model)
+            body = {
+                "model": model,
+                "messages": req.get("messages", []),
+                "temperature": req.get("temperature", 0.7),
+                "max_tokens": req.get("max_tokens", 1000),
+            }
+            if req.get("response_format"):
+                body["response_format"] = req["response_format"]
+            bodies.append(body)
+        return await self._run(bodies, "/v1/chat/completions", "chat")
 
     async def process_embedding_batch(
         self,
@@ -119,113 +400,17 @@ class OpenAIBatchProcessor:
             model: Embedding model to use
 
         Returns:
-            List of embedding vectors
+            List of embedding vectors in input order (empty list on failure)
+
+        Raises:
+            BatchPending: If the submitted batch could not be waited for or collected
         """
         if not texts:
             return []
-
-        # Create batch request file
-        batch_requests = []
-        for i, text in enumerate(texts):
-            batch_requests.append(
-                {
-                    "custom_id": f"embedding-{i}",
-                    "method": "POST",
-                    "url": "/v1/embeddings",
-                    "body": {
-                        "model": model,
-                        "input": text,
-                    },
-                }
-            )
-
-        # Submit batch (similar to chat batch)
-        try:
-            batch_file = self.client.files.create(
-                file=json.dumps(batch_requests).encode(),
-                purpose="batch",
-            )
-
-            batch = self.client.batches.create(
-                input_file_id=batch_file.id,
-                endpoint="/v1/embeddings",
-            )
-
-            logger.info(f"Embedding batch created: {batch.id} ({len(texts)} texts)")
-
-            # Wait and retrieve (same as chat batch)
-            while batch.status in ["validating", "in_progress"]:
-                import asyncio
-
-                await asyncio.sleep(5)
-                batch = self.client.batches.retrieve(batch.id)
-
-            if batch.status == "completed":
-                output_file_id = batch.output_file_id
-                output_file = self.client.files.content(output_file_id)
-                results = json.loads(output_file.read())
-
-                embeddings = []
-                for result in results.get("data", []):
-                    if result.get("status") == "completed":
-                        response_body = result.get("response", {}).get("body", {})
-                        embedding = response_body.get("data", [{}])[0].get("embedding", [])
-                        embeddings.append(embedding)
-                    else:
-                        logger.warning(f"Embedding failed: {result.get('error')}")
-                        embeddings.append([])
-
-                return embeddings
-            else:
-                logger.error(f"Embedding batch failed: {batch.status}")
-                return []
-
-        except Exception as e:
-            logger.error(f"Embedding batch failed: {e}")
-            # Fallback to individual requests
-            return await self._fallback_embeddings(texts, model)
-
-    async def _fallback_individual(
-        self,
-        requests: list[dict[str, Any]],
-        model: str,
-    ) -> list[dict[str, Any]]:
-        """Fallback to individual requests if batch fails."""
-        responses = []
-        for req in requests:
-            try:
-                response = self.client.chat.completions.create(
-                    model=model,
-                    messages=req.get("messages", []),
-                    temperature=req.get("temperature", 0.7),
-                    max_tokens=req.get("max_tokens", 1000),
-                )
-                responses.append(
-                    {
-                        "choices": [{"message": {"content": response.choices[0].message.content}}],
-                        "usage": response.usage.dict() if response.usage else None,
-                    }
-                )
-            except Exception as e:
-                logger.error(f"Individual request failed: {e}")
-                responses.append({"error": str(e)})
-        return responses
-
-    async def _fallback_embeddings(
-        self,
-        texts: list[str],
-        model: str,
-    ) -> list[list[float]]:
-        """Fallback to individual embedding requests."""
+        bodies = [{"model": model, "input": text} for text in texts]
+        results = await self._run(bodies, "/v1/embeddings", "embeddings")
         embeddings = []
-        for text in texts:
-            try:
-                response = self.client.embeddings.create(
-                    model=model,
-                    input=text,
-                )
-                embeddings.append(response.data[0].embedding)
-            except Exception as e:
-                logger.error(f"Individual embedding failed: {e}")
-                embeddings.append([])
+        for r in results:
+            data = r.get("data") or [{}]
+            embeddings.append(data[0].get("embedding", []))
         return embeddings
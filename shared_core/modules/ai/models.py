@@ -0,0 +1,33 @@
+"""Database models for the AI module."""
+
+from __future__ import annotations
+
+import uuid
+from datetime import datetime
+
+from sqlalchemy import JSON, Column, DateTime, Integer, String, Text
+
+from ...utils.db import Base
+
+
+class BatchJob(Base):
+    """One provider batch. Work split at the provider's limits shares a ``group_id``."""
+
+    __tablename__ = "ai_batch_jobs"
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    group_id = Column(String(36), index=True, nullable=False)
+    kind = Column(String(64), nullable=False, default="chat")
+    endpoint = Column(String(64), nullable=False)
+    provider_batch_id = Column(String(128), unique=True, nullable=True)
+    input_file_id = Column(String(128), nullable=True)
+    output_file_id = Column(String(128), nullable=True)
+    error_file_id = Column(String(128), nullable=True)
+    # validating|in_progress|finalizing|completed|failed|expired|cancelling|cancelled
+    status = Column(String(32), index=True, nullable=False, default="validating")
+    request_count = Column(Integer, nullable=False, default=0)
+    meta = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    # Naive UTC kuten outboxissa
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    completed_at = Column(DateTime, nullable=True)
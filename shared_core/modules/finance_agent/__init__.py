@@ -1,6 +1,6 @@
 """FinanceAgent - AI-powered financial advisor agent for Converto Business OS."""
 
-from .service import FinanceAgentService
+from .service import FinanceAgentService, get_finance_agent_service
 from .models import (
     AgentDecision,
     AgentInsight,
@@ -11,6 +11,7 @@ from .models import (
 
 __all__ = [
     "FinanceAgentService",
+    "get_finance_agent_service",
     "AgentDecision",
     "AgentInsight",
     "AgentFeedback",
@@ -0,0 +1,134 @@
+"""Spending anomaly detection for FinanceAgent.
+
+Weekly totals per (category, vendor) for ``ANOMALY_HISTORY_WEEKS`` come
+from the receipts spending feature store; everything else is vectorised
+NumPy over that compact matrix:
+
+* days are bucketed into 7-day periods counted back from today
+  (bucket 0 = last 7 days), so no database-specific week functions;
+* the current period is the last ``CURRENT_WEEKS`` buckets (28 days) and
+  is compared against the previous 28 days (``change_percent``) and an
+  EWMA mean/variance of the weekly totals before it (``z``);
+* a series alerts when its weekly average is ``ANOMALY_Z_THRESHOLD``
+  deviations above the baseline and the period change exceeds
+  ``ANOMALY_MIN_CHANGE_PERCENT``. Series with too little history fall back
+  to the change rule alone.
+
+Totals, every category and every vendor are evaluated in one pass.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from shared_core.modules.receipts.features import SpendingFeatures
+
+from .models import SpendingAlert
+
+logger = logging.getLogger("converto.finance_agent.anomalies")
+
+HISTORY_WEEKS = int(os.getenv("ANOMALY_HISTORY_WEEKS", "26"))
+CURRENT_WEEKS = 4
+EWMA_ALPHA = float(os.getenv("ANOMALY_EWMA_ALPHA", "0.3"))
+Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "2.0"))
+MIN_CHANGE_PERCENT = float(os.getenv("ANOMALY_MIN_CHANGE_PERCENT", "30"))
+MIN_HISTORY_WEEKS = 6
+# Pienet toimittajasummat eivät ole hälytyksen arvoisia
+MIN_VENDOR_AMOUNT = float(os.getenv("ANOMALY_MIN_VENDOR_AMOUNT", "100"))
+
+
+def _ewma_baseline(history: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """EWMA mean and std per row; ``history`` columns run oldest -> newest."""
+    mean = history[:, 0].copy()
+    var = np.zeros(len(history))
+    for t in range(1, history.shape[1]):
+        diff = history[:, t] - mean
+        incr = EWMA_ALPHA * diff
+        mean += incr
+        var = (1 - EWMA_ALPHA) * (var + diff * incr)
+    return mean, np.sqrt(var)
+
+
+def score(matrix: np.ndarray) -> Dict[str, np.ndarray]:
+    """Vectorised statistics for every row of a weekly-total matrix."""
+    current = matrix[:, :CURRENT_WEEKS].sum(axis=1)
+    previous = matrix[:, CURRENT_WEEKS : 2 * CURRENT_WEEKS].sum(axis=1)
+    history = matrix[:, CURRENT_WEEKS:][:, ::-1]  # vanhin ensin
+    mean, std = _ewma_baseline(history)
+    weekly = current / CURRENT_WEEKS
+    # Nollahajonta (tasainen historia) ei saa tuottaa ääretöntä z-arvoa
+    floor = np.maximum(std, np.maximum(0.1 * mean, 1.0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change = np.where(previous > 0, (current - previous) / previous * 100, np.nan)
+    return {
+        "current": current,
+        "previous": previous,
+        "change": change,
+        "z": (weekly - mean) / floor,
+        "baseline": mean,
+        "history_weeks": (history > 0).sum(axis=1),
+    }
+
+
+def _alerts_for(
+    labels: List[str], matrix: np.ndarray, kind: str, min_amount: float = 0.0
+) -> List[SpendingAlert]:
+    if not len(labels):
+        return []
+    s = score(matrix)
+    enough = s["history_weeks"] >= MIN_HISTORY_WEEKS
+    changed = np.nan_to_num(s["change"], nan=0.0) > MIN_CHANGE_PERCENT
+    hit = changed & (~enough | (s["z"] > Z_THRESHOLD)) & (s["current"] >= min_amount)
+
+    alerts = []
+    for i in np.flatnonzero(hit):
+        name = labels[i]
+        change = float(s["change"][i])
+        detail = ""
+        if enough[i]:
+            detail = (
+                f", {s['z'][i]:.1f}σ above the {HISTORY_WEEKS - CURRENT_WEEKS}-week "
+                f"baseline of €{s['baseline'][i]:.2f}/week"
+            )
+        subject = "" if name == "all" else f" ({name.split(':', 1)[-1]})"
+        alerts.append(SpendingAlert(
+            category=name,
+            current_amount=float(s["current"][i]),
+            previous_amount=float(s["previous"][i]),
+            change_percent=change,
+            threshold_exceeded=True,
+            message=(
+                f"{kind} spending{subject} increased by "
+                f"{change:.1f}% compared to previous period{detail}"
+            ),
+            recommendation="Review expenses and identify cost-saving opportunities.",
+        ))
+    return alerts
+
+
+def detect_anomalies(features: SpendingFeatures) -> List[SpendingAlert]:
+    """Alerts for the tenant total, every category and every vendor."""
+    keys, matrix = features.weekly_matrix(HISTORY_WEEKS)
+    if not keys:
+        return []
+
+    categories = sorted({c for c, _ in keys})
+    cat_index = {c: i for i, c in enumerate(categories)}
+    by_category = np.zeros((len(categories), matrix.shape[1]))
+    np.add.at(by_category, [cat_index[c] for c, _ in keys], matrix)
+
+    vendors = sorted({v for _, v in keys})
+    vendor_index = {v: i for i, v in enumerate(vendors)}
+    by_vendor = np.zeros((len(vendors), matrix.shape[1]))
+    np.add.at(by_vendor, [vendor_index[v] for _, v in keys], matrix)
+
+    alerts = _alerts_for(["all"], matrix.sum(axis=0, keepdims=True), "Total")
+    alerts += _alerts_for(categories, by_category, "Category")
+    alerts += _alerts_for(
+        [f"vendor:{v}" for v in vendors], by_vendor, "Vendor", MIN_VENDOR_AMOUNT
+    )
+    return alerts
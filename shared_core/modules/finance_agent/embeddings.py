@@ -0,0 +1,216 @@
+"""Batched, cached embeddings for FinanceAgent memory.
+
+Vectors are cached by ``sha256(model + text)``. Lookup order is the local
+float32 memmap cache, then Redis, and only the remaining misses are sent to
+OpenAI, all in one request per ``EMBEDDING_BATCH_SIZE`` inputs. Repeated
+texts (the fixed retrieval query, re-stored insights) never hit the API
+twice.
+
+The local cache is two append-only files per model under
+``EMBEDDING_CACHE_DIR``: ``<model>.f32`` with the raw rows and
+``<model>.keys`` with ``<hash> <row>`` lines. Appends take an exclusive
+``flock``, so several worker processes can share one cache directory.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import fcntl
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from openai import AsyncOpenAI
+
+from shared_core.utils.redis import get_redis_client
+
+logger = logging.getLogger("converto.finance_agent.embeddings")
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "1536"))
+BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "512"))
+CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "/tmp/converto-embeddings")
+REDIS_TTL_S = int(os.getenv("EMBEDDING_REDIS_TTL_S", str(30 * 24 * 3600)))
+# Redis-virheen jälkeen ohitetaan Redis näin pitkään, ettei jokainen kutsu odota timeoutia
+REDIS_BACKOFF_S = 60.0
+
+
+def content_hash(text: str, model: str = EMBEDDING_MODEL) -> str:
+    return hashlib.sha256(f"{model}\x00{text}".encode()).hexdigest()
+
+
+class LocalVectorCache:
+    """Append-only float32 memmap keyed by content hash."""
+
+    def __init__(self, directory: str, model: str, dim: int):
+        os.makedirs(directory, exist_ok=True)
+        self.dim = dim
+        self.data_path = os.path.join(directory, f"{model}.f32")
+        self.keys_path = os.path.join(directory, f"{model}.keys")
+        self._rows: Dict[str, int] = {}
+        self._keys_offset = 0
+        self._mm: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> None:
+        """Read key lines appended since the last refresh (possibly by other processes)."""
+        if not os.path.exists(self.keys_path):
+            return
+        with open(self.keys_path, "r", encoding="ascii") as f:
+            f.seek(self._keys_offset)
+            chunk = f.read()
+        complete = chunk[: chunk.rfind("\n") + 1]
+        for line in complete.splitlines():
+            h, row = line.split()
+            self._rows[h] = int(row)
+        self._keys_offset += len(complete)
+        if complete:
+            self._mm = None
+
+    def _matrix(self) -> Optional[np.memmap]:
+        if self._mm is None and os.path.exists(self.data_path):
+            n = os.path.getsize(self.data_path) // (4 * self.dim)
+            if n:
+                self._mm = np.memmap(self.data_path, dtype=np.float32, mode="r", shape=(n, self.dim))
+        return self._mm
+
+    def get_many(self, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        with self._lock:
+            if any(h not in self._rows for h in hashes):
+                self._refresh()
+            rows = {h: self._rows[h] for h in hashes if h in self._rows}
+            mm = self._matrix() if rows else None
+            if mm is None:
+                return {}
+            return {h: np.array(mm[r]) for h, r in rows.items() if r < mm.shape[0]}
+
+    def put_many(self, vectors: Dict[str, np.ndarray]) -> None:
+        if not vectors:
+            return
+        with self._lock, open(self.keys_path, "a", encoding="ascii") as keys:
+            fcntl.flock(keys, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                new = {h: v for h, v in vectors.items() if h not in self._rows}
+                if not new:
+                    return
+                with open(self.data_path, "ab") as data:
+                    first = data.tell() // (4 * self.dim)
+                    block = np.stack([np.asarray(v, dtype=np.float32) for v in new.values()])
+                    data.write(block.tobytes())
+                    data.flush()
+                    os.fsync(data.fileno())
+                # Avaimet kirjoitetaan vasta datan jälkeen: kaatuminen ei jätä avainta ilman riviä
+                lines = "".join(f"{h} {first + i}\n" for i, h in enumerate(new))
+                keys.write(lines)
+                keys.flush()
+                for i, h in enumerate(new):
+                    self._rows[h] = first + i
+                self._keys_offset += len(lines)
+                self._mm = None
+            finally:
+                fcntl.flock(keys, fcntl.LOCK_UN)
+
+
+class EmbeddingService:
+    """Async embeddings with request batching and a two-level cache."""
+
+    def __init__(
+        self,
+        client: Optional[AsyncOpenAI] = None,
+        model: str = EMBEDDING_MODEL,
+        dim: int = EMBEDDING_DIM,
+    ):
+        api_key = os.getenv("OPENAI_API_KEY")
+        self.client = client or (AsyncOpenAI(api_key=api_key) if api_key else None)
+        self.model = model
+        self.dim = dim
+        self.local = LocalVectorCache(CACHE_DIR, model, dim)
+        self.redis = get_redis_client()
+        self.api_calls = 0
+        self._redis_down_until = 0.0
+
+    def _redis_ok(self) -> bool:
+        return self.redis is not None and time.monotonic() >= self._redis_down_until
+
+    def _redis_failed(self, e: Exception) -> None:
+        logger.warning(f"Redis embedding cache unavailable: {e}")
+        self._redis_down_until = time.monotonic() + REDIS_BACKOFF_S
+
+    def _redis_get(self, hashes: List[str]) -> Dict[str, np.ndarray]:
+        if not hashes or not self._redis_ok():
+            return {}
+        try:
+            values = self.redis.mget([f"emb:{self.model}:{h}" for h in hashes])
+        except Exception as e:
+            self._redis_failed(e)
+            return {}
+        return {
+            h: np.frombuffer(base64.b64decode(v), dtype=np.float32)
+            for h, v in zip(hashes, values)
+            if v
+        }
+
+    def _redis_put(self, vectors: Dict[str, np.ndarray]) -> None:
+        if not vectors or not self._redis_ok():
+            return
+        try:
+            pipe = self.redis.pipeline()
+            for h, v in vectors.items():
+                payload = base64.b64encode(np.asarray(v, dtype=np.float32).tobytes()).decode()
+                pipe.setex(f"emb:{self.model}:{h}", REDIS_TTL_S, payload)
+            pipe.execute()
+        except Exception as e:
+            self._redis_failed(e)
+
+    async def embed_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Embeddings in input order; None where no vector could be produced."""
+        hashes = [content_hash(t, self.model) for t in texts]
+        unique = list(dict.fromkeys(hashes))
+        found = await asyncio.to_thread(self.local.get_many, unique)
+        missing = [h for h in unique if h not in found]
+        if missing:
+            from_redis = await asyncio.to_thread(self._redis_get, missing)
+            if from_redis:
+                found.update(from_redis)
+                await asyncio.to_thread(self.local.put_many, from_redis)
+            missing = [h for h in missing if h not in found]
+
+        if missing and self.client is not None:
+            text_by_hash = dict(zip(hashes, texts))
+            fresh: Dict[str, np.ndarray] = {}
+            for i in range(0, len(missing), BATCH_SIZE):
+                chunk = missing[i : i + BATCH_SIZE]
+                try:
+                    response = await self.client.embeddings.create(
+                        model=self.model, input=[text_by_hash[h] for h in chunk]
+                    )
+                    self.api_calls += 1
+                except Exception as e:
+                    logger.error(f"Failed to create embeddings: {e}")
+                    continue
+                for item in response.data:
+                    fresh[chunk[item.index]] = np.asarray(item.embedding, dtype=np.float32)
+            if fresh:
+                found.update(fresh)
+                await asyncio.to_thread(self.local.put_many, fresh)
+                await asyncio.to_thread(self._redis_put, fresh)
+        return [found.get(h) for h in hashes]
+
+    async def embed(self, text: str) -> Optional[np.ndarray]:
+        return (await self.embed_many([text]))[0]
+
+
+_service: Optional[EmbeddingService] = None
+
+
+def get_embedding_service() -> EmbeddingService:
+    global _service
+    if _service is None:
+        _service = EmbeddingService()
+    return _service
@@ -2,12 +2,13 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
-import os
 from typing import Any, Optional
 import uuid
 
-from openai import OpenAI
+from .embeddings import EmbeddingService, get_embedding_service
+from .vector_store import VectorStore, get_vector_store
 
 logger = logging.getLogger("converto.finance_agent.memory")
 
@@ -15,48 +16,58 @@ logger = logging.getLogger("converto.finance_agent.memory")
 class MemoryLayer:
     """Handles embeddings and vector store for FinanceAgent."""
     
-    def __init__(self, tenant_id: str):
+    def __init__(self, tenant_id: str, embeddings: Optional[EmbeddingService] = None):
         self.tenant_id = tenant_id
-        self.openai_client: Optional[OpenAI] = None
-        self.pinecone_index = None  # Will be initialized if Pinecone is configured
-        self._initialize_clients()
+        self.embeddings = embeddings or get_embedding_service()
+        self.store: Optional[VectorStore] = get_vector_store(tenant_id)
     
-    def _initialize_clients(self) -> None:
-        """Initialize OpenAI and Pinecone clients."""
-        api_key = os.getenv("OPENAI_API_KEY")
-        if api_key:
-            self.openai_client = OpenAI(api_key=api_key)
+    async def create_embedding(self, text: str) -> Optional[list[float]]:
+        """Create embedding for text (cached, see :mod:`.embeddings`)."""
+        vector = await self.embeddings.embed(text)
+        return vector.tolist() if vector is not None else None
+    
+    async def store_memories(self, items: list[dict[str, Any]]) -> list[Optional[str]]:
+        """Store many memories with one embedding request.
+        
+        Each item has ``content_type``, ``content_id``, ``content_text`` and
+        optional ``metadata``. Returns memory ids in input order (None where
+        no embedding could be created).
+        """
+        if not items:
+            return []
+        vectors = await self.embeddings.embed_many([i["content_text"] for i in items])
         
-        pinecone_api_key = os.getenv("PINECONE_API_KEY")
-        pinecone_index_name = os.getenv("PINECONE_INDEX_NAME", "converto-finance-agent")
+        memory_ids: list[Optional[str]] = []
+        records = []
+        for item, vector in zip(items, vectors):
+            if vector is None:
+                memory_ids.append(None)
+                continue
+            memory_id = str(uuid.uuid4())
+            memory_ids.append(memory_id)
+            records.append((
+                memory_id,
+                vector.tolist(),
+                {
+                    "tenant_id": self.tenant_id,
+                    "content_type": item["content_type"],
+                    "content_id": item["content_id"],
+                    "content_text": item["content_text"],
+                    **(item.get("metadata") or {}),
+                },
+            ))
         
-        if pinecone_api_key:
+        if self.store and records:
             try:
-                import pinecone
-                pinecone.init(api_key=pinecone_api_key, environment=os.getenv("PINECONE_ENVIRONMENT", "us-east1-gcp"))
-                self.pinecone_index = pinecone.Index(pinecone_index_name)
-                logger.info(f"Pinecone initialized for tenant {self.tenant_id}")
-            except ImportError:
-                logger.warning("Pinecone not installed, vector store disabled")
+                await asyncio.to_thread(self.store.upsert, records)
+                logger.info(f"Stored {len(records)} memories for tenant {self.tenant_id}")
             except Exception as e:
-                logger.warning(f"Pinecone initialization failed: {e}")
-    
-    def create_embedding(self, text: str) -> Optional[list[float]]:
-        """Create embedding for text using OpenAI."""
-        if not self.openai_client:
-            return None
+                logger.error(f"Failed to store in vector store: {e}")
         
-        try:
-            response = self.openai_client.embeddings.create(
-                model="text-embedding-3-small",
-                input=text,
-            )
-            return response.data[0].embedding
-        except Exception as e:
-            logger.error(f"Failed to create embedding: {e}")
-            return None
+        # Fallback: return IDs for database storage
+        return memory_ids
     
-    def store_memory(
+    async def store_memory(
         self,
         content_type: str,
         content_id: str,
@@ -64,71 +75,32 @@ class MemoryLayer:
         metadata: Optional[dict[str, Any]] = None,
     ) -> Optional[str]:
         """Store content in vector store."""
-        embedding = self.create_embedding(content_text)
-        if not embedding:
-            return None
-        
-        # Create unique ID for this memory
-        memory_id = str(uuid.uuid4())
-        
-        # Store in Pinecone if available
-        if self.pinecone_index:
-            try:
-                self.pinecone_index.upsert([(
-                    memory_id,
-                    embedding,
-                    {
-                        "tenant_id": self.tenant_id,
-                        "content_type": content_type,
-                        "content_id": content_id,
-                        "content_text": content_text,
-                        **(metadata or {}),
-                    }
-                )])
-                logger.info(f"Stored memory {memory_id} in Pinecone")
-                return memory_id
-            except Exception as e:
-                logger.error(f"Failed to store in Pinecone: {e}")
-        
-        # Fallback: return ID for database storage
-        return memory_id
+        ids = await self.store_memories([{
+            "content_type": content_type,
+            "content_id": content_id,
+            "content_text": content_text,
+            "metadata": metadata,
+        }])
+        return ids[0]
     
-    def retrieve_context(
+    async def retrieve_context(
         self,
         query_text: str,
         top_k: int = 5,
         content_types: Optional[list[str]] = None,
     ) -> list[dict[str, Any]]:
         """Retrieve relevant context from vector store."""
-        if not self.pinecone_index:
+        if not self.store:
             return []
         
-        query_embedding = self.create_embedding(query_text)
+        query_embedding = await self.create_embedding(query_text)
         if not query_embedding:
             return []
         
         try:
-            # Build filter
-            filter_dict = {"tenant_id": {"$eq": self.tenant_id}}
-            if content_types:
-                filter_dict["content_type"] = {"$in": content_types}
-            
-            # Query receipts
-            results = self.pinecone_index.query(
-                vector=query_embedding,
-                top_k=top_k,
-                filter=filter_dict,
-                include_metadata=True,
+            return await asyncio.to_thread(
+                self.store.query, query_embedding, top_k, content_types
             )
-            
-            return [
-                {
-                    "id": match.id,
-                    "score": match.score,
-                    "metadata": match.metadata,
-                }
-                for match in results.matches
-            ]
         except Exception as e:
             logger.error(f"Failed to retrieve context: {e}")
             return []
@@ -22,7 +22,7 @@ from sqlalchemy import (
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 from sqlalchemy.sql import func
 
-from shared_core.utils.db import Base
+from shared_core.utils.db import Base, register_added_columns
 
 
 class DecisionType(str, Enum):
@@ -76,6 +76,12 @@ class AgentDecision(Base):
     # Feedback
     user_feedback = Column(String(32), nullable=True)
     feedback_note = Column(Text, nullable=True)
+    
+    # Sama havainto uudelleen analysoitaessa päivittää olemassa olevan rivin
+    semantic_key = Column(String(128), nullable=True, index=True)
+
+
+register_added_columns(AgentDecision.__table__, "semantic_key")
 
 
 class AgentMemory(Base):
@@ -102,6 +108,23 @@ class AgentMemory(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
 
+class AgentAnalysisState(Base):
+    """Per-tenant incremental analysis state (watermark, digest, rolling summary)."""
+    __tablename__ = "agent_analysis_state"
+    
+    tenant_id = Column(String(64), primary_key=True)
+    days_back = Column(Integer, primary_key=True)
+    
+    # Newest Receipt.created_at included in the last analysis
+    watermark = Column(DateTime(timezone=True), nullable=True)
+    # Digest of the receipt window (count, sums, newest created/updated)
+    context_digest = Column(String(64), nullable=True)
+    rolling_summary = Column(JSON, nullable=True)
+    last_insights = Column(JSON, nullable=True)
+    
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
 class AgentFeedback(Base):
     """Stores user feedback for learning."""
     __tablename__ = "agent_feedback"
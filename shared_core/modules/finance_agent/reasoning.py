@@ -14,16 +14,34 @@ from .models import DecisionType
 logger = logging.getLogger("converto.finance_agent.reasoning")
 
 
-class ReasoningEngine:
-    """GPT-based reasoning engine for financial decisions."""
-    
-    def __init__(self):
+_client: Optional[OpenAI] = None
+
+
+def get_openai_client() -> OpenAI:
+    """Process-wide OpenAI client (one connection pool for all tenants)."""
+    global _client
+    if _client is None:
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("OPENAI_API_KEY not configured")
-        self.client = OpenAI(api_key=api_key)
+        _client = OpenAI(api_key=api_key)
+    return _client
+
+
+class ReasoningEngine:
+    """GPT-based reasoning engine for financial decisions."""
+    
+    def __init__(self, client: Optional[OpenAI] = None):
+        self._client = client
         self.model = "gpt-4o-mini"
     
+    @property
+    def client(self) -> OpenAI:
+        # Avain tarkistetaan vasta ensimmäisellä kutsulla, ei konstruktorissa
+        if self._client is None:
+            self._client = get_openai_client()
+        return self._client
+    
     def analyze_financial_context(
         self,
         context_data: dict[str, Any],
@@ -135,7 +153,10 @@ You must:
         # Add receipt summary
         if "receipts" in context_data:
             receipts = context_data["receipts"]
-            prompt_parts.append(f"Recent receipts ({len(receipts)} items):")
+            if context_data.get("incremental"):
+                prompt_parts.append(f"New receipts since the last analysis ({len(receipts)} items):")
+            else:
+                prompt_parts.append(f"Recent receipts ({len(receipts)} items):")
             for r in receipts[:10]:  # Limit to 10 most recent
                 prompt_parts.append(f"- {r.get('vendor', 'Unknown')}: €{r.get('total_amount', 0):.2f} on {r.get('receipt_date', 'N/A')}")
         
@@ -145,6 +166,28 @@ You must:
             for cat, amount in context_data["spending_by_category"].items():
                 prompt_parts.append(f"- {cat}: €{amount:.2f}")
         
+        if context_data.get("top_vendors"):
+            prompt_parts.append("\nTop vendors:")
+            for vendor, amount in context_data["top_vendors"].items():
+                prompt_parts.append(f"- {vendor}: €{amount:.2f}")
+        
+        if context_data.get("recurring_vendors"):
+            prompt_parts.append("\nRecurring costs:")
+            for vendor in context_data["recurring_vendors"]:
+                prompt_parts.append(f"- {vendor}")
+        
+        if "total_spending" in context_data:
+            prompt_parts.append(
+                f"\nTotal: €{context_data['total_spending']:.2f} "
+                f"over {context_data.get('receipt_count', 0)} receipts"
+            )
+        
+        # Already reported insights: only new or changed findings are wanted
+        if context_data.get("previous_insights"):
+            prompt_parts.append("\nAlready reported (repeat only if the new receipts change them):")
+            for title in context_data["previous_insights"]:
+                prompt_parts.append(f"- {title}")
+        
         # Add alerts
         if "alerts" in context_data:
             prompt_parts.append("\nExisting alerts:")
@@ -17,7 +17,7 @@ from .models import (
     AgentInsight,
     SpendingAlert,
 )
-from .service import FinanceAgentService
+from .service import get_finance_agent_service
 
 router = APIRouter(prefix="/api/v1/finance-agent", tags=["finance-agent"])
 
@@ -36,13 +36,12 @@ async def analyze_finances(
 ) -> AgentAnalysisResponse:
     """Analyze finances and generate insights."""
     
-    agent = FinanceAgentService(
-        tenant_id=request.tenant_id,
-        user_id=request.user_id,
-    )
+    agent = get_finance_agent_service(request.tenant_id)
     
     # Analyze receipts
-    insights = agent.analyze_receipts(db, days_back=request.days_back)
+    insights = await agent.analyze_receipts(
+        db, days_back=request.days_back, user_id=request.user_id
+    )
     
     # Detect spending alerts
     alerts = agent.detect_spending_alerts(db)
@@ -62,7 +61,7 @@ async def get_decisions(
 ) -> list[AgentDecisionResponse]:
     """Get active agent decisions."""
     
-    agent = FinanceAgentService(tenant_id=tenant_id)
+    agent = get_finance_agent_service(tenant_id)
     return agent.get_active_decisions(db, limit=limit)
 
 
@@ -80,12 +79,9 @@ async def submit_feedback(
     if not decision:
         raise HTTPException(status_code=404, detail="Decision not found")
     
-    agent = FinanceAgentService(
-        tenant_id=decision.tenant_id,
-        user_id=decision.user_id,
-    )
+    agent = get_finance_agent_service(decision.tenant_id)
     
-    agent.store_user_feedback(
+    await agent.store_user_feedback(
         db=db,
         decision_id=feedback.decision_id,
         feedback_type=feedback.feedback_type.value,
@@ -104,20 +100,21 @@ async def get_insights(
 ) -> list[AgentInsight]:
     """Get financial insights for tenant."""
     
-    agent = FinanceAgentService(tenant_id=tenant_id)
-    return agent.analyze_receipts(db, days_back=days_back)
+    agent = get_finance_agent_service(tenant_id)
+    return await agent.analyze_receipts(db, days_back=days_back)
 
 
 @router.get("/alerts", response_model=list[SpendingAlert])
 async def get_spending_alerts(
     tenant_id: str,
     category: Optional[str] = None,
+    refresh: bool = False,
     db: Session = Depends(get_session),
 ) -> list[SpendingAlert]:
-    """Get spending alerts."""
+    """Get spending alerts (computed once per tenant per day unless refresh)."""
     
-    agent = FinanceAgentService(tenant_id=tenant_id)
-    return agent.detect_spending_alerts(db, category=category)
+    agent = get_finance_agent_service(tenant_id)
+    return agent.detect_spending_alerts(db, category=category, refresh=refresh)
 
 
 @router.get("/health")
@@ -130,5 +127,6 @@ async def agent_health() -> dict[str, str]:
         "service": "FinanceAgent",
         "openai_configured": bool(os.getenv("OPENAI_API_KEY")),
         "pinecone_configured": bool(os.getenv("PINECONE_API_KEY")),
+        "vector_store": os.getenv("VECTOR_STORE", "auto"),
     }
 
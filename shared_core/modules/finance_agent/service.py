@@ -2,16 +2,27 @@
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import logging
-from datetime import datetime, timedelta
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
 from typing import Any, Optional
 
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from shared_core.modules.receipts.features import SpendingFeatures, get_spending_features
 from shared_core.utils.db import get_session
 
+from .anomalies import detect_anomalies
 from .memory import MemoryLayer
 from .models import (
+    AgentAnalysisState,
     AgentDecision,
     AgentFeedback,
     AgentDecisionResponse,
@@ -24,6 +35,9 @@ from .reasoning import ReasoningEngine
 
 logger = logging.getLogger("converto.finance_agent")
 
+MAX_CACHED_TENANTS = int(os.getenv("FINANCE_AGENT_MAX_TENANTS", "256"))
+MAX_TRACKED_INSIGHTS = 20
+
 
 class FinanceAgentService:
     """Main service for FinanceAgent functionality."""
@@ -31,31 +45,90 @@ class FinanceAgentService:
     def __init__(self, tenant_id: str, user_id: Optional[str] = None):
         self.tenant_id = tenant_id
         self.user_id = user_id
-        self.memory = MemoryLayer(tenant_id)
-        self.reasoning = ReasoningEngine()
+        self._memory: Optional[MemoryLayer] = None
+        self._reasoning: Optional[ReasoningEngine] = None
+        self._alerts_day: Optional[date] = None
+        self._alerts: list[SpendingAlert] = []
+        # days_back -> lukko: samanaikainen päivitys odottaa ja osuu digest-välimuistiin
+        self._analysis_locks: dict[int, asyncio.Lock] = {}
+    
+    @property
+    def memory(self) -> MemoryLayer:
+        # Luodaan vasta tarvittaessa: lukupäätepisteet eivät koske OpenAI:hin tai vektorikantaan
+        if self._memory is None:
+            self._memory = MemoryLayer(self.tenant_id)
+        return self._memory
     
-    def analyze_receipts(
+    @property
+    def reasoning(self) -> ReasoningEngine:
+        if self._reasoning is None:
+            self._reasoning = ReasoningEngine()
+        return self._reasoning
+    
+    async def analyze_receipts(
         self,
         db: Session,
         days_back: int = 30,
+        user_id: Optional[str] = None,
     ) -> list[AgentInsight]:
-        """Analyze recent receipts and generate insights."""
+        """Analyze receipts added since the last run and generate insights.
         
-        # Get recent receipts
+        Repeated calls over an unchanged receipt window (dashboard refreshes)
+        return the previous insights without calling OpenAI. Otherwise only
+        receipts newer than the tenant's watermark are sent, together with a
+        compact feature-store summary of the whole window and the insights already
+        reported. Insights are merged by :func:`semantic_key`.
+        """
+        lock = self._analysis_locks.setdefault(days_back, asyncio.Lock())
+        async with lock:
+            return await self._analyze_receipts(db, days_back, user_id)
+    
+    async def _analyze_receipts(
+        self, db: Session, days_back: int, user_id: Optional[str]
+    ) -> list[AgentInsight]:
         from shared_core.modules.receipts.models import Receipt
         
         cutoff_date = datetime.utcnow() - timedelta(days=days_back)
-        receipts = db.query(Receipt).filter(
+        window = (
             Receipt.tenant_id == self.tenant_id,
             Receipt.receipt_date >= cutoff_date.date(),
-        ).order_by(Receipt.receipt_date.desc()).limit(100).all()
+        )
+        
+        count, total, newest_created, newest_updated = db.query(
+            func.count(Receipt.id),
+            func.coalesce(func.sum(Receipt.total_amount), 0.0),
+            func.max(Receipt.created_at),
+            func.max(Receipt.updated_at),
+        ).filter(*window).one()
+        digest = hashlib.sha256(
+            f"{count}|{float(total):.2f}|{newest_created}|{newest_updated}".encode()
+        ).hexdigest()
         
-        # Build context
-        context_data = self._build_receipt_context(receipts)
+        state = db.get(AgentAnalysisState, (self.tenant_id, days_back))
+        if state is not None and state.context_digest == digest:
+            logger.debug(f"Receipt window unchanged for tenant {self.tenant_id}, reusing insights")
+            return [AgentInsight(**i) for i in state.last_insights or []]
+        
+        # Only receipts the model has not seen yet
+        delta_query = db.query(Receipt).filter(*window)
+        incremental = state is not None and state.watermark is not None
+        if incremental:
+            delta_query = delta_query.filter(Receipt.created_at > state.watermark)
+        receipts = delta_query.order_by(Receipt.created_at.desc()).limit(100).all()
+        
+        # Build context: delta receipts + rolling summary of the whole window
+        features = get_spending_features(db, self.tenant_id)
+        context_data = self._build_receipt_context(receipts, features, days_back)
+        context_data["incremental"] = incremental
+        previous = [AgentInsight(**i) for i in (state.last_insights or [])] if state else []
+        if previous:
+            context_data["previous_insights"] = [
+                (i.metadata or {}).get("title") or i.message for i in previous
+            ]
         
         # Retrieve relevant memory
         query_text = f"Receipts and spending patterns for tenant {self.tenant_id}"
-        memory_context = self.memory.retrieve_context(query_text, top_k=5)
+        memory_context = await self.memory.retrieve_context(query_text, top_k=5)
         
         # Add memory to context
         if memory_context:
@@ -65,7 +138,9 @@ class FinanceAgentService:
             ]
         
         # Run reasoning
-        analysis = self.reasoning.analyze_financial_context(context_data)
+        analysis = await asyncio.to_thread(
+            self.reasoning.analyze_financial_context, context_data
+        )
         
         # Convert to insights
         insights = []
@@ -83,69 +158,70 @@ class FinanceAgentService:
                 },
             ))
         
-        # Store decisions in database
-        for insight in insights:
-            self._store_decision(db, insight)
+        # Store decisions in database (same semantic key updates the existing one)
+        insights = list({semantic_key(i): i for i in insights}.values())
+        await self._store_decisions(db, insights, user_id=user_id)
+        
+        # Earlier insights stay valid unless re-reported
+        merged = {semantic_key(i): i for i in previous}
+        merged.update({semantic_key(i): i for i in insights})
+        current = list(merged.values())[-MAX_TRACKED_INSIGHTS:]
         
-        return insights
+        rolling_summary = {
+            k: context_data[k]
+            for k in ("spending_by_category", "top_vendors", "total_spending", "receipt_count")
+        }
+        if state is None:
+            state = AgentAnalysisState(tenant_id=self.tenant_id, days_back=days_back)
+            db.add(state)
+        state.watermark = newest_created or state.watermark
+        state.context_digest = digest
+        state.rolling_summary = rolling_summary
+        state.last_insights = [i.dict() for i in current]
+        try:
+            db.commit()
+        except IntegrityError:
+            # Toinen prosessi lisäsi ensimmäisen tilan samaan aikaan: yhdistetään siihen
+            db.rollback()
+            state = db.get(AgentAnalysisState, (self.tenant_id, days_back))
+            stored = [AgentInsight(**i) for i in state.last_insights or []]
+            merged = {semantic_key(i): i for i in stored}
+            merged.update({semantic_key(i): i for i in current})
+            current = list(merged.values())[-MAX_TRACKED_INSIGHTS:]
+            if newest_created and (state.watermark is None or newest_created > state.watermark):
+                state.watermark = newest_created
+            state.context_digest = digest
+            state.rolling_summary = rolling_summary
+            state.last_insights = [i.dict() for i in current]
+            db.commit()
+        
+        return current
     
     def detect_spending_alerts(
         self,
         db: Session,
         category: Optional[str] = None,
+        refresh: bool = False,
     ) -> list[SpendingAlert]:
-        """Detect spending anomalies and generate alerts."""
-        
-        from shared_core.modules.receipts.models import Receipt
-        
-        # Get current and previous period
-        now = datetime.utcnow()
-        current_start = now - timedelta(days=30)
-        previous_start = current_start - timedelta(days=30)
-        
-        # Query receipts
-        current_query = db.query(Receipt).filter(
-            Receipt.tenant_id == self.tenant_id,
-            Receipt.receipt_date >= current_start.date(),
-        )
+        """Detect spending anomalies and generate alerts.
         
-        previous_query = db.query(Receipt).filter(
-            Receipt.tenant_id == self.tenant_id,
-            Receipt.receipt_date >= previous_start.date(),
-            Receipt.receipt_date < current_start.date(),
-        )
+        All categories and vendors are scored in one pass (see
+        :mod:`.anomalies`) and cached on this (per-tenant, shared) service
+        for the rest of the day; ``category`` filters the cached result
+        ("all" is the tenant total).
+        """
+        today = date.today()
+        if refresh or self._alerts_day != today:
+            features = get_spending_features(db, self.tenant_id, force_refresh=refresh)
+            self._alerts = detect_anomalies(features)
+            self._alerts_day = today
+        alerts = list(self._alerts)
         
         if category:
-            current_query = current_query.filter(Receipt.category == category)
-            previous_query = previous_query.filter(Receipt.category == category)
-        
-        current_receipts = current_query.all()
-        previous_receipts = previous_query.all()
-        
-        # Calculate totals
-        current_total = sum(r.total_amount for r in current_receipts)
-        previous_total = sum(r.total_amount for r in previous_receipts)
-        
-        alerts = []
-        
-        if previous_total > 0:
-            change_percent = ((current_total - previous_total) / previous_total) * 100
-            
-            # Alert if increase > 30%
-            if change_percent > 30:
-                alerts.append(SpendingAlert(
-                    category=category or "all",
-                    current_amount=current_total,
-                    previous_amount=previous_total,
-                    change_percent=change_percent,
-                    threshold_exceeded=True,
-                    message=f"Spending increased by {change_percent:.1f}% compared to previous period",
-                    recommendation="Review expenses and identify cost-saving opportunities.",
-                ))
-        
+            alerts = [a for a in alerts if a.category == category]
         return alerts
     
-    def store_user_feedback(
+    async def store_user_feedback(
         self,
         db: Session,
         decision_id: str,
@@ -171,7 +247,7 @@ class FinanceAgentService:
             # Store positive decision pattern
             decision = db.query(AgentDecision).filter(AgentDecision.id == decision_id).first()
             if decision:
-                self.memory.store_memory(
+                await self.memory.store_memory(
                     content_type="positive_decision",
                     content_id=str(decision.id),
                     content_text=decision.summary or decision.title,
@@ -206,16 +282,14 @@ class FinanceAgentService:
             for d in decisions
         ]
     
-    def _build_receipt_context(self, receipts: list) -> dict[str, Any]:
-        """Build context data from receipts."""
-        if not receipts:
-            return {"receipts": []}
-        
-        # Group by category
-        spending_by_category = {}
-        for r in receipts:
-            cat = r.category or "other"
-            spending_by_category[cat] = spending_by_category.get(cat, 0) + r.total_amount
+    def _build_receipt_context(
+        self,
+        receipts: list,
+        features: SpendingFeatures,
+        days_back: int = 30,
+    ) -> dict[str, Any]:
+        """Build context data from receipts and the tenant's spending features."""
+        window = features.window(days_back)
         
         return {
             "receipts": [
@@ -228,39 +302,107 @@ class FinanceAgentService:
                 }
                 for r in receipts
             ],
-            "spending_by_category": spending_by_category,
-            "total_spending": sum(r.total_amount for r in receipts),
-            "receipt_count": len(receipts),
+            "spending_by_category": features.spending_by_category(days_back),
+            "top_vendors": features.top_vendors(days_back),
+            "recurring_vendors": [
+                f"{v['vendor']} ({v['cadence']}, ~€{v['average_amount']:.2f})"
+                for v in features.recurring_vendors()[:5]
+            ],
+            "total_spending": window["totals"]["amount"],
+            "receipt_count": window["totals"]["count"],
         }
     
-    def _store_decision(self, db: Session, insight: AgentInsight) -> None:
-        """Store agent decision in database."""
+    async def _store_decisions(
+        self,
+        db: Session,
+        insights: list[AgentInsight],
+        user_id: Optional[str] = None,
+    ) -> None:
+        """Store agent decisions in one commit and embed them in one request.
         
-        decision = AgentDecision(
-            tenant_id=self.tenant_id,
-            user_id=self.user_id,
-            decision_type=insight.category,
-            title=insight.metadata.get("title", insight.message[:100]) if insight.metadata else insight.message[:100],
-            summary=insight.message,
-            recommendation=insight.metadata.get("recommendation") if insight.metadata else None,
-            action_items=insight.metadata.get("action_items", []) if insight.metadata else [],
-            confidence=insight.metadata.get("confidence", 0.0) if insight.metadata else 0.0,
-            context_data={"insight": insight.dict()},
-        )
+        An open decision with the same semantic key is updated in place; only
+        new or reworded decisions are (re-)embedded.
+        """
+        if not insights:
+            return
+        
+        keys = [semantic_key(i) for i in insights]
+        existing = {
+            d.semantic_key: d
+            for d in db.query(AgentDecision).filter(
+                AgentDecision.tenant_id == self.tenant_id,
+                AgentDecision.semantic_key.in_(keys),
+                AgentDecision.dismissed == False,
+            ).order_by(AgentDecision.created_at)
+        }
+        
+        changed = []
+        for key, insight in zip(keys, insights):
+            meta = insight.metadata or {}
+            decision = existing.get(key)
+            if decision is None:
+                decision = AgentDecision(
+                    tenant_id=self.tenant_id,
+                    user_id=user_id or self.user_id,
+                    decision_type=insight.category,
+                    semantic_key=key,
+                )
+                db.add(decision)
+            elif decision.summary == insight.message:
+                decision.confidence = meta.get("confidence", decision.confidence)
+                continue
+            decision.title = meta.get("title") or insight.message[:100]
+            decision.summary = insight.message
+            decision.recommendation = meta.get("recommendation")
+            decision.action_items = meta.get("action_items", [])
+            decision.confidence = meta.get("confidence", 0.0)
+            decision.context_data = {"insight": insight.dict()}
+            changed.append(decision)
         
-        db.add(decision)
         db.commit()
         
         # Store in memory
-        self.memory.store_memory(
-            content_type="decision",
-            content_id=str(decision.id),
-            content_text=decision.summary or decision.title,
-            metadata={
-                "decision_type": decision.decision_type,
-                "confidence": decision.confidence,
-            },
-        )
+        await self.memory.store_memories([
+            {
+                "content_type": "decision",
+                "content_id": str(d.id),
+                "content_text": d.summary or d.title,
+                "metadata": {
+                    "decision_type": d.decision_type,
+                    "confidence": d.confidence,
+                },
+            }
+            for d in changed
+        ])
         
-        logger.info(f"Stored agent decision: {decision.id}")
+        logger.info(
+            f"Stored {len(changed)} agent decisions ({len(insights) - len(changed)} unchanged)"
+        )
 
+
+def semantic_key(insight: AgentInsight) -> str:
+    """Type plus the title's words: "Fuel costs up 35%" == "Fuel costs up 40 %"."""
+    title = (insight.metadata or {}).get("title") or insight.message
+    words = re.findall(r"[^\W\d_]+", title.lower())
+    return f"{insight.category}:{' '.join(words)}"[:128]
+
+
+_services: "OrderedDict[str, FinanceAgentService]" = OrderedDict()
+_services_lock = threading.Lock()
+
+
+def get_finance_agent_service(tenant_id: str) -> FinanceAgentService:
+    """Cached per-tenant service; least recently used tenants are evicted.
+    
+    Services are cheap until ``memory`` / ``reasoning`` are first touched,
+    and those share process-wide OpenAI, embedding and vector store clients.
+    Per-request user ids are passed to the methods that record them.
+    """
+    with _services_lock:
+        service = _services.get(tenant_id)
+        if service is None:
+            service = _services[tenant_id] = FinanceAgentService(tenant_id)
+            while len(_services) > MAX_CACHED_TENANTS:
+                _services.popitem(last=False)
+        _services.move_to_end(tenant_id)
+        return service
@@ -0,0 +1,473 @@
+"""Pluggable vector stores for FinanceAgent memory.
+
+``get_vector_store(tenant_id)`` returns a :class:`PineconeVectorStore` when
+``PINECONE_API_KEY`` is set (or ``VECTOR_STORE=pinecone``), otherwise a
+:class:`LocalVectorStore`, so memory works the same in dev and on-prem.
+
+Local layout, one directory per tenant under ``VECTOR_STORE_DIR``, named
+``<readable prefix>-<sha256 of tenant_id>`` so distinct tenant ids never
+share a directory:
+
+* ``vectors.f32`` - append-only float32 rows, L2-normalised (cosine = dot).
+* ``log.jsonl`` - one line per write: ``{"op": "add", "row", "id", "meta"}``
+  or ``{"op": "del", "id"}``. Re-adding an id supersedes its old row.
+* ``hnsw.bin`` / ``hnsw.json`` - optional HNSW graph (``hnswlib``) and the
+  number of rows it covers; built once a tenant has ``VECTOR_HNSW_MIN_ROWS``
+  live rows, extended incrementally afterwards.
+
+Small tenants are searched exactly with one matrix-vector product over the
+memmap. :meth:`LocalVectorStore.compact` rewrites the files without dead
+rows once they exceed ``VECTOR_COMPACT_DEAD_RATIO``.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("converto.finance_agent.vector_store")
+
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", "/tmp/converto-vectors")
+HNSW_MIN_ROWS = int(os.getenv("VECTOR_HNSW_MIN_ROWS", "20000"))
+HNSW_M = int(os.getenv("VECTOR_HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("VECTOR_HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("VECTOR_HNSW_EF_SEARCH", "128"))
+COMPACT_DEAD_RATIO = float(os.getenv("VECTOR_COMPACT_DEAD_RATIO", "0.3"))
+MAX_OPEN_TENANTS = int(os.getenv("VECTOR_STORE_MAX_TENANTS", "128"))
+
+# (id, vector, metadata)
+Record = Tuple[str, Sequence[float], Dict[str, Any]]
+
+
+class VectorStore(ABC):
+    """Tenant-scoped vector store interface used by ``MemoryLayer``."""
+
+    @abstractmethod
+    def upsert(self, records: List[Record]) -> None: ...
+
+    @abstractmethod
+    def query(
+        self,
+        vector: Sequence[float],
+        top_k: int = 5,
+        content_types: Optional[List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Nearest records as ``{"id", "score", "metadata"}``, best first."""
+
+    @abstractmethod
+    def delete(self, ids: List[str]) -> None: ...
+
+
+@lru_cache(maxsize=None)
+def _pinecone_index(index_name: str) -> Any:
+    """One Pinecone client/index handle per process, shared by all tenants."""
+    from pinecone import Pinecone
+
+    client = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+    return client.Index(index_name)
+
+
+class PineconeVectorStore(VectorStore):
+    """Pinecone index (client v3+), filtered by tenant_id metadata."""
+
+    def __init__(self, tenant_id: str, index_name: Optional[str] = None):
+        self.tenant_id = tenant_id
+        self.index = _pinecone_index(
+            index_name or os.getenv("PINECONE_INDEX_NAME", "converto-finance-agent")
+        )
+
+    def upsert(self, records: List[Record]) -> None:
+        self.index.upsert(
+            vectors=[
+                {
+                    "id": rid,
+                    "values": list(map(float, vec)),
+                    "metadata": {**meta, "tenant_id": self.tenant_id},
+                }
+                for rid, vec, meta in records
+            ]
+        )
+
+    def query(self, vector, top_k=5, content_types=None):
+        filter_dict: Dict[str, Any] = {"tenant_id": {"$eq": self.tenant_id}}
+        if content_types:
+            filter_dict["content_type"] = {"$in": content_types}
+        results = self.index.query(
+            vector=list(map(float, vector)),
+            top_k=top_k,
+            filter=filter_dict,
+            include_metadata=True,
+        )
+        return [
+            {"id": m.id, "score": m.score, "metadata": m.metadata}
+            for m in results.matches
+        ]
+
+    def delete(self, ids: List[str]) -> None:
+        self.index.delete(ids=ids)
+
+
+def _normalize(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=-1, keepdims=True)
+    return m / np.where(norms == 0, 1.0, norms)
+
+
+def tenant_dir_name(tenant_id: str) -> str:
+    """Collision-free directory name: readable prefix + SHA-256 of the tenant id."""
+    prefix = re.sub(r"[^A-Za-z0-9_.-]", "_", tenant_id)[:32].strip(".") or "tenant"
+    return f"{prefix}-{hashlib.sha256(tenant_id.encode()).hexdigest()}"
+
+
+def _migrate_legacy_dir(directory: str, tenant_id: str, path: str) -> None:
+    # Vanha hakemisto oli puhdistettu tenant_id; siirretään se, jonka nimi on
+    # tenant_id sellaisenaan. Siinä voi olla myös toisen tenantin rivejä, jonka
+    # id puhdistui samaksi - _mask jättää ne pois metadatan tenant_id:n perusteella.
+    legacy = os.path.join(directory, tenant_id)
+    if (
+        re.fullmatch(r"[A-Za-z0-9_.-]+", tenant_id)
+        and tenant_id not in (".", "..")
+        and os.path.isdir(legacy)
+        and not os.path.exists(path)
+    ):
+        os.rename(legacy, path)
+        logger.info(f"Moved vector store of tenant {tenant_id} to {path}")
+
+
+class LocalVectorStore(VectorStore):
+    """Memory-mapped per-tenant store with exact and HNSW search."""
+
+    def __init__(self, tenant_id: str, directory: str = VECTOR_STORE_DIR):
+        self.tenant_id = tenant_id
+        self.path = os.path.join(directory, tenant_dir_name(tenant_id))
+        _migrate_legacy_dir(directory, tenant_id, self.path)
+        os.makedirs(self.path, exist_ok=True)
+        self.vectors_path = os.path.join(self.path, "vectors.f32")
+        self.log_path = os.path.join(self.path, "log.jsonl")
+        self.meta_path = os.path.join(self.path, "store.json")
+        self.hnsw_path = os.path.join(self.path, "hnsw.bin")
+        self.hnsw_state_path = os.path.join(self.path, "hnsw.json")
+        self._lock = threading.RLock()
+        self._reset()
+
+    # --- state -----------------------------------------------------------
+
+    def _reset(self) -> None:
+        self.dim: Optional[int] = None
+        self._ids: List[Optional[str]] = []  # row -> id (None = dead)
+        self._meta: List[Optional[Dict[str, Any]]] = []
+        self._types: List[Optional[str]] = []
+        self._row_of: Dict[str, int] = {}
+        self._log_offset = 0
+        self._log_inode: Optional[int] = None
+        self._mm: Optional[np.memmap] = None
+        self._hnsw: Any = None
+        self._hnsw_rows = 0
+        self._masks: Dict[Any, np.ndarray] = {}
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        with open(os.path.join(self.path, ".lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refresh(self) -> None:
+        """Replay log lines written since the last call (also by other processes)."""
+        try:
+            st = os.stat(self.log_path)
+        except FileNotFoundError:
+            return
+        if self._log_inode is not None and st.st_ino != self._log_inode:
+            # Toinen prosessi tiivisti tiedostot: luetaan kaikki uudelleen
+            self._reset()
+        self._log_inode = st.st_ino
+        if st.st_size == self._log_offset:
+            return
+        if self.dim is None and os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                self.dim = json.load(f)["dim"]
+        with open(self.log_path, "rb") as f:
+            f.seek(self._log_offset)
+            chunk = f.read()
+        complete = chunk[: chunk.rfind(b"\n") + 1]
+        for line in complete.splitlines():
+            self._apply(json.loads(line))
+        self._log_offset += len(complete)
+        self._mm = None
+        self._masks = {}
+
+    def _apply(self, op: Dict[str, Any]) -> None:
+        if op["op"] == "add":
+            row = op["row"]
+            while len(self._ids) <= row:
+                self._ids.append(None)
+                self._meta.append(None)
+                self._types.append(None)
+            self._kill(op["id"])
+            self._ids[row] = op["id"]
+            self._meta[row] = op["meta"]
+            self._types[row] = op["meta"].get("content_type")
+            self._row_of[op["id"]] = row
+        elif op["op"] == "del":
+            self._kill(op["id"])
+
+    def _kill(self, rid: str) -> None:
+        old = self._row_of.pop(rid, None)
+        if old is not None:
+            self._ids[old] = None
+            self._meta[old] = None
+            self._types[old] = None
+
+    def _matrix(self) -> Optional[np.ndarray]:
+        if self._mm is None and self.dim and os.path.exists(self.vectors_path):
+            n = min(len(self._ids), os.path.getsize(self.vectors_path) // (4 * self.dim))
+            if n:
+                self._mm = np.memmap(
+                    self.vectors_path, dtype=np.float32, mode="r", shape=(n, self.dim)
+                )
+        return self._mm
+
+    @property
+    def live_count(self) -> int:
+        return len(self._row_of)
+
+    @property
+    def dead_count(self) -> int:
+        return len(self._ids) - len(self._row_of)
+
+    # --- writes ----------------------------------------------------------
+
+    def _append_log(self, ops: List[Dict[str, Any]]) -> None:
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def upsert(self, records: List[Record]) -> None:
+        if not records:
+            return
+        block = _normalize(np.asarray([r[1] for r in records], dtype=np.float32))
+        with self._lock, self._file_lock():
+            self._refresh()
+            if self.dim is None:
+                self.dim = int(block.shape[1])
+                with open(self.meta_path, "w") as f:
+                    json.dump({"dim": self.dim}, f)
+            if block.shape[1] != self.dim:
+                raise ValueError(f"vector dim {block.shape[1]} != store dim {self.dim}")
+            with open(self.vectors_path, "ab") as f:
+                first = f.tell() // (4 * self.dim)
+                f.write(block.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            # Loki kirjoitetaan vektorien jälkeen, joten lokirivillä on aina data
+            ops = [
+                {"op": "add", "row": first + i, "id": rid, "meta": meta}
+                for i, (rid, _, meta) in enumerate(records)
+            ]
+            self._append_log(ops)
+            self._refresh()
+
+    def delete(self, ids: List[str]) -> None:
+        if not ids:
+            return
+        with self._lock, self._file_lock():
+            self._refresh()
+            self._append_log([{"op": "del", "id": rid} for rid in ids])
+            self._refresh()
+
+    def compact(self, force: bool = False) -> bool:
+        """Drop dead rows; returns True if the files were rewritten."""
+        with self._lock, self._file_lock():
+            self._refresh()
+            total = len(self._ids)
+            if not total or (
+                not force and self.dead_count / total < COMPACT_DEAD_RATIO
+            ):
+                return False
+            rows = sorted(self._row_of.values())
+            m = self._matrix()
+            tmp_vectors = self.vectors_path + ".tmp"
+            tmp_log = self.log_path + ".tmp"
+            with open(tmp_vectors, "wb") as f:
+                if rows and m is not None:
+                    f.write(np.ascontiguousarray(m[rows]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(tmp_log, "w", encoding="utf-8") as f:
+                for new_row, old_row in enumerate(rows):
+                    op = {
+                        "op": "add",
+                        "row": new_row,
+                        "id": self._ids[old_row],
+                        "meta": self._meta[old_row],
+                    }
+                    f.write(json.dumps(op, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._mm = None
+            os.replace(tmp_vectors, self.vectors_path)
+            os.replace(tmp_log, self.log_path)
+            for p in (self.hnsw_path, self.hnsw_state_path):
+                if os.path.exists(p):
+                    os.remove(p)
+            logger.info(
+                "compacted vector store %s: %s -> %s rows", self.tenant_id, total, len(rows)
+            )
+            self._reset()
+            self._refresh()
+            return True
+
+    # --- search ----------------------------------------------------------
+
+    def _exact(self, q: np.ndarray, top_k: int, allowed: np.ndarray) -> List[Tuple[int, float]]:
+        m = self._matrix()
+        if m is None:
+            return []
+        n = m.shape[0]
+        scores = np.asarray(m @ q)
+        scores[~allowed[:n]] = -np.inf  # m @ q on uusi taulukko, memmap ei muutu
+        k = min(top_k, int(allowed[:n].sum()))
+        if k <= 0:
+            return []
+        idx = np.argpartition(-scores, k - 1)[:k]
+        idx = idx[np.argsort(-scores[idx])]
+        return [(int(i), float(scores[i])) for i in idx]
+
+    def _ensure_hnsw(self) -> Any:
+        """Load or extend the HNSW graph; None if hnswlib is missing."""
+        try:
+            import hnswlib
+        except ImportError:
+            if self._hnsw is None:
+                logger.warning("hnswlib not installed, using exact search for large tenants")
+                self._hnsw = False
+            return None
+        m = self._matrix()
+        if m is None:
+            return None
+        n = m.shape[0]
+        if not self._hnsw:
+            index = hnswlib.Index(space="ip", dim=self.dim)
+            covered = 0
+            if os.path.exists(self.hnsw_path) and os.path.exists(self.hnsw_state_path):
+                with open(self.hnsw_state_path) as f:
+                    covered = min(json.load(f)["rows"], n)
+                index.load_index(self.hnsw_path, max_elements=max(n, 1))
+            else:
+                index.init_index(
+                    max_elements=max(n, 1), ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M
+                )
+            self._hnsw, self._hnsw_rows = index, covered
+        if self._hnsw_rows < n:
+            index = self._hnsw
+            if index.get_max_elements() < n:
+                index.resize_index(max(n, int(index.get_max_elements() * 1.5)))
+            start = self._hnsw_rows
+            # Kuolleet rivit jäävät graafiin; hakusuodatin ohittaa ne kunnes tiivistetään
+            index.add_items(np.asarray(m[start:n]), np.arange(start, n))
+            self._hnsw_rows = n
+            index.save_index(self.hnsw_path)
+            with open(self.hnsw_state_path, "w") as f:
+                json.dump({"rows": n}, f)
+        return self._hnsw
+
+    def _approx(
+        self, q: np.ndarray, top_k: int, allowed: np.ndarray
+    ) -> Optional[List[Tuple[int, float]]]:
+        index = self._ensure_hnsw()
+        if index is None:
+            return None
+        allowed = allowed[: self._hnsw_rows]
+        k = min(top_k, int(allowed.sum()))
+        if k <= 0:
+            return []
+        index.set_ef(max(HNSW_EF_SEARCH, k))
+        # Python-suodatin kutsutaan jokaiselle käydylle solmulle; ohitetaan kun kaikki käyvät
+        row_filter = None if allowed.all() else (lambda label: bool(allowed[label]))
+        labels, distances = index.knn_query(q, k=k, filter=row_filter)
+        # "ip"-avaruudessa etäisyys on 1 - pistetulo
+        return [(int(label), float(1.0 - d)) for label, d in zip(labels[0], distances[0])]
+
+    def _mask(self, content_types: Optional[List[str]]) -> np.ndarray:
+        """Searchable rows, cached until the next log replay."""
+        key = tuple(sorted(content_types)) if content_types else None
+        mask = self._masks.get(key)
+        if mask is None:
+            if key is None:
+                mask = np.fromiter(
+                    (i is not None for i in self._ids), dtype=bool, count=len(self._ids)
+                )
+            else:
+                wanted = set(key)
+                mask = np.fromiter(
+                    (t in wanted for t in self._types), dtype=bool, count=len(self._types)
+                )
+            # Vanhasta (puhdistetusta) hakemistosta siirretyt toisen tenantin rivit
+            mask &= np.fromiter(
+                (m is None or m.get("tenant_id") in (None, self.tenant_id) for m in self._meta),
+                dtype=bool,
+                count=len(self._meta),
+            )
+            self._masks[key] = mask
+        return mask
+
+    def query(self, vector, top_k=5, content_types=None, exact: bool = False):
+        """See :meth:`VectorStore.query`; ``exact=True`` skips HNSW (benchmarks)."""
+        q = _normalize(np.asarray(vector, dtype=np.float32))
+        with self._lock:
+            self._refresh()
+            if not self._row_of:
+                return []
+            alive = self._mask(content_types)
+            hits = None
+            if not exact and self.live_count >= HNSW_MIN_ROWS:
+                hits = self._approx(q, top_k, alive)
+            if hits is None:
+                hits = self._exact(q, top_k, alive)
+            return [
+                {"id": self._ids[row], "score": score, "metadata": self._meta[row]}
+                for row, score in hits
+            ]
+
+
+_local_stores: "OrderedDict[str, LocalVectorStore]" = OrderedDict()
+_stores_lock = threading.Lock()
+
+
+def get_vector_store(tenant_id: str) -> Optional[VectorStore]:
+    """Store for ``tenant_id`` per ``VECTOR_STORE`` (auto|local|pinecone|none)."""
+    backend = os.getenv("VECTOR_STORE", "auto")
+    if backend == "auto":
+        backend = "pinecone" if os.getenv("PINECONE_API_KEY") else "local"
+    if backend == "none":
+        return None
+    if backend == "pinecone":
+        try:
+            return PineconeVectorStore(tenant_id)
+        except ImportError:
+            logger.warning("Pinecone not installed, falling back to local vector store")
+        except Exception as e:
+            logger.warning(f"Pinecone initialization failed, falling back to local: {e}")
+    with _stores_lock:
+        store = _local_stores.get(tenant_id)
+        if store is None:
+            store = _local_stores[tenant_id] = LocalVectorStore(tenant_id)
+            while len(_local_stores) > MAX_OPEN_TENANTS:
+                _local_stores.popitem(last=False)
+        _local_stores.move_to_end(tenant_id)
+        return store
@@ -48,6 +48,23 @@ def compute_event_id(
     return hashlib.sha256(base.encode()).hexdigest()[:16]
 
 
+def build_event(
+    tenant_id: Optional[str],
+    kind: str,
+    points: Optional[int] = None,
+    user_id: Optional[str] = None,
+    meta: Optional[Dict] = None,
+) -> GamifyEvent:
+    """
+    Build an unsaved event with weighted points. Caller adds it to a session and commits,
+    so it can share a transaction with other writes (see ocr.store.save_scan).
+    """
+    ensure_tables_created()
+    weights = load_weights()
+    pts = int(points if points is not None else weights.get(kind, 5))
+    return GamifyEvent(tenant_id=tenant_id, user_id=user_id, kind=kind, points=pts, meta=meta or {})
+
+
 def record_event(
     db: Session,
     tenant_id: Optional[str],
@@ -61,8 +78,6 @@ def record_event(
     Record a gamification event. Returns None if duplicate (idempotent).
     """
     ensure_tables_created()
-    weights = load_weights()
-    pts = int(points if points is not None else weights.get(kind, 5))
 
     # Idempotency check
     eid = event_id or compute_event_id(tenant_id, kind, user_id, meta)
@@ -82,7 +97,7 @@ def record_event(
     if existing:
         return None  # duplicate
 
-    ev = GamifyEvent(tenant_id=tenant_id, user_id=user_id, kind=kind, points=pts, meta=meta or {})
+    ev = build_event(tenant_id, kind, points=points, user_id=user_id, meta=meta)
     db.add(ev)
     db.commit()
     db.refresh(ev)
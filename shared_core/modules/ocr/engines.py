@@ -0,0 +1,225 @@
+"""Pluggable OCR engines.
+
+Every engine returns word-level data in the ``pytesseract.image_to_data``
+dict layout (text, conf, left, top, width, height, block/par/line numbers),
+so :mod:`extract` and :func:`service.run_ocr_bytes` work unchanged whichever
+engine is selected with ``OCR_ENGINE``:
+
+``pytesseract`` (default)
+    Spawns a ``tesseract`` process per image.
+``tesserocr``
+    libtesseract in-process through ``tesserocr``. One API handle per thread
+    stays initialised, so language models are loaded once and there is no
+    fork per image.
+``paddle`` / ``onnx``
+    PaddleOCR, or its ONNX Runtime port (``rapidocr_onnxruntime``) on CPU.
+    Line-level detector; word boxes are interpolated from the line box.
+
+Optional engines import their dependency lazily and raise ``RuntimeError``
+with an install hint when it is missing.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pytesseract
+
+logger = logging.getLogger("converto.ocr.engines")
+
+OCR_LANG = os.getenv("OCR_LANG", "fin+eng")
+TESSERACT_CONFIG = "--oem 1 --psm 6"
+
+DATA_KEYS = (
+    "level",
+    "page_num",
+    "block_num",
+    "par_num",
+    "line_num",
+    "word_num",
+    "left",
+    "top",
+    "width",
+    "height",
+    "conf",
+    "text",
+)
+
+
+class OcrEngine(ABC):
+    """Base class: implement :meth:`image_to_data`."""
+
+    name = "base"
+    # Tesseract-pohjaiset moottorit hyötyvät binarisoinnista, neuroverkot eivät
+    wants_binarized = True
+
+    @abstractmethod
+    def image_to_data(self, img: np.ndarray) -> Dict[str, List[Any]]:
+        """Word-level data in the ``pytesseract.image_to_data`` dict layout."""
+
+    def image_to_string(self, img: np.ndarray) -> str:
+        data = self.image_to_data(img)
+        lines: Dict[tuple, List[str]] = {}
+        for i, text in enumerate(data["text"]):
+            if str(text).strip() and float(data["conf"][i]) >= 0:
+                key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+                lines.setdefault(key, []).append(str(text).strip())
+        return "\n".join(" ".join(words) for _, words in sorted(lines.items()))
+
+
+class PytesseractEngine(OcrEngine):
+    name = "pytesseract"
+
+    def __init__(self, lang: str = OCR_LANG, config: str = TESSERACT_CONFIG):
+        self.lang = lang
+        self.config = config
+
+    def image_to_data(self, img: np.ndarray) -> Dict[str, List[Any]]:
+        return pytesseract.image_to_data(
+            img, lang=self.lang, config=self.config, output_type=pytesseract.Output.DICT
+        )
+
+    def image_to_string(self, img: np.ndarray) -> str:
+        return pytesseract.image_to_string(img, lang=self.lang, config=self.config)
+
+
+class TesserocrEngine(OcrEngine):
+    name = "tesserocr"
+
+    def __init__(self, lang: str = OCR_LANG):
+        try:
+            import tesserocr
+        except ImportError as e:
+            raise RuntimeError("tesserocr not installed. Install with: pip install tesserocr") from e
+        self._tesserocr = tesserocr
+        self.lang = lang
+        self._local = threading.local()
+
+    def _api(self) -> Any:
+        api = getattr(self._local, "api", None)
+        if api is None:
+            t = self._tesserocr
+            api = t.PyTessBaseAPI(lang=self.lang, psm=t.PSM.SINGLE_BLOCK, oem=t.OEM.LSTM_ONLY)
+            self._local.api = api
+        return api
+
+    def image_to_data(self, img: np.ndarray) -> Dict[str, List[Any]]:
+        from PIL import Image
+
+        api = self._api()
+        api.SetImage(Image.fromarray(img))
+        return _parse_tsv(api.GetTSVText(0))
+
+    def image_to_string(self, img: np.ndarray) -> str:
+        from PIL import Image
+
+        api = self._api()
+        api.SetImage(Image.fromarray(img))
+        return api.GetUTF8Text()
+
+
+class PaddleEngine(OcrEngine):
+    """PaddleOCR (``backend="paddle"``) or RapidOCR on ONNX Runtime (``"onnx"``)."""
+
+    wants_binarized = False
+
+    def __init__(self, backend: str = "onnx"):
+        self.name = backend
+        try:
+            if backend == "onnx":
+                from rapidocr_onnxruntime import RapidOCR
+
+                self._ocr = RapidOCR()
+            else:
+                from paddleocr import PaddleOCR
+
+                self._ocr = PaddleOCR(use_angle_cls=False, lang="latin", show_log=False)
+        except ImportError as e:
+            pkg = "rapidocr_onnxruntime" if backend == "onnx" else "paddleocr paddlepaddle"
+            raise RuntimeError(f"{backend} OCR not installed. Install with: pip install {pkg}") from e
+        self._lock = threading.Lock()
+
+    def _lines(self, img: np.ndarray) -> List[tuple]:
+        """Return (box, text, score) per detected line."""
+        if img.ndim == 2:
+            img = np.repeat(img[:, :, None], 3, axis=2)
+        with self._lock:
+            if self.name == "onnx":
+                result, _ = self._ocr(img)
+                return [(r[0], r[1], float(r[2])) for r in result or []]
+            pages = self._ocr.ocr(img, cls=False)
+        return [(r[0], r[1][0], float(r[1][1])) for r in (pages[0] if pages else None) or []]
+
+    def image_to_data(self, img: np.ndarray) -> Dict[str, List[Any]]:
+        data: Dict[str, List[Any]] = {k: [] for k in DATA_KEYS}
+        for line_num, (box, text, score) in enumerate(self._lines(img), start=1):
+            pts = np.asarray(box, dtype=np.float32)
+            x0, y0 = pts.min(axis=0)
+            x1, y1 = pts.max(axis=0)
+            words = text.split()
+            if not words:
+                continue
+            # Sanalaatikot arvioidaan rivilaatikosta merkkimäärän suhteessa
+            lengths = np.array([len(w) + 1 for w in words], dtype=np.float32)
+            edges = x0 + (x1 - x0) * np.concatenate(([0.0], np.cumsum(lengths))) / lengths.sum()
+            for word_num, w in enumerate(words, start=1):
+                left = int(edges[word_num - 1])
+                data["level"].append(5)
+                data["page_num"].append(1)
+                data["block_num"].append(1)
+                data["par_num"].append(1)
+                data["line_num"].append(line_num)
+                data["word_num"].append(word_num)
+                data["left"].append(left)
+                data["top"].append(int(y0))
+                data["width"].append(max(1, int(edges[word_num]) - left - 1))
+                data["height"].append(int(y1 - y0))
+                data["conf"].append(round(score * 100, 2))
+                data["text"].append(w)
+        return data
+
+
+def _parse_tsv(tsv: str) -> Dict[str, List[Any]]:
+    data: Dict[str, List[Any]] = {k: [] for k in DATA_KEYS}
+    reader = csv.reader(io.StringIO(tsv), delimiter="\t", quoting=csv.QUOTE_NONE)
+    for row in reader:
+        if len(row) < len(DATA_KEYS) or not row[0].isdigit():
+            continue
+        for k, v in zip(DATA_KEYS[:-1], row):
+            data[k].append(float(v) if k == "conf" else int(v))
+        data["text"].append(row[11])
+    return data
+
+
+ENGINES = {
+    "pytesseract": PytesseractEngine,
+    "tesserocr": TesserocrEngine,
+    "paddle": lambda: PaddleEngine("paddle"),
+    "onnx": lambda: PaddleEngine("onnx"),
+}
+
+_instances: Dict[str, OcrEngine] = {}
+_instances_lock = threading.Lock()
+
+
+def get_engine(name: Optional[str] = None) -> OcrEngine:
+    """Shared engine instance by name (default ``OCR_ENGINE``, else pytesseract)."""
+    name = (name or os.getenv("OCR_ENGINE") or "pytesseract").lower()
+    engine = _instances.get(name)
+    if engine is None:
+        if name not in ENGINES:
+            raise ValueError(f"unknown OCR engine: {name}")
+        with _instances_lock:
+            engine = _instances.get(name)
+            if engine is None:
+                engine = ENGINES[name]()
+                _instances[name] = engine
+                logger.info("OCR engine initialised: %s", name)
+    return engine
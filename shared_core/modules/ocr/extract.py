@@ -0,0 +1,328 @@
+"""Structured receipt field extraction from Tesseract word boxes.
+
+The OCR engine (``pytesseract.image_to_data`` layout) gives every word with its bounding box and
+confidence. Words are grouped into lines with NumPy, every line is scanned
+once with a single compiled multi-pattern regex (amounts, VAT rates, dates,
+Y-tunnus, invoice numbers), and line items are reconstructed from the
+geometry: item prices form a right-aligned column above the total line.
+
+Each field carries a confidence (mean Tesseract confidence of the words the
+value came from) and the result includes consistency checks, so callers can
+decide whether the local parse is good enough to skip the vision model.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .engines import OcrEngine, get_engine
+from .service import prepare_image
+
+# Voimassa olevat ja aiemmat Suomen ALV-kannat
+FI_VAT_RATES = (25.5, 24.0, 14.0, 13.5, 10.0, 0.0)
+
+SCANNER = re.compile(
+    r"(?P<business_id>\b\d{7}-\d\b)"
+    r"|(?P<date>\b(?:\d{1,2}[./-]\d{1,2}[./-](?:\d{4}|\d{2})|\d{4}-\d{2}-\d{2})\b)"
+    r"|(?P<vat_rate>\b\d{1,2}(?:[.,]\d{1,2})?\s?%)"
+    r"|(?P<invoice>\b(?:kuitti(?:nro|numero)?|kuitin\s?nro|lasku(?:nro|numero)?|invoice|receipt"
+    r"|tosite(?:nro)?)\b[\s.:#]*(?:nro|no|n:o)?[\s.:#]*(?P<invoice_no>[A-Z0-9][A-Z0-9/-]{2,}))"
+    r"|(?P<amount>(?<![\d.,])-?\d{1,3}(?:[ .]\d{3})*[.,]\d{2}(?!\d)-?)",
+    re.IGNORECASE,
+)
+
+TOTAL_RE = re.compile(r"\b(yhteensä|yhteensa|yht\.?|total|summa|maksettava|to pay)\b", re.I)
+VAT_RE = re.compile(r"\b(alv|vat|moms|arvonlisävero)\b", re.I)
+NON_ITEM_RE = re.compile(
+    r"\b(alv|vat|moms|veroton|verollinen|kortti|card|käteinen|vaihtoraha|takaisin|pankki"
+    r"|visa|mastercard|debit|credit|yhteensä|yhteensa|total|summa|maksettava|netto|brutto)\b",
+    re.I,
+)
+QTY_RE = re.compile(r"\b(\d+(?:[.,]\d+)?)\s?(?:x|kpl|pcs|st)\b", re.I)
+DATE_FORMATS = ("%d.%m.%Y", "%d.%m.%y", "%Y-%m-%d", "%d/%m/%Y", "%d/%m/%y", "%d-%m-%Y")
+
+
+@dataclass
+class OcrWords:
+    """Column arrays from ``image_to_data`` (one entry per recognised word)."""
+
+    text: np.ndarray
+    conf: np.ndarray
+    left: np.ndarray
+    top: np.ndarray
+    width: np.ndarray
+    height: np.ndarray
+    line_key: np.ndarray
+    image_width: int
+
+
+@dataclass
+class OcrLine:
+    text: str
+    conf: np.ndarray  # per word, 0..1
+    offsets: np.ndarray  # start char offset of each word in ``text``
+    rights: np.ndarray  # right x of each word
+    bbox: List[int]  # left, top, right, bottom
+
+    def conf_for_span(self, start: int, end: int) -> float:
+        first = int(np.searchsorted(self.offsets, start, side="right")) - 1
+        last = int(np.searchsorted(self.offsets, max(start, end - 1), side="right")) - 1
+        return float(self.conf[max(first, 0) : last + 1].mean())
+
+    def right_for_pos(self, pos: int) -> int:
+        return int(self.rights[int(np.searchsorted(self.offsets, pos, side="right")) - 1])
+
+
+def words_from_data(data: Dict[str, List[Any]], image_width: int) -> OcrWords:
+    text = np.array([str(t).strip() for t in data["text"]], dtype=object)
+    conf = np.asarray(data["conf"], dtype=np.float32)
+    keep = (conf >= 0) & (text != "")
+    block = np.asarray(data["block_num"], dtype=np.int64)
+    par = np.asarray(data["par_num"], dtype=np.int64)
+    line = np.asarray(data["line_num"], dtype=np.int64)
+    return OcrWords(
+        text=text[keep],
+        conf=conf[keep] / 100.0,
+        left=np.asarray(data["left"], dtype=np.int32)[keep],
+        top=np.asarray(data["top"], dtype=np.int32)[keep],
+        width=np.asarray(data["width"], dtype=np.int32)[keep],
+        height=np.asarray(data["height"], dtype=np.int32)[keep],
+        line_key=((block * 1000 + par) * 1000 + line)[keep],
+        image_width=image_width,
+    )
+
+
+def run_ocr_data(b: bytes, engine: Optional[OcrEngine] = None) -> OcrWords:
+    """OCR with word boxes, same engine and preprocessing as ``run_ocr_bytes``."""
+    engine = engine or get_engine()
+    img = prepare_image(b, engine)
+    return words_from_data(engine.image_to_data(img), img.shape[1])
+
+
+def group_lines(w: OcrWords) -> List[OcrLine]:
+    """Group words into lines (sorted top to bottom, words left to right)."""
+    if w.text.size == 0:
+        return []
+    order = np.lexsort((w.left, w.line_key))
+    _, starts = np.unique(w.line_key[order], return_index=True)
+    lines: List[OcrLine] = []
+    for idx in np.split(order, starts[1:]):
+        words = w.text[idx]
+        lengths = np.fromiter((len(s) for s in words), dtype=np.int64, count=len(words))
+        offsets = np.concatenate(([0], np.cumsum(lengths + 1)[:-1]))
+        rights = w.left[idx] + w.width[idx]
+        lines.append(
+            OcrLine(
+                text=" ".join(words),
+                conf=w.conf[idx],
+                offsets=offsets,
+                rights=rights,
+                bbox=[
+                    int(w.left[idx].min()),
+                    int(w.top[idx].min()),
+                    int(rights.max()),
+                    int((w.top[idx] + w.height[idx]).max()),
+                ],
+            )
+        )
+    lines.sort(key=lambda ln: ln.bbox[1])
+    return lines
+
+
+def parse_amount(s: str) -> float:
+    neg = s.startswith("-") or s.endswith("-")
+    s = s.strip("-").replace(" ", "")
+    if "," in s:
+        s = s.replace(".", "").replace(",", ".")
+    elif s.count(".") > 1:
+        whole, _, dec = s.rpartition(".")
+        s = whole.replace(".", "") + "." + dec
+    value = float(s)
+    return -value if neg else value
+
+
+def _parse_date(s: str) -> Optional[str]:
+    for fmt in DATE_FORMATS:
+        try:
+            d = datetime.strptime(s, fmt)
+        except ValueError:
+            continue
+        if 2000 <= d.year <= datetime.utcnow().year + 1:
+            return d.strftime("%Y-%m-%d")
+    return None
+
+
+def valid_business_id(bid: str) -> bool:
+    """Y-tunnuksen tarkistenumero (painot 7,9,10,5,8,4,2, modulo 11)."""
+    digits, check = bid[:7], int(bid[-1])
+    r = int(np.dot(np.array([int(c) for c in digits]), np.array([7, 9, 10, 5, 8, 4, 2]))) % 11
+    if r == 1:
+        return False
+    return check == (0 if r == 0 else 11 - r)
+
+
+def parse_receipt(lines: List[OcrLine], image_width: int = 0) -> Dict[str, Any]:
+    """Extract receipt fields from OCR lines."""
+    n = len(lines)
+    amounts: List[List[tuple]] = [[] for _ in range(n)]  # (value, conf, right_x, start, end)
+    found: Dict[str, Any] = {}
+    conf: Dict[str, float] = {}
+    evidence: Dict[str, Any] = {}
+
+    def _set(field: str, value: Any, c: float, i: int) -> None:
+        if field not in found:
+            found[field], conf[field] = value, round(c, 3)
+            evidence[field] = {"line": i, "bbox": lines[i].bbox}
+
+    vat_rates: List[tuple] = []
+    for i, ln in enumerate(lines):
+        for m in SCANNER.finditer(ln.text):
+            kind = m.lastgroup if m.lastgroup != "invoice_no" else "invoice"
+            c = ln.conf_for_span(m.start(), m.end())
+            if kind == "amount":
+                try:
+                    value = parse_amount(m.group("amount"))
+                except ValueError:
+                    continue
+                amounts[i].append((value, c, ln.right_for_pos(m.end() - 1), m.start(), m.end()))
+            elif kind == "date":
+                d = _parse_date(m.group("date"))
+                if d:
+                    _set("receipt_date", d, c, i)
+            elif kind == "business_id":
+                if valid_business_id(m.group("business_id")):
+                    _set("business_id", m.group("business_id"), c, i)
+            elif kind == "vat_rate":
+                rate = float(m.group("vat_rate").rstrip("% ").replace(",", "."))
+                vat_rates.append((rate, c, i))
+            elif kind == "invoice":
+                _set("invoice_number", m.group("invoice_no"), c, i)
+
+    # Kokonaissumma: suurin summa "yhteensä"-riveillä, muuten suurin summa ylipäätään
+    total_line = None
+    total_candidates = [
+        (a[0], a[1], i) for i in range(n) if TOTAL_RE.search(lines[i].text) for a in amounts[i]
+    ]
+    if not total_candidates:
+        total_candidates = [(a[0], a[1] * 0.6, i) for i in range(n) for a in amounts[i]]
+    if total_candidates:
+        value, c, total_line = max(total_candidates, key=lambda t: t[0])
+        _set("total_amount", value, c, total_line)
+
+    # ALV: tunnettu kanta ALV-riveiltä; ALV-summa on rivin pienin positiivinen summa
+    for rate, c, i in sorted(vat_rates, key=lambda t: (not VAT_RE.search(lines[t[2]].text), t[2])):
+        if rate in FI_VAT_RATES or VAT_RE.search(lines[i].text):
+            _set("vat_rate", rate, c, i)
+            positives = [a for a in amounts[i] if a[0] > 0]
+            if positives and VAT_RE.search(lines[i].text):
+                value, vc = min(positives, key=lambda a: a[0])[:2]
+                _set("vat_amount", value, vc, i)
+            break
+    if "vat_amount" not in found:
+        for i in range(n):
+            if VAT_RE.search(lines[i].text) and amounts[i] and i != total_line:
+                value, vc = min(amounts[i], key=lambda a: abs(a[0]))[:2]
+                _set("vat_amount", value, vc, i)
+                break
+
+    # Myyjä: ensimmäinen tekstirivi ennen ensimmäistä summaa
+    for i, ln in enumerate(lines[: max(1, min(4, n))]):
+        letters = sum(ch.isalpha() for ch in ln.text)
+        if letters >= 3 and not amounts[i] and letters / max(len(ln.text), 1) > 0.5:
+            _set("vendor", ln.text.strip(), float(ln.conf.mean()), i)
+            break
+
+    items = _line_items(lines, amounts, total_line, image_width)
+
+    total = found.get("total_amount")
+    vat = found.get("vat_amount")
+    rate = found.get("vat_rate")
+    net = round(total - vat, 2) if total is not None and vat is not None else None
+    items_sum = round(sum(it["total_price"] for it in items), 2) if items else None
+    checks = {
+        "items_sum_matches_total": bool(
+            items_sum is not None and total is not None and abs(items_sum - total) <= 0.02
+        ),
+        "vat_rate_known": rate in FI_VAT_RATES,
+        "vat_consistent": bool(
+            net and rate is not None and abs(net * rate / 100 - vat) <= max(0.02, 0.005 * total)
+        ),
+        "business_id_valid": "business_id" in found,
+    }
+    if items:
+        conf["items"] = round(float(np.mean([it["confidence"] for it in items])), 3)
+
+    return {
+        "vendor": found.get("vendor"),
+        "business_id": found.get("business_id"),
+        "receipt_date": found.get("receipt_date"),
+        "invoice_number": found.get("invoice_number"),
+        "total_amount": total,
+        "vat_amount": vat,
+        "vat_rate": rate,
+        "net_amount": net,
+        "currency": "EUR",
+        "items": items,
+        "field_confidence": conf,
+        "checks": checks,
+        "evidence": evidence,
+        "ocr_text": "\n".join(ln.text for ln in lines),
+    }
+
+
+def _line_items(
+    lines: List[OcrLine],
+    amounts: List[List[tuple]],
+    total_line: Optional[int],
+    image_width: int,
+) -> List[Dict[str, Any]]:
+    """Rivit, joiden hinta on samassa oikeaan tasatussa sarakkeessa ennen yhteensä-riviä."""
+    end = total_line if total_line is not None else len(lines)
+    idx = np.array(
+        [
+            i
+            for i in range(end)
+            if amounts[i]
+            and amounts[i][-1][4] >= len(lines[i].text.rstrip()) - 2
+            and not NON_ITEM_RE.search(lines[i].text)
+        ],
+        dtype=np.int64,
+    )
+    if idx.size == 0:
+        return []
+    rights = np.array([amounts[i][-1][2] for i in idx], dtype=np.float64)
+    col = np.median(rights)
+    tol = max(12.0, 0.03 * (image_width or col))
+    idx = idx[np.abs(rights - col) <= tol]
+
+    items = []
+    for i in idx:
+        ln = lines[int(i)]
+        price, c, _, start, _ = amounts[int(i)][-1]
+        name = SCANNER.sub("", ln.text[:start]).strip(" .:-*")
+        q = QTY_RE.search(ln.text[:start])
+        qty = float(q.group(1).replace(",", ".")) if q else 1.0
+        if q:
+            name = QTY_RE.sub("", name).strip(" .:-*")
+        items.append(
+            {
+                "name": name or ln.text,
+                "quantity": qty,
+                "unit_price": round(price / qty, 2) if qty else price,
+                "total_price": price,
+                "confidence": round(float(min(c, ln.conf.mean())), 3),
+                "bbox": ln.bbox,
+            }
+        )
+    return items
+
+
+def extract_receipt(b: bytes, engine: Optional[OcrEngine] = None) -> Dict[str, Any]:
+    """OCR an image and return structured receipt fields (see ``parse_receipt``)."""
+    words = run_ocr_data(b, engine)
+    return parse_receipt(group_lines(words), words.image_width)
@@ -5,11 +5,11 @@ from __future__ import annotations
 import uuid
 from typing import Callable
 
-from sqlalchemy import Column, DateTime, Float, Integer, JSON, String, Text
+from sqlalchemy import Column, DateTime, Float, Index, Integer, JSON, String, Text
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 
-from ...utils.db import Base, engine
+from ...utils.db import Base, engine, register_added_columns
 
 
 def _uuid_factory(use_native: bool) -> Callable[[], object]:
@@ -43,8 +43,14 @@ class OcrResult(Base):
     source = Column(String(16))
     raw_text = Column(Text)
     evidence_json = Column(JSON)
+    phash = Column(String(16), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (Index("ix_ocr_results_tenant_created", "tenant_id", "created_at"),)
+
+
+register_added_columns(OcrResult.__table__, "phash")
+
 
 class OcrAudit(Base):
     __tablename__ = "ocr_audit"
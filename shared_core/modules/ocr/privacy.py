@@ -1,11 +1,68 @@
-import cv2
+"""Blur faces and licence plates before images leave the service.
+
+Detection is the fixed cost of every scan, so it is kept cheap:
+
+1. Plate detection runs on a copy downscaled to ``PRIVACY_DETECT_MAX_SIDE``
+   and the boxes are mapped back to full resolution for blurring. Faces are
+   detected on a copy only as small as keeps a ``PRIVACY_FACE_MIN_PX`` face
+   (full-resolution pixels) above the cascade's 24 px window, so small faces
+   in large phone photos are not lost to the downscale.
+2. A pre-classifier skips plate detection for document-like images
+   (receipts, rating labels): almost no skin-tone pixels and either mostly
+   paper-like low-saturation bright pixels or almost no edges. The face
+   cascade still runs on them - a small face in the corner of a receipt
+   photo covers too few pixels to show up in the skin fraction.
+3. With ``PRIVACY_PARALLEL=true`` the face and plate cascades run in two
+   threads (OpenCV releases the GIL during detection).
+
+``privacy_images_total{outcome}`` shows how often blurring was needed.
+"""
+
 import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import cv2
 import numpy as np
 from PIL import Image
+from prometheus_client import Counter, Histogram
+
+DETECT_MAX_SIDE = int(os.getenv("PRIVACY_DETECT_MAX_SIDE", "960"))
+PARALLEL = os.getenv("PRIVACY_PARALLEL", "false").lower() in ("true", "1", "yes")
+SKIN_MIN_FRAC = float(os.getenv("PRIVACY_SKIN_MIN_FRAC", "0.01"))
+PAPER_MIN_FRAC = float(os.getenv("PRIVACY_PAPER_MIN_FRAC", "0.55"))
+EDGE_MIN_FRAC = 0.01
+# Pienin sumennettava kasvo täyden resoluution pikseleinä
+FACE_MIN_PX = int(os.getenv("PRIVACY_FACE_MIN_PX", "48"))
+FACE_WINDOW_PX = 24  # haarcascade_frontalface_default: 24x24 ikkuna
+
+FACE_XML = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+PLATE_XML = cv2.data.haarcascades + "haarcascade_russian_plate_number.xml"
 
+PRIVACY_IMAGES = Counter(
+    "privacy_images_total", "Images through the privacy filter", ["outcome"]
+)
+PRIVACY_REGIONS = Counter("privacy_regions_blurred_total", "Blurred regions", ["kind"])
+PRIVACY_SECONDS = Histogram(
+    "privacy_filter_seconds",
+    "Privacy filter latency",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2),
+)
 
-FACE = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
-PLATE = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_russian_plate_number.xml")
+# CascadeClassifier ei ole säieturvallinen: oma instanssi per säie
+_local = threading.local()
+_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="privacy") if PARALLEL else None
+
+
+def _cascade(name: str) -> cv2.CascadeClassifier:
+    c = getattr(_local, name, None)
+    if c is None:
+        c = cv2.CascadeClassifier(FACE_XML if name == "face" else PLATE_XML)
+        setattr(_local, name, c)
+    return c
 
 
 def _nd(b: bytes) -> np.ndarray:
@@ -18,14 +75,89 @@ def _to_bytes(img: np.ndarray) -> bytes:
     return enc.tobytes()
 
 
+def _resize(img: np.ndarray, scale: float) -> np.ndarray:
+    if scale >= 1.0:
+        return img
+    h, w = img.shape[:2]
+    return cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+
+def _downscale(img: np.ndarray) -> tuple:
+    h, w = img.shape[:2]
+    scale = min(1.0, DETECT_MAX_SIDE / max(h, w))
+    return _resize(img, scale), scale
+
+
+def looks_like_document(small: np.ndarray) -> bool:
+    """Cheap check for images that cannot contain faces or plates worth blurring."""
+    ycrcb = cv2.cvtColor(small, cv2.COLOR_BGR2YCrCb)
+    cr, cb = ycrcb[..., 1], ycrcb[..., 2]
+    skin = float(np.mean((cr >= 133) & (cr <= 173) & (cb >= 77) & (cb <= 127)))
+    if skin >= SKIN_MIN_FRAC:
+        return False
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+    paper = float(np.mean((hsv[..., 1] < 40) & (hsv[..., 2] > 150)))
+    if paper >= PAPER_MIN_FRAC:
+        return True
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    edges = float(np.mean(cv2.Canny(gray, 100, 200) > 0))
+    return edges < EDGE_MIN_FRAC
+
+
+def _detect_faces(gray: np.ndarray, scale: float) -> list:
+    side = max(FACE_WINDOW_PX, int(FACE_MIN_PX * scale))
+    return list(_cascade("face").detectMultiScale(gray, 1.2, 5, minSize=(side, side)))
+
+
+def _detect_plates(gray: np.ndarray, scale: float) -> list:
+    m = max(scale, 0.5)
+    size = (int(40 * m), int(20 * m))
+    return list(_cascade("plate").detectMultiScale(gray, 1.1, 5, minSize=size))
+
+
+def detect_regions(img: np.ndarray) -> Optional[list]:
+    """Face and plate boxes (x, y, w, h, kind) in full-resolution coordinates.
+
+    Returns None when the pre-classifier decided the image is a document
+    and the face check found nothing (plate detection was skipped).
+    """
+    small, scale = _downscale(img)
+    document = looks_like_document(small)
+    face_scale = min(1.0, max(scale, FACE_WINDOW_PX / FACE_MIN_PX))
+    face_img = small if face_scale == scale else _resize(img, face_scale)
+    face_gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
+    if document:
+        faces, plates = _detect_faces(face_gray, face_scale), []
+    elif _pool is not None:
+        plates_f = _pool.submit(_detect_plates, cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), scale)
+        faces = _detect_faces(face_gray, face_scale)
+        plates = plates_f.result()
+    else:
+        gray = face_gray if face_img is small else cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        faces, plates = _detect_faces(face_gray, face_scale), _detect_plates(gray, scale)
+    if document and not faces:
+        return None
+    return [
+        (int(x / s), int(y / s), int(np.ceil(w / s)), int(np.ceil(h / s)), kind)
+        for kind, boxes, s in (("face", faces, face_scale), ("plate", plates, scale))
+        for x, y, w, h in boxes
+    ]
+
+
 def blur_faces_and_plates(b: bytes) -> bytes:
+    t0 = time.perf_counter()
     img = _nd(b)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    boxes = list(FACE.detectMultiScale(gray, 1.2, 5, minSize=(30, 30))) + list(
-        PLATE.detectMultiScale(gray, 1.1, 5, minSize=(40, 20))
-    )
-    for x, y, w, h in boxes:
+    boxes = detect_regions(img)
+    if not boxes:
+        PRIVACY_IMAGES.labels(outcome="skipped_document" if boxes is None else "clean").inc()
+        PRIVACY_SECONDS.observe(time.perf_counter() - t0)
+        # Uudelleenpakkaus myös ilman sumennusta: poistaa EXIF-tiedot (esim. GPS)
+        return _to_bytes(img)
+    for x, y, w, h, kind in boxes:
         roi = img[y : y + h, x : x + w]
         roi = cv2.GaussianBlur(roi, (51, 51), 30)
         img[y : y + h, x : x + w] = roi
+        PRIVACY_REGIONS.labels(kind=kind).inc()
+    PRIVACY_IMAGES.labels(outcome="blurred").inc()
+    PRIVACY_SECONDS.observe(time.perf_counter() - t0)
     return _to_bytes(img)
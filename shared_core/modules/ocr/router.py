@@ -7,13 +7,13 @@ import io
 from .service import run_ocr_bytes, extract_specs, merge
 from .vision import vision_enrich
 from .privacy import blur_faces_and_plates
+from .tiering import record as record_tier
 from ..ai_common.insights import recommend_bundle
 from ...utils.storage import sha256
+from ...utils.imagehash import SAME_IMAGE_DISTANCE, phash, to_hex
 from ...utils.db import get_session
-from .store import save_result, list_results, get_result
+from .store import save_scan, list_results, get_result, find_duplicate, find_exact
 from .models import OcrResult
-from ..gamify.service import record_event
-from ..p2e.service import mint as p2e_mint
 
 
 router = APIRouter(prefix="/api/v1/ocr", tags=["ocr"])
@@ -25,21 +25,43 @@ async def ocr_power(
     device_hint: str | None = Form(None),
     hours: float = Form(1.0),
     tenant_id: str | None = Form(None),
+    force: bool = Form(False),
     db=Depends(get_session),
 ):
     raw = await file.read()
+    try:
+        image_hash = phash(raw)
+    except Exception as e:
+        raise HTTPException(400, "Kuvaa ei voitu lukea") from e
+    raw_sha = sha256(raw)
+    # Vain tavulleen sama tiedosto ohittaa OCR:n; lähes sama kuva on vihje
+    if not force:
+        r = find_exact(db, tenant_id, raw_sha)
+        if r:
+            return _duplicate_response(r, 0, hours)
+    dup = find_duplicate(db, tenant_id, image_hash)
     safe = blur_faces_and_plates(raw)
     ocr_text = run_ocr_bytes(safe)
     specs = extract_specs(ocr_text)
     vision = None
     if not specs.get("rated_watts"):
         vision = vision_enrich(safe)
+    # Tyhjä vision-vastaus kirjataan paikalliseksi, ei vision-osumaksi
+    record_tier("power", "vision_full" if vision else "local", ["rated_watts"])
     data = merge(device_hint, specs, vision)
     if not data.get("rated_watts"):
         raise HTTPException(
             422,
             "Ei löydetty tehoa – lisää laitevihje tai ota uudestaan niin, että tehotarra näkyy.",
         )
+    if dup and not force:
+        prev, distance = dup
+        if (
+            distance <= SAME_IMAGE_DISTANCE
+            and prev.rated_watts == data["rated_watts"]
+            and prev.brand_model == data.get("brand_model")
+        ):
+            return _duplicate_response(prev, distance, hours)
     wh = int(max(hours, 0.1) * data["rated_watts"])
     bundle = recommend_bundle(wh)
     resp = {
@@ -48,23 +70,37 @@ async def ocr_power(
         "analysis": {**data, "ocr_raw": ocr_text},
         "recommended_bundle": bundle,
     }
-    rec = save_result(db, tenant_id, sha256(raw), resp)
-    try:
-        # Gamify points
-        record_event(
-            db,
-            tenant_id=tenant_id,
-            kind="ocr.success",
-            points=None,
-            user_id=None,
-            meta={"result_id": str(rec.id)},
-            event_id=f"ocr_{rec.id}",
-        )
-        # P2E tokens
-        p2e_mint(db, tenant_id or "default", "user_demo", 5, "ocr_success", ref_id=str(rec.id))
-    except Exception:
-        pass
-    return {"id": str(rec.id), **resp}
+    result_id = save_scan(db, tenant_id, raw_sha, resp, phash=to_hex(image_hash))
+    return {
+        "id": result_id,
+        "duplicate": False,
+        "duplicate_of": str(dup[0].id) if dup else None,
+        "duplicate_distance": dup[1] if dup else None,
+        **resp,
+    }
+
+
+def _duplicate_response(r: OcrResult, distance: int, hours: float):
+    # Tallennettu analyysi, mutta kulutus pyydetyillä tunneilla
+    wh = int(max(hours, 0.1) * (r.rated_watts or 0))
+    return {
+        "id": str(r.id),
+        "duplicate": True,
+        "duplicate_of": str(r.id),
+        "duplicate_distance": distance,
+        "input_hours": hours,
+        "wh": wh,
+        "analysis": {
+            "device_type": r.device_type,
+            "brand_model": r.brand_model,
+            "rated_watts": r.rated_watts,
+            "peak_watts": r.peak_watts,
+            "voltage_v": r.voltage_v,
+            "current_a": r.current_a,
+            "confidence": r.confidence,
+        },
+        "recommended_bundle": recommend_bundle(wh),
+    }
 
 
 @router.get("/results")
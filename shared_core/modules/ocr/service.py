@@ -1,14 +1,11 @@
 from typing import Optional
 import re
 import io
-import os
 import cv2
 import numpy as np
 from PIL import Image
-import pytesseract
 
-
-OCR_LANG = os.getenv("OCR_LANG", "fin+eng")
+from .engines import OcrEngine, get_engine
 
 
 def _load_image(b: bytes) -> np.ndarray:
@@ -25,11 +22,14 @@ def _preprocess(img: np.ndarray) -> np.ndarray:
     return thr
 
 
-def run_ocr_bytes(b: bytes) -> str:
+def prepare_image(b: bytes, engine: OcrEngine) -> np.ndarray:
     img = _load_image(b)
-    proc = _preprocess(img)
-    cfg = "--oem 1 --psm 6"
-    return pytesseract.image_to_string(proc, lang=OCR_LANG, config=cfg)
+    return _preprocess(img) if engine.wants_binarized else img
+
+
+def run_ocr_bytes(b: bytes, engine: Optional[OcrEngine] = None) -> str:
+    engine = engine or get_engine()
+    return engine.image_to_string(prepare_image(b, engine))
 
 
 W_REGEX = re.compile(r"(\d{2,5})\s*(kW|KW|W|w|VA|va)")
@@ -44,8 +44,10 @@ def extract_specs(text: str) -> dict:
     if m:
         n, u = int(m.group(1)), m.group(2).lower()
         rated_watts = n * 1000 if u == "kw" else int(n * 0.8) if u == "va" else n
-    voltage = int(V_REGEX.search(t).group(1)) if V_REGEX.search(t) else None
-    current = float(A_REGEX.search(t).group(1)) if A_REGEX.search(t) else None
+    mv = V_REGEX.search(t)
+    ma = A_REGEX.search(t)
+    voltage = int(mv.group(1)) if mv else None
+    current = float(ma.group(1)) if ma else None
     return {"rated_watts": rated_watts, "voltage_v": voltage, "current_a": current, "ocr_raw": text}
 
 
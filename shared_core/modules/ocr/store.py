@@ -1,10 +1,18 @@
-from typing import Optional, Dict
+from typing import Any, Optional, Dict, Tuple
 from sqlalchemy.orm import Session
-from .models import OcrResult, OcrAudit
+from .models import OcrResult, OcrAudit, UUID_DEFAULT
+from ..outbox import enqueue
+from ...utils.imagehash import NearDuplicateIndex
 
+SCAN_TOKENS = 5
 
-def save_result(db: Session, tenant_id: Optional[str], sha: str, payload: Dict) -> OcrResult:
-    r = OcrResult(
+
+def _build_result(
+    tenant_id: Optional[str], sha: str, payload: Dict, phash: Optional[str] = None
+) -> OcrResult:
+    # id asetetaan heti, jotta audit-rivi voi viitata siihen ilman flushia
+    return OcrResult(
+        id=UUID_DEFAULT(),
         tenant_id=tenant_id,
         sha256=sha,
         device_type=payload["analysis"]["device_type"],
@@ -19,15 +27,87 @@ def save_result(db: Session, tenant_id: Optional[str], sha: str, payload: Dict)
         source="merged",
         raw_text=payload.get("analysis", {}).get("ocr_raw"),
         evidence_json=payload.get("analysis", {}).get("evidence"),
+        phash=phash,
     )
+
+
+def save_result(db: Session, tenant_id: Optional[str], sha: str, payload: Dict) -> OcrResult:
+    r = _build_result(tenant_id, sha, payload)
     db.add(r)
-    db.flush()
     db.add(OcrAudit(ocr_result_id=r.id, event="created", payload_json=payload))
     db.commit()
-    db.refresh(r)
     return r
 
 
+def save_scan(
+    db: Session,
+    tenant_id: Optional[str],
+    sha: str,
+    payload: Dict,
+    user_id: str = "user_demo",
+    phash: Optional[str] = None,
+) -> str:
+    """Persist a scan in one transaction and return the result id.
+
+    OcrResult, OcrAudit and a single ``ocr.scan_completed`` outbox row commit
+    together; gamification, P2E minting and notifications run later in the
+    outbox dispatcher (see modules/outbox).
+    """
+    r = _build_result(tenant_id, sha, payload, phash)
+    result_id = str(r.id)
+    db.add(r)
+    db.add(OcrAudit(ocr_result_id=r.id, event="created", payload_json=payload))
+    enqueue(
+        db,
+        "ocr.scan_completed",
+        {
+            "result_id": result_id,
+            "user_id": user_id,
+            "tokens": SCAN_TOKENS,
+            "device_type": payload["analysis"].get("device_type"),
+            "rated_watts": payload["analysis"].get("rated_watts"),
+        },
+        tenant_id=tenant_id,
+        dedupe_key=f"ocr.scan_completed:{result_id}",
+    )
+    db.commit()
+    if phash:
+        OCR_HASHES.add(tenant_id, int(phash, 16), result_id)
+    return result_id
+
+
+def _load_hashes(db: Session, tenant_id: Optional[str], since: Any):
+    q = db.query(OcrResult.phash, OcrResult.id, OcrResult.created_at).filter(
+        OcrResult.phash.isnot(None)
+    )
+    q = q.filter(OcrResult.tenant_id == tenant_id if tenant_id else OcrResult.tenant_id.is_(None))
+    if since is not None:
+        q = q.filter(OcrResult.created_at >= since)
+    return q.all()
+
+
+OCR_HASHES = NearDuplicateIndex(_load_hashes)
+
+
+def find_duplicate(
+    db: Session, tenant_id: Optional[str], phash: int
+) -> Optional[Tuple[OcrResult, int]]:
+    """Near-identical earlier scan of the same tenant as (result, hamming distance)."""
+    hit = OCR_HASHES.find(db, tenant_id, phash)
+    if not hit:
+        return None
+    distance, result_id = hit
+    r = get_result(db, result_id)
+    return (r, distance) if r else None
+
+
+def find_exact(db: Session, tenant_id: Optional[str], sha: str) -> Optional[OcrResult]:
+    """Earlier scan of the byte-identical file by the same tenant."""
+    q = db.query(OcrResult).filter(OcrResult.sha256 == sha)
+    q = q.filter(OcrResult.tenant_id == tenant_id if tenant_id else OcrResult.tenant_id.is_(None))
+    return q.order_by(OcrResult.created_at).first()
+
+
 def list_results(db: Session, tenant_id: Optional[str], limit: int = 50, offset: int = 0):
     q = db.query(OcrResult).order_by(OcrResult.created_at.desc())
     if tenant_id:
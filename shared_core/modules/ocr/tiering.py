@@ -0,0 +1,238 @@
+"""Tiered receipt extraction: local OCR first, vision only for what fails.
+
+Tiers, cheapest first:
+
+``local``
+    Every required field was read by Tesseract with enough confidence and
+    passes the consistency checks from :func:`extract.parse_receipt`
+    (totals sum or VAT matches net, VAT rate is a known Finnish rate).
+``vision_crop``
+    Only the failing fields are sent to the vision model, as a strip of
+    image regions cropped around them (the evidence box when the field was
+    read, otherwise the part of the receipt where it usually is).
+``vision_full``
+    Too many fields failed or nothing usable was read locally, so the whole
+    image goes to the vision model as before.
+
+Tier decisions are counted in ``ocr_extraction_tier_total``; the hit rate of
+a tier is its share of the pipeline total.
+"""
+
+from __future__ import annotations
+
+import base64
+import io
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image
+from prometheus_client import Counter, Histogram
+
+from .extract import FI_VAT_RATES, _parse_date, parse_amount
+
+VISION_MODEL = os.getenv("VISION_MODEL", "gpt-4o-mini")
+MIN_FIELD_CONF = float(os.getenv("OCR_MIN_FIELD_CONF", "0.80"))
+MAX_CROP_FIELDS = int(os.getenv("OCR_MAX_CROP_FIELDS", "3"))
+CROP_PAD_PX = 12
+
+REQUIRED_FIELDS = ("total_amount", "receipt_date", "vendor", "vat_rate")
+
+# Kentän tyypillinen sijainti kuitilla (ylä- ja alareuna suhteessa korkeuteen),
+# käytetään kun paikallinen OCR ei löytänyt kenttää lainkaan
+FIELD_REGIONS: Dict[str, Tuple[float, float]] = {
+    "vendor": (0.0, 0.25),
+    "business_id": (0.0, 0.35),
+    "receipt_date": (0.0, 1.0),
+    "invoice_number": (0.0, 0.4),
+    "total_amount": (0.45, 1.0),
+    "vat_amount": (0.45, 1.0),
+    "vat_rate": (0.45, 1.0),
+}
+
+FIELD_PROMPTS = {
+    "vendor": "vendor: myyjän nimi (string)",
+    "business_id": "business_id: Y-tunnus (string, muoto 1234567-8)",
+    "receipt_date": "receipt_date: päivämäärä (YYYY-MM-DD)",
+    "invoice_number": "invoice_number: kuitin numero (string)",
+    "total_amount": "total_amount: kokonaissumma (number)",
+    "vat_amount": "vat_amount: ALV summa (number)",
+    "vat_rate": "vat_rate: ALV prosentti (number)",
+}
+
+FULL_PROMPT = (
+    "Extract receipt data from this image. Return JSON with: merchant_name, date, "
+    "total_amount, vat_amount, vat_rate, items (array of {name, price})."
+)
+
+TIER_TOTAL = Counter(
+    "ocr_extraction_tier_total",
+    "Extractions by the cheapest tier that sufficed",
+    ["pipeline", "tier"],
+)
+ESCALATED_FIELDS = Counter(
+    "ocr_escalated_fields_total", "Receipt fields escalated to the vision model", ["field"]
+)
+TIER_LATENCY = Histogram(
+    "ocr_extraction_tier_seconds",
+    "Extraction latency by tier",
+    ["tier"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16),
+)
+
+
+@dataclass
+class TierDecision:
+    tier: str
+    scores: Dict[str, float]
+    failing: List[str] = field(default_factory=list)
+
+
+def field_scores(local: Dict[str, Any]) -> Dict[str, float]:
+    """Per-field score: OCR confidence, zeroed or halved when a check fails."""
+    conf = local.get("field_confidence", {})
+    checks = local.get("checks", {})
+    scores = {
+        f: float(conf.get(f, 0.0)) if local.get(f) is not None else 0.0 for f in REQUIRED_FIELDS
+    }
+    if not checks.get("vat_rate_known"):
+        scores["vat_rate"] = 0.0
+    if not (checks.get("items_sum_matches_total") or checks.get("vat_consistent")):
+        # Summaa ei voitu ristiintarkistaa: vaaditaan vision-varmistus
+        scores["total_amount"] *= 0.5
+    if local.get("vat_amount") is not None and not checks.get("vat_consistent"):
+        scores["vat_amount"] = 0.0
+    return {f: round(s, 3) for f, s in scores.items()}
+
+
+def decide(local: Dict[str, Any], min_conf: float = MIN_FIELD_CONF) -> TierDecision:
+    scores = field_scores(local)
+    failing = [f for f, s in scores.items() if s < min_conf]
+    if not failing:
+        return TierDecision("local", scores)
+    nothing_read = all(local.get(f) is None for f in REQUIRED_FIELDS)
+    if nothing_read or len(failing) > MAX_CROP_FIELDS:
+        return TierDecision("vision_full", scores, failing)
+    return TierDecision("vision_crop", scores, failing)
+
+
+def crop_fields(img_bytes: bytes, local: Dict[str, Any], fields: List[str]) -> bytes:
+    """Stack the image regions of ``fields`` vertically into one JPEG.
+
+    Evidence boxes come from the same (unscaled) image Tesseract read, so they
+    map directly onto the original. Overlapping regions are merged.
+    """
+    img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
+    w, h = img.size
+    evidence = local.get("evidence", {})
+    spans: List[List[int]] = []
+    for f in fields:
+        ev = evidence.get(f)
+        if ev:
+            _, top, _, bottom = ev["bbox"]
+        else:
+            lo, hi = FIELD_REGIONS.get(f, (0.0, 1.0))
+            top, bottom = int(lo * h), int(hi * h)
+        spans.append([max(0, top - CROP_PAD_PX), min(h, bottom + CROP_PAD_PX)])
+    spans.sort()
+    merged: List[List[int]] = []
+    for s in spans:
+        if merged and s[0] <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], s[1])
+        else:
+            merged.append(s)
+
+    crops = [img.crop((0, top, w, bottom)) for top, bottom in merged]
+    strip = Image.new("RGB", (w, sum(c.height for c in crops)), "white")
+    y = 0
+    for c in crops:
+        strip.paste(c, (0, y))
+        y += c.height
+    buf = io.BytesIO()
+    strip.save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def crop_prompt(fields: List[str]) -> str:
+    lines = "\n".join(f"- {FIELD_PROMPTS.get(f, f)}" for f in fields)
+    return (
+        "Kuvassa on rajattuja osia kuitista. Erota vain seuraavat kentät JSONina:\n"
+        f"{lines}\n"
+        "- confidence: luottamus (0.0-1.0)\n"
+        "Jos kenttää ei näy, käytä null. Ei selityksiä, vain JSON."
+    )
+
+
+async def vision_json(client: Any, img_bytes: bytes, prompt: str) -> Dict[str, Any]:
+    """One vision chat completion returning parsed JSON."""
+    b64 = base64.b64encode(img_bytes).decode()
+    response = await client.chat.completions.create(
+        model=VISION_MODEL,
+        messages=[
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{b64}"}},
+                ],
+            }
+        ],
+        response_format={"type": "json_object"},
+        temperature=0.1,
+    )
+    return json.loads(response.choices[0].message.content)
+
+
+def _coerce(f: str, value: Any) -> Any:
+    if value is None:
+        return None
+    if f in ("total_amount", "vat_amount", "vat_rate"):
+        if isinstance(value, (int, float)):
+            return float(value)
+        try:
+            return parse_amount(str(value).replace("€", "").replace("%", "").strip())
+        except ValueError:
+            return None
+    if f == "receipt_date":
+        s = str(value).strip()
+        return _parse_date(s) or (s if len(s) == 10 and s[4] == "-" else None)
+    return str(value).strip() or None
+
+
+def apply_vision_fields(
+    local: Dict[str, Any], vision: Dict[str, Any], fields: List[str]
+) -> Dict[str, Any]:
+    """Overwrite ``fields`` of the local parse with the vision answers and re-check VAT."""
+    out = dict(local)
+    conf = dict(local.get("field_confidence", {}))
+    vision_conf = vision.get("confidence")
+    for f in fields:
+        value = _coerce(f, vision.get(f))
+        if value is not None:
+            out[f] = value
+            conf[f] = float(vision_conf) if isinstance(vision_conf, (int, float)) else 0.85
+    out["field_confidence"] = conf
+    total, vat, rate = out.get("total_amount"), out.get("vat_amount"), out.get("vat_rate")
+    if total is not None and vat is not None:
+        out["net_amount"] = round(total - vat, 2)
+    checks = dict(out.get("checks", {}))
+    checks["vat_rate_known"] = rate in FI_VAT_RATES
+    net = out.get("net_amount")
+    checks["vat_consistent"] = bool(
+        net and rate is not None and vat is not None
+        and abs(net * rate / 100 - vat) <= max(0.02, 0.005 * (total or 0))
+    )
+    out["checks"] = checks
+    return out
+
+
+def record(
+    pipeline: str, tier: str, failing: Iterable[str] = (), seconds: Optional[float] = None
+) -> None:
+    TIER_TOTAL.labels(pipeline=pipeline, tier=tier).inc()
+    if tier != "local":
+        for f in failing:
+            ESCALATED_FIELDS.labels(field=f).inc()
+    if seconds is not None:
+        TIER_LATENCY.labels(tier=tier).observe(seconds)
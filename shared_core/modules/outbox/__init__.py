@@ -0,0 +1,7 @@
+"""Transactional outbox for asynchronous side effects."""
+
+from . import handlers  # noqa: F401  (registers default handlers)
+from .models import OutboxEvent
+from .service import dispatch_batch, enqueue, lag_stats, register_handler
+
+__all__ = ["OutboxEvent", "dispatch_batch", "enqueue", "lag_stats", "register_handler"]
@@ -0,0 +1,115 @@
+"""Default outbox handlers for post-scan side effects."""
+
+from __future__ import annotations
+
+import logging
+import os
+
+from sqlalchemy.orm import Session
+
+from ..gamify.service import build_event
+from ..notify import service as notify
+from ..p2e.service import stage_mint
+from .models import OutboxEvent
+from .service import enqueue, register_handler
+
+logger = logging.getLogger("converto.outbox.handlers")
+
+SCAN_NOTIFY_CHANNEL = os.getenv("OCR_SCAN_SLACK_CHANNEL")
+SCAN_NOTIFY_WHATSAPP = os.getenv("OCR_SCAN_WHATSAPP", "false").lower() in ("true", "1", "yes")
+
+
+@register_handler("ocr.scan_completed")
+def on_scan_completed(db: Session, ev: OutboxEvent) -> None:
+    """Fan a completed scan out to one event per side effect.
+
+    Children are inserted in the same transaction that marks this event done,
+    so the fan-out happens once and each child then retries independently.
+    """
+    p = ev.payload
+    rid = p["result_id"]
+    enqueue(
+        db,
+        "gamify.event",
+        {"kind": "ocr.success", "user_id": None, "meta": {"result_id": rid}},
+        tenant_id=ev.tenant_id,
+        dedupe_key=f"gamify:ocr.success:{rid}",
+    )
+    enqueue(
+        db,
+        "p2e.mint",
+        {
+            "user_id": p.get("user_id") or "user_demo",
+            "amount": p.get("tokens", 5),
+            "reason": "ocr_success",
+            "ref_id": rid,
+        },
+        tenant_id=ev.tenant_id,
+        dedupe_key=f"p2e:ocr_success:{rid}",
+    )
+    text = (
+        f"OCR: {p.get('device_type') or 'laite'} {p.get('rated_watts') or '?'} W "
+        f"({ev.tenant_id or 'default'})"
+    )
+    if SCAN_NOTIFY_CHANNEL:
+        enqueue(
+            db,
+            "notify.slack",
+            {"text": text, "channel": SCAN_NOTIFY_CHANNEL},
+            tenant_id=ev.tenant_id,
+            dedupe_key=f"slack:ocr:{rid}",
+        )
+    if SCAN_NOTIFY_WHATSAPP:
+        enqueue(
+            db,
+            "notify.whatsapp",
+            {"text": text},
+            tenant_id=ev.tenant_id,
+            dedupe_key=f"whatsapp:ocr:{rid}",
+        )
+
+
+@register_handler("gamify.event")
+def on_gamify_event(db: Session, ev: OutboxEvent) -> None:
+    p = ev.payload
+    db.add(
+        build_event(
+            ev.tenant_id,
+            p["kind"],
+            points=p.get("points"),
+            user_id=p.get("user_id"),
+            meta=p.get("meta"),
+        )
+    )
+
+
+@register_handler("p2e.mint")
+def on_p2e_mint(db: Session, ev: OutboxEvent) -> None:
+    p = ev.payload
+    ok, data = stage_mint(
+        db,
+        ev.tenant_id or "default",
+        p["user_id"],
+        int(p["amount"]),
+        p["reason"],
+        ref_id=p.get("ref_id"),
+    )
+    if not ok:
+        # Päiväraja tms. liiketoimintasääntö: ei uudelleenyritystä
+        logger.info("p2e mint skipped for %s: %s", p.get("ref_id"), data)
+
+
+@register_handler("notify.slack")
+async def on_notify_slack(db: Session, ev: OutboxEvent) -> None:
+    if not notify.SLACK_BOT_TOKEN:
+        return
+    if not await notify.send_slack(ev.payload["text"], ev.payload.get("channel")):
+        raise RuntimeError("slack_send_failed")
+
+
+@register_handler("notify.whatsapp")
+async def on_notify_whatsapp(db: Session, ev: OutboxEvent) -> None:
+    if not (notify.TWILIO_SID and notify.TWILIO_TOKEN and notify.WA_FROM and notify.WA_TO):
+        return
+    if not await notify.send_whatsapp(ev.payload["text"]):
+        raise RuntimeError("whatsapp_send_failed")
@@ -0,0 +1,27 @@
+"""Database models for the transactional outbox."""
+
+from __future__ import annotations
+
+import uuid
+from datetime import datetime
+
+from sqlalchemy import JSON, Column, DateTime, Index, Integer, String, Text
+
+from ...utils.db import Base
+
+
+class OutboxEvent(Base):
+    __tablename__ = "outbox_events"
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    tenant_id = Column(String(64), index=True, nullable=True)
+    kind = Column(String(64), nullable=False)
+    payload = Column(JSON, nullable=False, default=dict)
+    dedupe_key = Column(String(191), nullable=True, unique=True)
+    status = Column(String(16), nullable=False, default="pending")  # pending|processing|done|dead
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    # Naive UTC (datetime.utcnow), jotta lag-laskenta toimii myös SQLitellä
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
+    __table_args__ = (Index("ix_outbox_events_status_available", "status", "available_at"),)
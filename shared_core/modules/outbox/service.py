@@ -0,0 +1,205 @@
+"""Transactional outbox: enqueue side effects with the business write, dispatch later.
+
+Producers call :func:`enqueue` inside their own transaction, so the outbox row
+commits (or rolls back) together with the data it describes. A dispatcher
+(``backend/tasks/outbox_dispatcher.py``) claims due events in batches and runs
+the registered handler for each ``kind``.
+
+Handlers get ``(db, event)`` and may be sync or async. Writes a handler stages
+on ``db`` are committed in the same transaction that marks the event done, so
+database side effects happen exactly once; external calls (Slack, email) are
+at-least-once. Failures are retried with jittered exponential backoff until
+``OUTBOX_MAX_ATTEMPTS``, after which the event is marked ``dead``.
+"""
+
+from __future__ import annotations
+
+import inspect
+import logging
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.orm import Session
+
+from ...utils.db import Base, engine
+from .models import OutboxEvent
+
+logger = logging.getLogger("converto.outbox")
+
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+BASE_BACKOFF_S = float(os.getenv("OUTBOX_BASE_BACKOFF_S", "2"))
+MAX_BACKOFF_S = float(os.getenv("OUTBOX_MAX_BACKOFF_S", "900"))
+LEASE_S = int(os.getenv("OUTBOX_LEASE_S", "120"))
+
+Handler = Callable[[Session, OutboxEvent], Union[None, Awaitable[None]]]
+HANDLERS: Dict[str, Handler] = {}
+
+OUTBOX_EVENTS = Counter(
+    "outbox_events_total", "Outbox events processed", ["kind", "status"]
+)
+OUTBOX_LAG = Histogram(
+    "outbox_dispatch_lag_seconds",
+    "Seconds from enqueue to successful dispatch",
+    ["kind"],
+    buckets=(0.1, 0.5, 1, 2, 5, 10, 30, 60, 300, 900, 3600),
+)
+OUTBOX_PENDING = Gauge("outbox_pending_events", "Outbox events waiting for dispatch")
+OUTBOX_OLDEST_AGE = Gauge(
+    "outbox_oldest_pending_age_seconds", "Age of the oldest pending outbox event"
+)
+OUTBOX_DEAD = Gauge("outbox_dead_events", "Outbox events that exhausted retries")
+
+_tables_ready = False
+
+
+def ensure_tables_created() -> None:
+    global _tables_ready
+    if _tables_ready:
+        return
+    Base.metadata.create_all(bind=engine)
+    _tables_ready = True
+
+
+def register_handler(kind: str) -> Callable[[Handler], Handler]:
+    """Decorator registering the handler for an event kind."""
+
+    def _wrap(fn: Handler) -> Handler:
+        HANDLERS[kind] = fn
+        return fn
+
+    return _wrap
+
+
+def enqueue(
+    db: Session,
+    kind: str,
+    payload: Dict[str, Any],
+    tenant_id: Optional[str] = None,
+    dedupe_key: Optional[str] = None,
+    delay_s: float = 0,
+) -> OutboxEvent:
+    """Stage an outbox event on ``db``. The caller's commit publishes it."""
+    ensure_tables_created()
+    now = datetime.utcnow()
+    ev = OutboxEvent(
+        tenant_id=tenant_id,
+        kind=kind,
+        payload=payload,
+        dedupe_key=dedupe_key,
+        status="pending",
+        attempts=0,
+        available_at=now + timedelta(seconds=delay_s),
+        created_at=now,
+    )
+    db.add(ev)
+    return ev
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(MAX_BACKOFF_S, BASE_BACKOFF_S * (2 ** attempts)))
+
+
+def claim_batch(db: Session, limit: int = 100) -> List[OutboxEvent]:
+    """Lease up to ``limit`` due events to this dispatcher and commit the lease.
+
+    Events stuck in ``processing`` past their lease (crashed worker) are
+    reclaimed. On PostgreSQL concurrent dispatchers skip each other's rows.
+    """
+    ensure_tables_created()
+    now = datetime.utcnow()
+    q = (
+        select(OutboxEvent.id)
+        .where(
+            OutboxEvent.available_at <= now,
+            or_(OutboxEvent.status == "pending", OutboxEvent.status == "processing"),
+        )
+        .order_by(OutboxEvent.available_at)
+        .limit(limit)
+    )
+    if db.bind.dialect.name == "postgresql":
+        q = q.with_for_update(skip_locked=True)
+    ids = list(db.execute(q).scalars())
+    if not ids:
+        db.rollback()
+        return []
+    db.execute(
+        update(OutboxEvent)
+        .where(OutboxEvent.id.in_(ids))
+        .values(status="processing", available_at=now + timedelta(seconds=LEASE_S))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return (
+        db.query(OutboxEvent)
+        .filter(OutboxEvent.id.in_(ids))
+        .order_by(OutboxEvent.created_at)
+        .all()
+    )
+
+
+async def _run_handler(db: Session, ev: OutboxEvent) -> None:
+    handler = HANDLERS.get(ev.kind)
+    if handler is None:
+        raise LookupError(f"no handler for {ev.kind}")
+    result = handler(db, ev)
+    if inspect.isawaitable(result):
+        await result
+
+
+async def dispatch_batch(db: Session, limit: int = 100) -> int:
+    """Claim and process one batch. Returns the number of events handled."""
+    events = claim_batch(db, limit)
+    for ev in events:
+        ev_id, kind, created_at, attempts = ev.id, ev.kind, ev.created_at, ev.attempts
+        try:
+            await _run_handler(db, ev)
+            now = datetime.utcnow()
+            ev.status = "done"
+            ev.processed_at = now
+            ev.last_error = None
+            db.commit()
+            OUTBOX_EVENTS.labels(kind=kind, status="done").inc()
+            OUTBOX_LAG.labels(kind=kind).observe((now - created_at).total_seconds())
+        except Exception as e:
+            db.rollback()
+            attempts += 1
+            dead = attempts >= MAX_ATTEMPTS
+            db.execute(
+                update(OutboxEvent)
+                .where(OutboxEvent.id == ev_id)
+                .values(
+                    status="dead" if dead else "pending",
+                    attempts=attempts,
+                    last_error=f"{type(e).__name__}: {e}"[:2000],
+                    available_at=datetime.utcnow() + timedelta(seconds=backoff_seconds(attempts)),
+                )
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            OUTBOX_EVENTS.labels(kind=kind, status="dead" if dead else "retry").inc()
+            log = logger.error if dead else logger.warning
+            log("outbox %s (%s) attempt %s failed: %s", ev_id, kind, attempts, e)
+    return len(events)
+
+
+def lag_stats(db: Session) -> Dict[str, Any]:
+    """Pending/dead counts and oldest pending age; also updates the gauges."""
+    ensure_tables_created()
+    pending, oldest = db.execute(
+        select(func.count(OutboxEvent.id), func.min(OutboxEvent.created_at)).where(
+            OutboxEvent.status.in_(("pending", "processing"))
+        )
+    ).one()
+    dead = db.execute(
+        select(func.count(OutboxEvent.id)).where(OutboxEvent.status == "dead")
+    ).scalar_one()
+    age = (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0
+    OUTBOX_PENDING.set(pending)
+    OUTBOX_OLDEST_AGE.set(age)
+    OUTBOX_DEAD.set(dead)
+    return {"pending": pending, "dead": dead, "oldest_pending_age_s": round(age, 3)}
@@ -1,7 +1,7 @@
 from typing import Optional, Tuple, Dict
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, update
 from .models import P2EWallet, P2ETokenLedger, P2EQuest
 from ...utils.db import Base, engine
 import os
@@ -56,7 +56,7 @@ def _ensure_wallet(db: Session, tenant_id: str, user_id: str) -> P2EWallet:
     return wallet
 
 
-def mint(
+def stage_mint(
     db: Session,
     tenant_id: str,
     user_id: str,
@@ -64,7 +64,11 @@ def mint(
     reason: str,
     ref_id: Optional[str] = None,
 ) -> Tuple[bool, Dict]:
-    """Mint tokens. Returns (success, data/error)."""
+    """Apply a mint to the session without committing (unit-of-work callers commit).
+
+    The wallet is incremented with a single ``UPDATE ... RETURNING balance``
+    instead of a read-modify-write, so no refresh is needed afterwards.
+    """
     ensure_tables_created()
     if amount <= 0:
         return False, {"error": "amount must be positive"}
@@ -74,17 +78,37 @@ def mint(
     if today_minted + amount > MAX_MINT_PER_DAY:
         return False, {"error": "mint_limit_reached", "limit": MAX_MINT_PER_DAY}
 
-    wallet = _ensure_wallet(db, tenant_id, user_id)
-    wallet.balance += amount
-
-    ledger_entry = P2ETokenLedger(
-        tenant_id=tenant_id, user_id=user_id, delta=amount, reason=reason, ref_id=ref_id
+    balance = db.execute(
+        update(P2EWallet)
+        .where(P2EWallet.tenant_id == tenant_id, P2EWallet.user_id == user_id)
+        .values(balance=P2EWallet.balance + amount)
+        .returning(P2EWallet.balance)
+    ).scalar_one_or_none()
+    if balance is None:
+        db.add(P2EWallet(tenant_id=tenant_id, user_id=user_id, balance=amount))
+        balance = amount
+
+    db.add(
+        P2ETokenLedger(
+            tenant_id=tenant_id, user_id=user_id, delta=amount, reason=reason, ref_id=ref_id
+        )
     )
-    db.add(ledger_entry)
-    db.commit()
-    db.refresh(wallet)
+    return True, {"balance": balance, "delta": amount}
+
 
-    return True, {"balance": wallet.balance, "delta": amount}
+def mint(
+    db: Session,
+    tenant_id: str,
+    user_id: str,
+    amount: int,
+    reason: str,
+    ref_id: Optional[str] = None,
+) -> Tuple[bool, Dict]:
+    """Mint tokens. Returns (success, data/error)."""
+    ok, data = stage_mint(db, tenant_id, user_id, amount, reason, ref_id=ref_id)
+    if ok:
+        db.commit()
+    return ok, data
 
 
 def burn(
@@ -0,0 +1,344 @@
+"""Bulk receipt ingestion (NDJSON / CSV) for historical imports, e.g. from Netvisor.
+
+Rows are validated column-wise in batches and written with PostgreSQL ``COPY``
+when available, falling back to a single ``executemany`` insert on other
+databases. Invalid rows are reported back without aborting the batch.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import logging
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .features import invalidate_spending_features
+from .models import UUID_DEFAULT, Receipt
+from .store import build_search_text
+
+logger = logging.getLogger("converto.receipts.bulk")
+
+BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+# Netvisor-viennin sarakkeet (ks. NetvisorAdapter.export_receipts_csv) -> Receipt-kentät
+COLUMN_ALIASES = {
+    "date": "receipt_date",
+    "receipt_date": "receipt_date",
+    "vendor": "vendor",
+    "amount": "total_amount",
+    "total": "total_amount",
+    "total_amount": "total_amount",
+    "vat": "vat_amount",
+    "vat_amount": "vat_amount",
+    "vat_rate": "vat_rate",
+    "net_amount": "net_amount",
+    "category": "category",
+    "subcategory": "subcategory",
+    "description": "description",
+    "invoice_number": "invoice_number",
+    "payment_method": "payment_method",
+    "currency": "currency",
+    "status": "status",
+    "items": "items",
+}
+
+COPY_COLUMNS = [
+    "id",
+    "tenant_id",
+    "vendor",
+    "total_amount",
+    "vat_amount",
+    "vat_rate",
+    "net_amount",
+    "receipt_date",
+    "invoice_number",
+    "payment_method",
+    "currency",
+    "items",
+    "confidence",
+    "vision_ai_model",
+    "category",
+    "subcategory",
+    "tags",
+    "status",
+    "is_deductible",
+    "is_reimbursable",
+    "created_by",
+    "search_text",
+]
+
+DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y", "%d.%m.%y")
+
+# Syöte dekoodataan errors="replace":lla; korvausmerkin sisältävä rivi hylätään rivivirheenä
+REPLACEMENT_CHAR = "\ufffd"
+
+
+@dataclass
+class IngestResult:
+    inserted: int = 0
+    failed: int = 0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+
+    def add_error(self, row: int, error: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": error})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+def _normalize(raw: Dict[str, Any]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for k, v in raw.items():
+        key = COLUMN_ALIASES.get(str(k).strip().lower())
+        if key and v not in ("", None):
+            out[key] = v.strip() if isinstance(v, str) else v
+    return out
+
+
+def iter_ndjson(lines: Iterable[str]) -> Iterator[Tuple[int, Optional[Dict[str, Any]], str]]:
+    """Yield (row_number, record, error) tuples from NDJSON lines.
+
+    Lines with undecodable bytes (see :data:`REPLACEMENT_CHAR`) are reported
+    as ``invalid_utf8``.
+    """
+    for n, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        if REPLACEMENT_CHAR in line:
+            yield n, None, "invalid_utf8"
+            continue
+        try:
+            obj = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield n, None, f"invalid_json: {e.msg}"
+            continue
+        if not isinstance(obj, dict):
+            yield n, None, "invalid_json: expected object"
+            continue
+        yield n, _normalize(obj), ""
+
+
+def iter_csv(lines: Iterable[str]) -> Iterator[Tuple[int, Optional[Dict[str, Any]], str]]:
+    """Yield (row_number, record, error) tuples from CSV lines with a header row.
+
+    Delimiter (``,`` or ``;``) is sniffed from the header. Rows with
+    undecodable bytes (see :data:`REPLACEMENT_CHAR`) are reported as
+    ``invalid_utf8``.
+    """
+    it = iter(lines)
+    header = next(it, "")
+    delimiter = ";" if header.count(";") > header.count(",") else ","
+    fieldnames = next(csv.reader([header], delimiter=delimiter), [])
+    reader = csv.DictReader(it, fieldnames=fieldnames, delimiter=delimiter)
+    for n, row in enumerate(reader, start=2):
+        if None in row:
+            yield n, None, "too_many_columns"
+            continue
+        if any(REPLACEMENT_CHAR in v for v in row.values() if isinstance(v, str)):
+            yield n, None, "invalid_utf8"
+            continue
+        yield n, _normalize(row), ""
+
+
+def _to_float(value: Any) -> float:
+    if value is None:
+        return np.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace("\u00a0", "").replace(" ", "").replace(",", "."))
+    except ValueError:
+        return np.inf  # erotetaan puuttuvasta arvosta virheilmoitusta varten
+
+
+def _to_date(value: Any) -> Optional[date]:
+    if isinstance(value, date):
+        return value
+    if not value:
+        return None
+    s = str(value)[:10]
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def validate_batch(
+    rows: List[Tuple[int, Dict[str, Any]]],
+    tenant_id: Optional[str],
+    created_by: Optional[str],
+    result: IngestResult,
+) -> List[Dict[str, Any]]:
+    """Validate a batch column-wise and return insertable Receipt row dicts."""
+    if not rows:
+        return []
+
+    total = np.array([_to_float(r.get("total_amount")) for _, r in rows], dtype=np.float64)
+    vat = np.array([_to_float(r.get("vat_amount")) for _, r in rows], dtype=np.float64)
+    rate = np.array([_to_float(r.get("vat_rate")) for _, r in rows], dtype=np.float64)
+    net = np.array([_to_float(r.get("net_amount")) for _, r in rows], dtype=np.float64)
+    dates = [_to_date(r.get("receipt_date")) for _, r in rows]
+    has_vendor = np.array([bool(r.get("vendor")) for _, r in rows])
+    has_date = np.array([d is not None for d in dates])
+    # NDJSON voi tuoda valuutan numerona (esim. ISO 4217 -koodi 978); vain tekstikoodi kelpaa
+    bad_currency = np.array([not isinstance(r.get("currency") or "EUR", str) for _, r in rows])
+
+    # Johda puuttuvat ALV-kentät: net = total - vat, rate = vat / net
+    net = np.where(np.isnan(net) & np.isfinite(total) & np.isfinite(vat), total - vat, net)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        derived_rate = np.round(vat / net * 100, 1)
+    rate = np.where(np.isnan(rate) & np.isfinite(derived_rate), derived_rate, rate)
+
+    bad_total = ~np.isfinite(total)
+    bad_number = np.isinf(vat) | np.isinf(rate) | np.isinf(net)
+    vat_too_large = np.isfinite(vat) & np.isfinite(total) & (np.abs(vat) > np.abs(total))
+    ok = has_vendor & has_date & ~bad_total & ~bad_number & ~bad_currency & ~vat_too_large
+
+    records: List[Dict[str, Any]] = []
+    for i, (n, r) in enumerate(rows):
+        if not ok[i]:
+            if not has_vendor[i]:
+                result.add_error(n, "vendor_required")
+            elif not has_date[i]:
+                result.add_error(n, "invalid_date")
+            elif bad_total[i]:
+                result.add_error(n, "invalid_total_amount")
+            elif bad_number[i]:
+                result.add_error(n, "invalid_number")
+            elif bad_currency[i]:
+                result.add_error(n, "invalid_currency")
+            else:
+                result.add_error(n, "vat_exceeds_total")
+            continue
+        items = r.get("items")
+        if isinstance(items, str):
+            try:
+                items = json.loads(items)
+            except json.JSONDecodeError:
+                items = None
+        if not isinstance(items, list):
+            items = [{"name": r["description"]}] if r.get("description") else []
+        vendor = str(r["vendor"])[:255]
+        records.append(
+            {
+                "id": UUID_DEFAULT(),
+                "tenant_id": tenant_id,
+                "vendor": vendor,
+                "total_amount": float(total[i]),
+                "vat_amount": None if np.isnan(vat[i]) else float(vat[i]),
+                "vat_rate": None if np.isnan(rate[i]) else float(rate[i]),
+                "net_amount": None if np.isnan(net[i]) else float(net[i]),
+                "receipt_date": dates[i],
+                "invoice_number": r.get("invoice_number"),
+                "payment_method": r.get("payment_method"),
+                "currency": (r.get("currency") or "EUR")[:3],
+                "items": items,
+                "confidence": 1.0,
+                "vision_ai_model": "import",
+                "category": r.get("category"),
+                "subcategory": r.get("subcategory"),
+                "tags": [],
+                "status": r.get("status") or "processed",
+                "is_deductible": True,
+                "is_reimbursable": False,
+                "created_by": created_by,
+                "search_text": build_search_text(vendor, items),
+                "_row": n,
+            }
+        )
+    return records
+
+
+def _copy_value(v: Any) -> Any:
+    if isinstance(v, (list, dict)):
+        return json.dumps(v, ensure_ascii=False)
+    if v is not None and not isinstance(v, (str, int, float, bool, date)):
+        return str(v)
+    return v
+
+
+def _copy_rows(db: Session, records: List[Dict[str, Any]]) -> bool:
+    """Write records via COPY FROM STDIN. Returns False if the driver can't COPY."""
+    dbapi_conn = db.connection().connection.driver_connection
+    driver = type(dbapi_conn).__module__.split(".")[0]
+    cols = ", ".join(COPY_COLUMNS)
+    if driver == "psycopg":
+        with dbapi_conn.cursor() as cur, cur.copy(f"COPY receipts ({cols}) FROM STDIN") as copy:
+            for rec in records:
+                copy.write_row([_copy_value(rec[c]) for c in COPY_COLUMNS])
+        return True
+    if driver == "psycopg2":
+        buf = io.StringIO()
+        w = csv.writer(buf)
+        for rec in records:
+            w.writerow(["\\N" if rec[c] is None else _copy_value(rec[c]) for c in COPY_COLUMNS])
+        buf.seek(0)
+        with dbapi_conn.cursor() as cur:
+            cur.copy_expert(f"COPY receipts ({cols}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buf)
+        return True
+    return False
+
+
+def write_batch(db: Session, records: List[Dict[str, Any]], result: IngestResult) -> None:
+    """Insert one validated batch; on failure retry row by row to isolate bad rows."""
+    if not records:
+        return
+    rows = [{k: v for k, v in rec.items() if k != "_row"} for rec in records]
+    try:
+        copied = db.bind.dialect.name == "postgresql" and _copy_rows(db, records)
+        if not copied:
+            db.execute(Receipt.__table__.insert(), rows)
+        db.commit()
+        result.inserted += len(rows)
+        return
+    except Exception as e:
+        db.rollback()
+        logger.warning("bulk batch of %s rows failed, retrying per row: %s", len(rows), e)
+
+    for rec, row in zip(records, rows):
+        try:
+            with db.begin_nested():
+                db.execute(Receipt.__table__.insert(), [row])
+            result.inserted += 1
+        except Exception as e:
+            result.add_error(rec["_row"], f"db_error: {type(e).__name__}")
+    db.commit()
+
+
+def ingest(
+    db: Session,
+    parsed: Iterable[Tuple[int, Optional[Dict[str, Any]], str]],
+    tenant_id: Optional[str],
+    created_by: Optional[str] = None,
+    batch_size: int = BATCH_SIZE,
+) -> IngestResult:
+    """Validate and write parsed rows in batches of ``batch_size``."""
+    result = IngestResult()
+    batch: List[Tuple[int, Dict[str, Any]]] = []
+    for n, rec, err in parsed:
+        if rec is None:
+            result.add_error(n, err)
+            continue
+        batch.append((n, rec))
+        if len(batch) >= batch_size:
+            write_batch(db, validate_batch(batch, tenant_id, created_by, result), result)
+            batch = []
+    write_batch(db, validate_batch(batch, tenant_id, created_by, result), result)
+    invalidate_spending_features(tenant_id)
+    return result
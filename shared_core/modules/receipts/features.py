@@ -0,0 +1,363 @@
+"""Per-tenant spending features precomputed from receipts.
+
+Agents and dashboards need the same aggregates (spend by category, vendor
+and VAT rate over rolling windows, weekly series, recurring vendors). This
+module keeps them per tenant in process:
+
+* one ``GROUP BY (day, category, vendor, vat_rate, is_deductible)`` query
+  loads ``FEATURE_HORIZON_DAYS`` of daily aggregates;
+* later reads top the tenant up incrementally from receipts created after
+  its watermark (checked at most every ``FEATURE_REFRESH_S``); edits and
+  deletes are detected from a (count, newest updated_at) digest and trigger
+  a rebuild;
+* views (windows, series, recurring vendors) are computed once per data
+  version and day, so reads after that are dictionary lookups.
+
+Use :func:`get_spending_features`; the returned :class:`SpendingFeatures`
+is a read-only snapshot.
+"""
+
+from __future__ import annotations
+
+import os
+import statistics
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .models import Receipt
+
+HORIZON_DAYS = int(os.getenv("FEATURE_HORIZON_DAYS", "400"))
+REFRESH_S = float(os.getenv("FEATURE_REFRESH_S", "10"))
+MAX_TENANTS = int(os.getenv("FEATURE_MAX_TENANTS", "256"))
+
+# (category, vendor, vat_rate, is_deductible)
+Key = Tuple[str, str, Optional[float], bool]
+# amount, vat, count, confidence sum
+AMOUNT, VAT, COUNT, CONF = range(4)
+
+
+def _day(value: Any) -> date:
+    # SQLite palauttaa päivän merkkijonona ryhmittelyssä
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _rate(value: Any) -> Optional[float]:
+    return round(float(value), 1) if value is not None else None
+
+
+def _empty_totals() -> Dict[str, float]:
+    return {"amount": 0.0, "vat": 0.0, "net": 0.0, "count": 0, "confidence_sum": 0.0}
+
+
+def _add(target: Dict[str, float], v: List[float]) -> None:
+    target["amount"] += v[AMOUNT]
+    target["vat"] += v[VAT]
+    target["net"] += v[AMOUNT] - v[VAT]
+    target["count"] += int(v[COUNT])
+    target["confidence_sum"] += v[CONF]
+
+
+class SpendingFeatures:
+    """Snapshot of one tenant's daily aggregates plus memoised views."""
+
+    def __init__(
+        self, tenant_id: str, daily: Dict[date, Dict[Key, List[float]]], today: date
+    ):
+        self.tenant_id = tenant_id
+        self.today = today
+        self._daily = daily
+        self._views: Dict[Any, Any] = {}
+
+    def _memo(self, key: Any, build) -> Any:
+        if key not in self._views:
+            self._views[key] = build()
+        return self._views[key]
+
+    def window(self, days: int = 30) -> Dict[str, Any]:
+        """Totals and breakdowns over the last ``days`` days (today included)."""
+        return self._memo(("window", days), lambda: self._build_window(days))
+
+    def _build_window(self, days: int) -> Dict[str, Any]:
+        start = self.today - timedelta(days=days - 1)
+        totals = _empty_totals()
+        deductible = _empty_totals()
+        dims: Dict[str, Dict[Any, Dict[str, float]]] = {
+            "by_category": defaultdict(_empty_totals),
+            "by_vendor": defaultdict(_empty_totals),
+            "by_vat_rate": defaultdict(_empty_totals),
+            "deductible_by_vat_rate": defaultdict(_empty_totals),
+        }
+        for day, groups in self._daily.items():
+            if day < start or day > self.today:
+                continue
+            for (category, vendor, rate, is_deductible), v in groups.items():
+                _add(totals, v)
+                _add(dims["by_category"][category], v)
+                _add(dims["by_vendor"][vendor], v)
+                rate_key = "none" if rate is None else str(rate)
+                _add(dims["by_vat_rate"][rate_key], v)
+                if is_deductible:
+                    _add(deductible, v)
+                    _add(dims["deductible_by_vat_rate"][rate_key], v)
+        return {
+            "days": days,
+            "start": start.isoformat(),
+            "end": self.today.isoformat(),
+            "totals": totals,
+            "deductible": deductible,
+            **{name: dict(values) for name, values in dims.items()},
+        }
+
+    def spending_by_category(self, days: int = 30) -> Dict[str, float]:
+        return {k: v["amount"] for k, v in self.window(days)["by_category"].items()}
+
+    def top_vendors(self, days: int = 30, limit: int = 5) -> Dict[str, float]:
+        vendors = self.window(days)["by_vendor"]
+        best = sorted(vendors.items(), key=lambda kv: kv[1]["amount"], reverse=True)[:limit]
+        return {k: v["amount"] for k, v in best}
+
+    def series(
+        self, period: str = "week", dimension: str = "category"
+    ) -> Dict[str, Dict[str, float]]:
+        """``{dimension value: {period start: amount}}`` for day/week/month periods.
+
+        Weeks are 7-day buckets counted back from today, so the newest one is
+        always complete; ``dimension`` is category, vendor, vat_rate or total.
+        """
+        return self._memo(
+            ("series", period, dimension), lambda: self._build_series(period, dimension)
+        )
+
+    def _period_start(self, day: date, period: str) -> date:
+        if period == "day":
+            return day
+        if period == "week":
+            return self.today - timedelta(days=((self.today - day).days // 7) * 7 + 6)
+        if period == "month":
+            return day.replace(day=1)
+        raise ValueError(f"unknown period: {period}")
+
+    def _build_series(self, period: str, dimension: str) -> Dict[str, Dict[str, float]]:
+        index = {"category": 0, "vendor": 1, "vat_rate": 2}.get(dimension)
+        if index is None and dimension != "total":
+            raise ValueError(f"unknown dimension: {dimension}")
+        out: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        for day, groups in self._daily.items():
+            start = self._period_start(day, period).isoformat()
+            for key, v in groups.items():
+                name = "all" if index is None else str(key[index])
+                out[name][start] += v[AMOUNT]
+        return {k: dict(sorted(v.items())) for k, v in out.items()}
+
+    def weekly_matrix(self, weeks: int) -> Tuple[List[Tuple[str, str]], np.ndarray]:
+        """``(category, vendor)`` keys and a ``keys x weeks`` matrix, column 0 = last 7 days."""
+        return self._memo(("weekly_matrix", weeks), lambda: self._build_weekly_matrix(weeks))
+
+    def _build_weekly_matrix(self, weeks: int) -> Tuple[List[Tuple[str, str]], np.ndarray]:
+        index: Dict[Tuple[str, str], int] = {}
+        cells: List[Tuple[int, int, float]] = []
+        for day, groups in self._daily.items():
+            week = (self.today - day).days // 7
+            if week < 0 or week >= weeks:
+                continue
+            for (category, vendor, _, _), v in groups.items():
+                cells.append((index.setdefault((category, vendor), len(index)), week, v[AMOUNT]))
+        matrix = np.zeros((len(index), weeks))
+        if cells:
+            rows, cols, amounts = zip(*cells)
+            np.add.at(matrix, (np.array(rows), np.array(cols)), np.array(amounts))
+        return list(index), matrix
+
+    def recurring_vendors(self, min_occurrences: int = 3) -> List[Dict[str, Any]]:
+        """Vendors charged on a steady weekly or monthly cadence with similar amounts."""
+        return self._memo(
+            ("recurring", min_occurrences), lambda: self._build_recurring(min_occurrences)
+        )
+
+    def _build_recurring(self, min_occurrences: int) -> List[Dict[str, Any]]:
+        visits: Dict[str, List[Tuple[date, float, str]]] = defaultdict(list)
+        for day, groups in self._daily.items():
+            per_vendor: Dict[str, List[Any]] = {}
+            for (category, vendor, _, _), v in groups.items():
+                entry = per_vendor.setdefault(vendor, [0.0, category])
+                entry[0] += v[AMOUNT]
+            for vendor, (amount, category) in per_vendor.items():
+                visits[vendor].append((day, amount, category))
+
+        recurring = []
+        for vendor, rows in visits.items():
+            if len(rows) < min_occurrences:
+                continue
+            rows.sort()
+            gaps = [(b[0] - a[0]).days for a, b in zip(rows, rows[1:])]
+            gap = statistics.median(gaps)
+            if 5 <= gap <= 9:
+                cadence, tolerance = "weekly", 2
+            elif 26 <= gap <= 35:
+                cadence, tolerance = "monthly", 5
+            else:
+                continue
+            regular = sum(abs(g - gap) <= tolerance for g in gaps) / len(gaps)
+            amounts = [r[1] for r in rows]
+            mean = statistics.fmean(amounts)
+            spread = statistics.pstdev(amounts) / mean if mean else 1.0
+            if regular < 0.75 or spread > 0.25:
+                continue
+            last = rows[-1][0]
+            recurring.append({
+                "vendor": vendor,
+                "category": rows[-1][2],
+                "cadence": cadence,
+                "average_amount": round(mean, 2),
+                "occurrences": len(rows),
+                "last_seen": last.isoformat(),
+                "next_expected": (last + timedelta(days=int(gap))).isoformat(),
+            })
+        recurring.sort(key=lambda r: r["average_amount"], reverse=True)
+        return recurring
+
+
+class SpendingFeatureStore:
+    """Per-tenant daily aggregates kept current from the receipts table."""
+
+    def __init__(self, max_tenants: int = MAX_TENANTS):
+        self._max_tenants = max_tenants
+        self._tenants: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _digest(self, db: Session, tenant_id: str, horizon: date) -> Tuple[int, Any]:
+        return tuple(
+            db.query(func.count(Receipt.id), func.max(Receipt.updated_at))
+            .filter(Receipt.tenant_id == tenant_id, Receipt.receipt_date >= horizon)
+            .one()
+        )
+
+    def _load(
+        self, db: Session, tenant_id: str, horizon: date, since: Any = None
+    ) -> Tuple[Dict[date, Dict[Key, List[float]]], Any, Any]:
+        """Grouped aggregates (optionally only rows created after ``since``)."""
+        category = func.coalesce(Receipt.category, "other")
+        deductible = func.coalesce(Receipt.is_deductible, True)
+        query = db.query(
+            Receipt.receipt_date,
+            category,
+            Receipt.vendor,
+            Receipt.vat_rate,
+            deductible,
+            func.sum(Receipt.total_amount),
+            func.sum(func.coalesce(Receipt.vat_amount, 0.0)),
+            func.count(Receipt.id),
+            func.sum(func.coalesce(Receipt.confidence, 0.0)),
+            func.max(Receipt.created_at),
+            func.max(Receipt.updated_at),
+        ).filter(Receipt.tenant_id == tenant_id, Receipt.receipt_date >= horizon)
+        if since is not None:
+            query = query.filter(Receipt.created_at > since)
+        query = query.group_by(
+            Receipt.receipt_date, category, Receipt.vendor, Receipt.vat_rate, deductible
+        )
+
+        daily: Dict[date, Dict[Key, List[float]]] = defaultdict(dict)
+        newest_created = newest_updated = None
+        for day, cat, vendor, rate, ded, amount, vat, count, conf, created, updated in query:
+            key = (cat, vendor, _rate(rate), bool(ded))
+            daily[_day(day)][key] = [
+                float(amount or 0), float(vat or 0), int(count), float(conf or 0)
+            ]
+            if created is not None and (newest_created is None or created > newest_created):
+                newest_created = created
+            if updated is not None and (newest_updated is None or updated > newest_updated):
+                newest_updated = updated
+        return daily, newest_created, newest_updated
+
+    def _state(self, tenant_id: str) -> Dict[str, Any]:
+        st = self._tenants.get(tenant_id)
+        if st is None:
+            st = {
+                "daily": {},
+                "watermark": None,
+                "digest": None,
+                "checked": 0.0,
+                "version": 0,
+                "snapshot": None,
+                "snap_version": -1,
+                "lock": threading.Lock(),
+            }
+            self._tenants[tenant_id] = st
+            while len(self._tenants) > self._max_tenants:
+                self._tenants.popitem(last=False)
+        self._tenants.move_to_end(tenant_id)
+        return st
+
+    def get(self, db: Session, tenant_id: str, force_refresh: bool = False) -> SpendingFeatures:
+        today = date.today()
+        with self._lock:
+            st = self._state(tenant_id)
+        with st["lock"]:
+            if force_refresh or time.monotonic() - st["checked"] >= REFRESH_S:
+                self._refresh(db, tenant_id, st, today - timedelta(days=HORIZON_DAYS))
+                st["checked"] = time.monotonic()
+            snap = st["snapshot"]
+            if snap is None or snap.today != today or st["snap_version"] != st["version"]:
+                snap = SpendingFeatures(tenant_id, st["daily"], today)
+                st["snapshot"], st["snap_version"] = snap, st["version"]
+            return snap
+
+    def _refresh(self, db: Session, tenant_id: str, st: Dict[str, Any], horizon: date) -> None:
+        digest = self._digest(db, tenant_id, horizon)
+        if digest == st["digest"]:
+            return
+        count, newest_updated = digest
+        if st["digest"] is not None and st["watermark"] is not None:
+            delta, created, updated = self._load(db, tenant_id, horizon, since=st["watermark"])
+            added = sum(int(v[COUNT]) for groups in delta.values() for v in groups.values())
+            # Pelkkiä lisäyksiä: määrä täsmää eikä vanhoja rivejä ole muokattu
+            if count == st["digest"][0] + added and newest_updated == max(
+                (u for u in (st["digest"][1], updated) if u is not None), default=None
+            ):
+                daily = {d: dict(groups) for d, groups in st["daily"].items() if d >= horizon}
+                for day, groups in delta.items():
+                    target = daily.setdefault(day, {})
+                    for key, v in groups.items():
+                        old = target.get(key)
+                        target[key] = v if old is None else [a + b for a, b in zip(old, v)]
+                self._commit(st, daily, created or st["watermark"], digest)
+                return
+        daily, created, _ = self._load(db, tenant_id, horizon)
+        self._commit(st, dict(daily), created, digest)
+
+    @staticmethod
+    def _commit(
+        st: Dict[str, Any], daily: Dict[date, Dict[Key, List[float]]], watermark: Any, digest: Any
+    ) -> None:
+        # Uusi sanakirja: aiemmin palautetut tilannekuvat pysyvät muuttumattomina
+        st["daily"], st["watermark"], st["digest"] = daily, watermark, digest
+        st["version"] += 1
+
+    def invalidate(self, tenant_id: str) -> None:
+        """Force the next read for ``tenant_id`` to re-check the database."""
+        with self._lock:
+            st = self._tenants.get(tenant_id)
+            if st is not None:
+                st["checked"] = 0.0
+
+
+_store = SpendingFeatureStore()
+
+
+def get_spending_features(
+    db: Session, tenant_id: str, force_refresh: bool = False
+) -> SpendingFeatures:
+    return _store.get(db, tenant_id, force_refresh)
+
+
+def invalidate_spending_features(tenant_id: Optional[str]) -> None:
+    if tenant_id:
+        _store.invalidate(tenant_id)
@@ -5,11 +5,24 @@ from __future__ import annotations
 import uuid
 from typing import Callable
 
-from sqlalchemy import Column, DateTime, Float, Integer, JSON, String, Text, Boolean, Date
+from sqlalchemy import (
+    DDL,
+    Column,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    JSON,
+    String,
+    Text,
+    Boolean,
+    Date,
+    event,
+)
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 
-from shared_core.utils.db import Base, engine
+from shared_core.utils.db import Base, engine, register_added_columns
 
 
 def _uuid_factory(use_native: bool) -> Callable[[], object]:
@@ -72,6 +85,40 @@ class Receipt(Base):
     reviewed_by = Column(String(64), nullable=True)
     reviewed_at = Column(DateTime(timezone=True), nullable=True)
 
+    # Haku: myyjä + tuotenimet pienaakkosina (ks. store.build_search_text)
+    search_text = Column(Text, nullable=True)
+
+    # Kuvan perceptual hash (64 bit hex, ks. utils/imagehash) lähes-duplikaattien tunnistukseen
+    phash = Column(String(16), nullable=True)
+    # Tavutarkka tiiviste: vain täsmälleen sama tiedosto ohittaa OCR:n
+    sha256 = Column(String(64), nullable=True)
+
+    __table_args__ = (
+        # Keyset-sivutus (receipt_date DESC, id DESC) tenantin sisällä
+        Index("ix_receipts_tenant_date_id", "tenant_id", "receipt_date", "id"),
+        Index("ix_receipts_tenant_category_date", "tenant_id", "category", "receipt_date", "id"),
+        Index("ix_receipts_tenant_status_date", "tenant_id", "status", "receipt_date", "id"),
+        Index("ix_receipts_tenant_amount", "tenant_id", "total_amount"),
+        Index("ix_receipts_tenant_created", "tenant_id", "created_at"),
+        Index("ix_receipts_tenant_sha256", "tenant_id", "sha256"),
+        # Trigram-indeksi nopeuttaa ILIKE '%...%' -hakua (vain PostgreSQL)
+        Index(
+            "ix_receipts_search_trgm",
+            "search_text",
+            postgresql_using="gin",
+            postgresql_ops={"search_text": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
+
+
+# Metadatan tasolla, jotta laajennus luodaan myös olemassa olevalle receipts-taululle
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+register_added_columns(Receipt.__table__, "search_text", "phash", "sha256")
+
 
 class Invoice(Base):
     """Laskujen tietomalli"""
@@ -1,12 +1,14 @@
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+from datetime import date
+from typing import Any, Dict, Optional
+import io
 import logging
 import asyncio
 import httpx
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from ...utils.db import get_session
 from ..supabase.client import get_supabase_client
@@ -15,64 +17,196 @@ from ..ocr.vision import vision_enrich
 from ..ocr.privacy import blur_faces_and_plates
 from ..ai_common.insights import recommend_bundle
 from ...utils.storage import sha256
+from ...utils.imagehash import SAME_IMAGE_DISTANCE, phash, to_hex
 from ..ocr.store import save_result
+from .bulk import ingest, iter_csv, iter_ndjson
+from .features import HORIZON_DAYS, get_spending_features
+from .store import (
+    MAX_PAGE_SIZE,
+    find_duplicate,
+    find_exact,
+    is_same_receipt,
+    receipt_to_dict,
+    save_receipt,
+)
+from .store import list_receipts as query_receipts
+from .vision_dispatcher import get_dispatcher
+from .vision_service import categorize_receipt
 
 router = APIRouter(prefix="/api/v1/receipts", tags=["receipts"])
 
 
 @router.post("/scan")
-async def scan_receipt(file: UploadFile = File(...)) -> Dict[str, Any]:
+async def scan_receipt(
+    file: UploadFile = File(...),
+    tenant_id: Optional[str] = Form(None),
+    force: bool = Form(False),
+    db=Depends(get_session),
+) -> Dict[str, Any]:
     if not file:
         raise HTTPException(status_code=400, detail="file_required")
-    # Minimal mock implementation; integrate OCR pipeline later
     content = await file.read()
     size = len(content)
-    receipt_id = f"rcpt_{int(datetime.utcnow().timestamp())}"
-    data = {
-        "id": receipt_id,
-        "vendor": "Tuntematon",
-        "total_amount": 0.0,
-        "vat_amount": 0.0,
-        "vat_rate": 24,
-        "net_amount": 0.0,
-        "receipt_date": datetime.utcnow().date().isoformat(),
-        "invoice_number": None,
-        "payment_method": None,
-        "currency": "EUR",
-        "items": [],
-        "category": "other",
-        "subcategory": None,
-        "tags": [],
-        "confidence": 0.5,
-        "status": "processed",
-    }
+    file_info = {"name": file.filename, "size": size, "content_type": file.content_type}
+    try:
+        image_hash = phash(content)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail="invalid_image") from e
+    content_sha = sha256(content)
+    # Täsmälleen sama tiedosto uudelleen: ei uutta OCR/Vision-ajoa eikä toista
+    # riviä ALV-raportteihin (force=true ohittaa tarkistuksen)
+    if not force:
+        rec = find_exact(db, tenant_id, content_sha)
+        if rec:
+            return _duplicate_response(rec, 0, file_info)
+    # Lähes sama kuva on vain vihje: saman kaupan eri kuitit näyttävät samalta
+    dup = find_duplicate(db, tenant_id, image_hash)
+    data = await get_dispatcher().process(content, "receipt")
+    if data.get("error"):
+        # Ei tallenneta: tyhjä "Tuntematon 0 €" -rivi vääristäisi ALV-summat
+        logger.warning("scan_receipt: vision failed for tenant=%s: %s", tenant_id, data["error"])
+        raise HTTPException(status_code=502, detail="vision_failed")
+    data = categorize_receipt({**data, "vendor": data.get("vendor") or "Tuntematon"})
+    if dup and not force:
+        prev, distance = dup
+        if distance <= SAME_IMAGE_DISTANCE and is_same_receipt(prev, data):
+            return _duplicate_response(prev, distance, file_info)
+    data["status"] = "processed"
+    data["phash"] = to_hex(image_hash)
+    data["sha256"] = content_sha
+    rec = save_receipt(db, tenant_id, data)
+    receipt_id = str(rec.id)
     return {
         "success": True,
+        "duplicate": False,
+        "duplicate_of": str(dup[0].id) if dup else None,
+        "duplicate_distance": dup[1] if dup else None,
         "receipt_id": receipt_id,
-        "data": data,
+        "data": receipt_to_dict(rec),
         "vision_ai": {
-            "model": "mock",
-            "processing_time_ms": 0,
-            "confidence": 0.0,
+            "model": data.get("vision_ai_model"),
+            "processing_time_ms": data.get("processing_time_ms") or 0,
+            "confidence": data.get("confidence") or 0.0,
         },
-        "file_info": {"name": file.filename, "size": size, "content_type": file.content_type},
+        "file_info": file_info,
+    }
+
+
+def _duplicate_response(rec: Any, distance: int, file_info: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "success": True,
+        "duplicate": True,
+        "duplicate_of": str(rec.id),
+        "duplicate_distance": distance,
+        "receipt_id": str(rec.id),
+        "data": receipt_to_dict(rec),
+        "file_info": file_info,
     }
 
 
 @router.get("/")
-async def list_receipts(limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
-    # Placeholder list endpoint
-    return []
+def list_receipts(
+    tenant_id: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+    category: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    min_amount: Optional[float] = Query(None),
+    max_amount: Optional[float] = Query(None),
+    q: Optional[str] = Query(None, min_length=2, max_length=128),
+    db=Depends(get_session),
+) -> Dict[str, Any]:
+    # Ilman tenanttia ei listata mitään (kuten /stats), ettei eri asiakkaiden kuitit sekoitu
+    if not tenant_id:
+        return {"items": [], "next_cursor": None}
+    try:
+        rows, next_cursor = query_receipts(
+            db,
+            tenant_id,
+            limit=limit,
+            cursor=cursor,
+            date_from=date_from,
+            date_to=date_to,
+            category=category,
+            status=status,
+            min_amount=min_amount,
+            max_amount=max_amount,
+            q=q,
+        )
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail="invalid_cursor") from e
+    return {"items": [receipt_to_dict(r) for r in rows], "next_cursor": next_cursor}
+
+
+@router.post("/bulk")
+async def bulk_ingest(
+    file: UploadFile = File(...),
+    tenant_id: Optional[str] = Form(None),
+    format: Optional[str] = Form(None),
+    db=Depends(get_session),
+) -> Dict[str, Any]:
+    """Bulk import receipts from NDJSON or CSV (e.g. Netvisor export).
+
+    Format is taken from ``format`` (``ndjson``/``csv``) or inferred from the
+    file name / content type. Invalid rows are reported per row number.
+    """
+    fmt = (format or "").lower()
+    if not fmt:
+        name = (file.filename or "").lower()
+        ctype = (file.content_type or "").lower()
+        fmt = "csv" if name.endswith(".csv") or "csv" in ctype else "ndjson"
+    if fmt not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="unsupported_format")
+
+    # Virheelliset tavut eivät saa katkaista tuontia kesken; ne raportoidaan rivikohtaisesti
+    lines = io.TextIOWrapper(file.file, encoding="utf-8-sig", errors="replace", newline="")
+    parsed = iter_csv(lines) if fmt == "csv" else iter_ndjson(lines)
+    result = await run_in_threadpool(ingest, db, parsed, tenant_id)
+    logger.info(
+        "bulk_ingest: tenant=%s format=%s inserted=%s failed=%s",
+        tenant_id,
+        fmt,
+        result.inserted,
+        result.failed,
+    )
+    return result.to_dict()
 
 
 @router.get("/stats")
-async def receipts_stats() -> Dict[str, Any]:
+async def receipts_stats(
+    tenant_id: Optional[str] = Query(None),
+    days: int = Query(365, ge=1, le=HORIZON_DAYS),
+    db=Depends(get_session),
+) -> Dict[str, Any]:
+    if not tenant_id:
+        return {
+            "total_receipts": 0,
+            "total_amount": 0.0,
+            "total_vat": 0.0,
+            "categories": [],
+            "average_confidence": 0.0,
+        }
+    features = await run_in_threadpool(get_spending_features, db, tenant_id)
+    window = features.window(days)
+    totals = window["totals"]
     return {
-        "total_receipts": 0,
-        "total_amount": 0.0,
-        "total_vat": 0.0,
-        "categories": [],
-        "average_confidence": 0.0,
+        "total_receipts": totals["count"],
+        "total_amount": round(totals["amount"], 2),
+        "total_vat": round(totals["vat"], 2),
+        "categories": [
+            {"category": name, "total_amount": round(v["amount"], 2), "count": v["count"]}
+            for name, v in sorted(
+                window["by_category"].items(), key=lambda kv: kv[1]["amount"], reverse=True
+            )
+        ],
+        "vat_rates": {rate: round(v["vat"], 2) for rate, v in window["by_vat_rate"].items()},
+        "recurring_vendors": features.recurring_vendors(),
+        "average_confidence": (
+            round(totals["confidence_sum"] / totals["count"], 3) if totals["count"] else 0.0
+        ),
+        "period_days": days,
     }
 
 
@@ -0,0 +1,240 @@
+"""Persistence and keyset-paginated queries for receipts."""
+
+from __future__ import annotations
+
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from ...utils.imagehash import NearDuplicateIndex
+from .features import invalidate_spending_features
+from .models import Receipt
+
+MAX_PAGE_SIZE = 200
+
+
+def build_search_text(vendor: Optional[str], items: Optional[List[Dict[str, Any]]]) -> str:
+    """Yhdistä myyjä ja tuotenimet yhdeksi hakukentäksi."""
+    parts = [vendor or ""]
+    for item in items or []:
+        if isinstance(item, dict) and item.get("name"):
+            parts.append(str(item["name"]))
+    return " ".join(p.strip() for p in parts if p and p.strip()).lower()
+
+
+def escape_like(value: str) -> str:
+    """Suojaa LIKE-jokerimerkit, jotta ``%`` ja ``_`` haetaan kirjaimellisesti."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def backfill_search_text(db: Session, batch_size: int = 1000) -> int:
+    """Täytä ``search_text`` riveille, jotka on tallennettu ennen hakukenttää.
+
+    Returns:
+        Päivitettyjen rivien määrä
+    """
+    updated = 0
+    while True:
+        rows = (
+            db.query(Receipt)
+            .filter(Receipt.search_text.is_(None))
+            .order_by(Receipt.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return updated
+        for r in rows:
+            # Tyhjäkin tulos on ei-NULL, joten rivi ei palaa seuraavaan erään
+            r.search_text = build_search_text(r.vendor, r.items)
+        db.commit()
+        updated += len(rows)
+
+
+def _as_date(value: Any) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str) and value:
+        return date.fromisoformat(value[:10])
+    return datetime.utcnow().date()
+
+
+def save_receipt(
+    db: Session,
+    tenant_id: Optional[str],
+    data: Dict[str, Any],
+    created_by: Optional[str] = None,
+) -> Receipt:
+    items = data.get("items") or []
+    r = Receipt(
+        tenant_id=tenant_id,
+        vendor=data.get("vendor") or "Tuntematon",
+        total_amount=float(data.get("total_amount") or 0.0),
+        vat_amount=data.get("vat_amount"),
+        vat_rate=data.get("vat_rate"),
+        net_amount=data.get("net_amount"),
+        receipt_date=_as_date(data.get("receipt_date")),
+        invoice_number=data.get("invoice_number"),
+        payment_method=data.get("payment_method"),
+        currency=data.get("currency") or "EUR",
+        items=items,
+        confidence=float(data.get("confidence") or 0.0),
+        vision_ai_model=data.get("vision_ai_model"),
+        processing_time_ms=data.get("processing_time_ms"),
+        category=data.get("category"),
+        subcategory=data.get("subcategory"),
+        tags=data.get("tags") or [],
+        status=data.get("status") or "processed",
+        created_by=created_by,
+        search_text=build_search_text(data.get("vendor"), items),
+        phash=data.get("phash"),
+        sha256=data.get("sha256"),
+    )
+    db.add(r)
+    db.commit()
+    if r.phash:
+        RECEIPT_HASHES.add(tenant_id, int(r.phash, 16), r.id)
+    invalidate_spending_features(tenant_id)
+    return r
+
+
+def _load_hashes(db: Session, tenant_id: Optional[str], since: Any):
+    query = db.query(Receipt.phash, Receipt.id, Receipt.created_at).filter(
+        Receipt.phash.isnot(None)
+    )
+    query = query.filter(
+        Receipt.tenant_id == tenant_id if tenant_id else Receipt.tenant_id.is_(None)
+    )
+    if since is not None:
+        query = query.filter(Receipt.created_at >= since)
+    return query.all()
+
+
+RECEIPT_HASHES = NearDuplicateIndex(_load_hashes)
+
+
+def find_duplicate(
+    db: Session, tenant_id: Optional[str], phash: int
+) -> Optional[Tuple[Receipt, int]]:
+    """Aiemmin tallennettu lähes sama kuva samalta tenantilta: (kuitti, hamming-etäisyys)."""
+    hit = RECEIPT_HASHES.find(db, tenant_id, phash)
+    if not hit:
+        return None
+    distance, receipt_id = hit
+    r = db.get(Receipt, receipt_id)
+    return (r, distance) if r else None
+
+
+def find_exact(db: Session, tenant_id: Optional[str], sha: str) -> Optional[Receipt]:
+    """Tavulleen sama aiemmin tallennettu tiedosto samalta tenantilta."""
+    query = db.query(Receipt).filter(Receipt.sha256 == sha)
+    query = query.filter(
+        Receipt.tenant_id == tenant_id if tenant_id else Receipt.tenant_id.is_(None)
+    )
+    return query.order_by(Receipt.created_at).first()
+
+
+def is_same_receipt(r: Receipt, data: Dict[str, Any]) -> bool:
+    """Onko uuden skannauksen myyjä, summa ja päivä samat kuin tallennetun kuitin."""
+    vendor = (data.get("vendor") or "").strip().casefold()
+    try:
+        total = float(data.get("total_amount") or 0.0)
+        day = _as_date(data.get("receipt_date")) if data.get("receipt_date") else None
+    except (TypeError, ValueError):
+        return False
+    return (
+        bool(vendor)
+        and vendor == (r.vendor or "").strip().casefold()
+        and abs(total - (r.total_amount or 0.0)) < 0.005
+        and day == r.receipt_date
+    )
+
+
+def encode_cursor(r: Receipt) -> str:
+    raw = json.dumps([r.receipt_date.isoformat(), str(r.id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[date, str]:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    d, rid = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    return date.fromisoformat(d), rid
+
+
+def list_receipts(
+    db: Session,
+    tenant_id: Optional[str],
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    category: Optional[str] = None,
+    status: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    q: Optional[str] = None,
+) -> Tuple[List[Receipt], Optional[str]]:
+    """Listaa kuitit uusimmasta vanhimpaan keyset-sivutuksella.
+
+    Järjestys on (receipt_date DESC, id DESC), joten jokainen sivu on yksi
+    indeksihaku ``ix_receipts_tenant_*_date`` -indekseihin riippumatta siitä,
+    kuinka syvällä sivutuksessa ollaan. Palauttaa rivit ja seuraavan sivun
+    kursorin (None, jos sivuja ei ole enempää).
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = db.query(Receipt).filter(
+        Receipt.tenant_id == tenant_id if tenant_id else Receipt.tenant_id.is_(None)
+    )
+    if date_from:
+        query = query.filter(Receipt.receipt_date >= date_from)
+    if date_to:
+        query = query.filter(Receipt.receipt_date <= date_to)
+    if category:
+        query = query.filter(Receipt.category == category)
+    if status:
+        query = query.filter(Receipt.status == status)
+    if min_amount is not None:
+        query = query.filter(Receipt.total_amount >= min_amount)
+    if max_amount is not None:
+        query = query.filter(Receipt.total_amount <= max_amount)
+    if q:
+        pattern = f"%{escape_like(q.strip().lower())}%"
+        query = query.filter(Receipt.search_text.ilike(pattern, escape="\\"))
+    if cursor:
+        after_date, after_id = decode_cursor(cursor)
+        query = query.filter(tuple_(Receipt.receipt_date, Receipt.id) < (after_date, after_id))
+
+    rows = (
+        query.order_by(Receipt.receipt_date.desc(), Receipt.id.desc()).limit(limit + 1).all()
+    )
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def receipt_to_dict(r: Receipt) -> Dict[str, Any]:
+    return {
+        "id": str(r.id),
+        "tenant_id": r.tenant_id,
+        "vendor": r.vendor,
+        "total_amount": r.total_amount,
+        "vat_amount": r.vat_amount,
+        "vat_rate": r.vat_rate,
+        "net_amount": r.net_amount,
+        "receipt_date": r.receipt_date.isoformat() if r.receipt_date else None,
+        "invoice_number": r.invoice_number,
+        "payment_method": r.payment_method,
+        "currency": r.currency,
+        "items": r.items or [],
+        "category": r.category,
+        "subcategory": r.subcategory,
+        "tags": r.tags or [],
+        "confidence": r.confidence,
+        "status": r.status,
+        "created_at": r.created_at.isoformat() if r.created_at else None,
+    }
@@ -0,0 +1,296 @@
+"""Async dispatcher for receipt/invoice vision calls.
+
+Three modes on top of the prompts and validation in :mod:`vision_service`:
+
+* :meth:`VisionDispatcher.process` / :meth:`process_many` - interactive scans,
+  fanned out with bounded concurrency.
+* :meth:`VisionDispatcher.process_micro_batched` - several small images
+  (e.g. receipt crops) packed into one multi-image request; the model
+  answers with one result per image in order.
+* :meth:`VisionDispatcher.backfill` - offline Batch API for nightly jobs
+  (half price, no latency requirement), resumable by batch group id.
+
+Concurrency is adaptive (AIMD): every 429 halves the in-flight limit and
+waits out ``Retry-After``; every ``VISION_INCREASE_EVERY`` successes add one
+slot back up to ``VISION_MAX_CONCURRENCY``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from openai import AsyncOpenAI, RateLimitError
+from prometheus_client import Counter, Gauge, Histogram
+
+from .vision_service import (
+    PROMPTS,
+    VISION_MODEL,
+    error_result,
+    finalize_result,
+    image_part,
+    request_body,
+)
+
+logger = logging.getLogger("converto.receipts.vision_dispatcher")
+
+MAX_CONCURRENCY = int(os.getenv("VISION_MAX_CONCURRENCY", "16"))
+MIN_CONCURRENCY = 1
+INCREASE_EVERY = int(os.getenv("VISION_INCREASE_EVERY", "10"))
+MAX_RETRIES = int(os.getenv("VISION_MAX_RETRIES", "4"))
+MICRO_BATCH_MAX_IMAGES = int(os.getenv("VISION_MICRO_BATCH_MAX_IMAGES", "4"))
+MICRO_BATCH_MAX_BYTES = int(os.getenv("VISION_MICRO_BATCH_MAX_BYTES", str(1_500_000)))
+# Yksittäinen kuva on "pieni" (mikroeräkelpoinen) tämän kokoisena
+MICRO_BATCH_ITEM_MAX_BYTES = int(os.getenv("VISION_MICRO_BATCH_ITEM_MAX_BYTES", "300000"))
+
+VISION_REQUESTS = Counter(
+    "vision_requests_total", "Vision API requests", ["mode", "outcome"]
+)
+VISION_LATENCY = Histogram(
+    "vision_request_seconds",
+    "Vision API request latency",
+    ["mode"],
+    buckets=(0.5, 1, 2, 4, 8, 16, 32, 64),
+)
+VISION_LIMIT = Gauge("vision_concurrency_limit", "Current adaptive vision concurrency limit")
+VISION_IN_FLIGHT = Gauge("vision_in_flight", "Vision requests in flight")
+
+MICRO_BATCH_PROMPT = (
+    "Kuvia on {n}. Käsittele jokainen kuva erikseen ohjeen mukaan ja vastaa JSONina "
+    '{{"results": [...]}}, jossa on täsmälleen {n} objektia kuvien järjestyksessä.\n\n'
+    "{prompt}"
+)
+
+
+class AdaptiveLimiter:
+    """Concurrency limit that shrinks on rate limiting and grows back slowly."""
+
+    def __init__(self, limit: int = MAX_CONCURRENCY, max_limit: int = MAX_CONCURRENCY):
+        self.limit = limit
+        self.max_limit = max_limit
+        self._in_flight = 0
+        self._successes = 0
+        self._cond = asyncio.Condition()
+        self._paused_until = 0.0
+        VISION_LIMIT.set(limit)
+
+    async def acquire(self) -> None:
+        async with self._cond:
+            while self._in_flight >= self.limit:
+                await self._cond.wait()
+            self._in_flight += 1
+            VISION_IN_FLIGHT.set(self._in_flight)
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def release(self) -> None:
+        async with self._cond:
+            self._in_flight -= 1
+            VISION_IN_FLIGHT.set(self._in_flight)
+            self._cond.notify_all()
+
+    def on_success(self) -> None:
+        self._successes += 1
+        if self._successes >= INCREASE_EVERY and self.limit < self.max_limit:
+            self._successes = 0
+            self.limit += 1
+            VISION_LIMIT.set(self.limit)
+
+    def on_rate_limited(self, retry_after: float) -> None:
+        self._successes = 0
+        self.limit = max(MIN_CONCURRENCY, self.limit // 2)
+        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        VISION_LIMIT.set(self.limit)
+        logger.warning("vision 429: concurrency limit -> %s, pause %.1fs", self.limit, retry_after)
+
+
+def _retry_after(e: RateLimitError, attempt: int) -> float:
+    header = getattr(getattr(e, "response", None), "headers", {}).get("retry-after")
+    try:
+        return float(header)
+    except (TypeError, ValueError):
+        return random.uniform(0, min(30.0, 1.0 * (2**attempt)))
+
+
+class VisionDispatcher:
+    def __init__(self, client: Optional[AsyncOpenAI] = None):
+        self._client = client
+        self._limiter: Optional[AdaptiveLimiter] = None
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        if self._client is None:
+            self._client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return self._client
+
+    @property
+    def limiter(self) -> AdaptiveLimiter:
+        # Luodaan ensimmäisellä käytöllä, jotta asyncio-primitiivit sidotaan ajossa olevaan looppiin
+        if self._limiter is None:
+            self._limiter = AdaptiveLimiter()
+        return self._limiter
+
+    async def _complete(self, body: Dict[str, Any], mode: str) -> Dict[str, Any]:
+        """One chat completion under the limiter, retrying 429s. Returns parsed JSON."""
+        for attempt in range(MAX_RETRIES + 1):
+            await self.limiter.acquire()
+            t0 = time.perf_counter()
+            try:
+                response = await self.client.chat.completions.create(**body)
+            except RateLimitError as e:
+                VISION_REQUESTS.labels(mode=mode, outcome="rate_limited").inc()
+                self.limiter.on_rate_limited(_retry_after(e, attempt))
+                if attempt == MAX_RETRIES:
+                    raise
+                continue
+            except Exception:
+                VISION_REQUESTS.labels(mode=mode, outcome="error").inc()
+                raise
+            finally:
+                await self.limiter.release()
+            VISION_LATENCY.labels(mode=mode).observe(time.perf_counter() - t0)
+            VISION_REQUESTS.labels(mode=mode, outcome="ok").inc()
+            self.limiter.on_success()
+            return json.loads(response.choices[0].message.content)
+        raise RuntimeError("unreachable")
+
+    async def process(self, img_bytes: bytes, kind: str = "receipt") -> Dict[str, Any]:
+        """Async counterpart of ``process_receipt`` / ``process_invoice``."""
+        start = time.time()
+        try:
+            result = await self._complete(request_body(kind, img_bytes), "single")
+            return finalize_result(kind, result, int((time.time() - start) * 1000))
+        except Exception as e:
+            return error_result(kind, str(e), int((time.time() - start) * 1000))
+
+    async def process_many(
+        self, images: Sequence[bytes], kind: str = "receipt"
+    ) -> List[Dict[str, Any]]:
+        """Fan out ``process`` over images; the limiter bounds concurrency."""
+        return list(await asyncio.gather(*(self.process(b, kind) for b in images)))
+
+    def _groups(self, images: Sequence[bytes]) -> List[List[int]]:
+        groups: List[List[int]] = []
+        current: List[int] = []
+        size = 0
+        for i, b in enumerate(images):
+            if len(b) > MICRO_BATCH_ITEM_MAX_BYTES:
+                groups.append([i])
+                continue
+            if current and (
+                len(current) >= MICRO_BATCH_MAX_IMAGES or size + len(b) > MICRO_BATCH_MAX_BYTES
+            ):
+                groups.append(current)
+                current, size = [], 0
+            current.append(i)
+            size += len(b)
+        if current:
+            groups.append(current)
+        return groups
+
+    async def _process_group(
+        self, images: Sequence[bytes], idx: List[int], kind: str
+    ) -> List[Dict[str, Any]]:
+        if len(idx) == 1:
+            return [await self.process(images[idx[0]], kind)]
+        start = time.time()
+        prompt = MICRO_BATCH_PROMPT.format(n=len(idx), prompt=PROMPTS[kind])
+        body = {
+            "model": VISION_MODEL,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [{"type": "text", "text": prompt}]
+                    + [image_part(images[i]) for i in idx],
+                }
+            ],
+            "response_format": {"type": "json_object"},
+            "temperature": 0.1,
+        }
+        try:
+            results = (await self._complete(body, "micro_batch")).get("results")
+        except Exception as e:
+            logger.warning("micro-batch of %s failed, retrying singly: %s", len(idx), e)
+            results = None
+        if not isinstance(results, list) or len(results) != len(idx):
+            # Vastaus ei vastannut kuvien määrää: käsitellään kuvat yksitellen
+            return list(await asyncio.gather(*(self.process(images[i], kind) for i in idx)))
+        ms = int((time.time() - start) * 1000)
+        return [
+            finalize_result(kind, r if isinstance(r, dict) else {}, ms) for r in results
+        ]
+
+    async def process_micro_batched(
+        self, images: Sequence[bytes], kind: str = "receipt"
+    ) -> List[Dict[str, Any]]:
+        """Like ``process_many`` but packs small images into multi-image requests."""
+        groups = self._groups(images)
+        out: List[Optional[Dict[str, Any]]] = [None] * len(images)
+        group_results = await asyncio.gather(
+            *(self._process_group(images, idx, kind) for idx in groups)
+        )
+        for idx, results in zip(groups, group_results):
+            for i, r in zip(idx, results):
+                out[i] = r
+        return out  # type: ignore[return-value]
+
+    async def backfill(
+        self,
+        items: Dict[str, bytes],
+        kind: str = "receipt",
+        on_complete: Optional[str] = None,
+        wait: bool = True,
+    ) -> Any:
+        """Offline mode: run ``items`` (custom_id -> image) through the Batch API.
+
+        With ``wait=False`` returns the batch group id right away; results
+        can be read later (also after a restart) with :meth:`backfill_results`.
+        """
+        from ..ai.batch import OpenAIBatchProcessor
+
+        processor = OpenAIBatchProcessor(client=self.client)
+        ids = list(items)
+        group_id = await processor.submit(
+            [request_body(kind, items[i]) for i in ids],
+            kind=f"vision.{kind}",
+            custom_ids=ids,
+            on_complete=on_complete,
+        )
+        logger.info("vision backfill submitted: group %s (%s images)", group_id, len(ids))
+        if not wait:
+            return group_id
+        await processor.wait(group_id)
+        return await self.backfill_results(group_id, kind)
+
+    async def backfill_results(
+        self, group_id: str, kind: str = "receipt"
+    ) -> Dict[str, Dict[str, Any]]:
+        from ..ai.batch import OpenAIBatchProcessor
+
+        processor = OpenAIBatchProcessor(client=self.client)
+        out: Dict[str, Dict[str, Any]] = {}
+        async for custom_id, body, error in processor.iter_results(group_id):
+            try:
+                content = body["choices"][0]["message"]["content"]
+                out[custom_id] = finalize_result(kind, json.loads(content), 0)
+                VISION_REQUESTS.labels(mode="batch", outcome="ok").inc()
+            except Exception:
+                out[custom_id] = error_result(kind, str(error or "batch_failed"), 0)
+                VISION_REQUESTS.labels(mode="batch", outcome="error").inc()
+        return out
+
+
+_dispatcher: Optional[VisionDispatcher] = None
+
+
+def get_dispatcher() -> VisionDispatcher:
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = VisionDispatcher()
+    return _dispatcher
@@ -54,109 +54,82 @@ INVOICE_PROMPT = (
 )
 
 
-def process_receipt(img_bytes: bytes) -> Dict[str, Any]:
-    """Käsittele kuitti Vision AI:lla"""
+def image_part(img_bytes: bytes) -> Dict[str, Any]:
+    b64 = base64.b64encode(img_bytes).decode()
+    return {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{b64}"}}
+
+
+def request_body(kind: str, img_bytes: bytes) -> Dict[str, Any]:
+    """Chat completion parametrit yhdelle kuvalle (myös Batch API:n JSONL-riville)."""
+    return {
+        "model": VISION_MODEL,
+        "messages": [
+            {
+                "role": "user",
+                "content": [{"type": "text", "text": PROMPTS[kind]}, image_part(img_bytes)],
+            }
+        ],
+        "response_format": {"type": "json_object"},
+        "temperature": 0.1,
+    }
+
+
+def finalize_result(kind: str, result: Dict[str, Any], processing_time: int) -> Dict[str, Any]:
+    """Validoi mallin JSON-vastaus ja lisää käsittelytiedot."""
+    validated_result = VALIDATORS[kind](result)
+    validated_result["processing_time_ms"] = processing_time
+    validated_result["vision_ai_model"] = VISION_MODEL
+    return validated_result
+
+
+def error_result(kind: str, error: str, processing_time: int) -> Dict[str, Any]:
+    base = {
+        "error": error,
+        "vendor": None,
+        "total_amount": None,
+        "vat_amount": None,
+        "vat_rate": None,
+        "net_amount": None,
+        "invoice_number": None,
+        "currency": "EUR",
+        "items": [],
+        "confidence": 0.0,
+        "processing_time_ms": processing_time,
+        "vision_ai_model": VISION_MODEL,
+    }
+    if kind == "invoice":
+        base.update(
+            {
+                "customer": None,
+                "invoice_date": None,
+                "due_date": None,
+                "reference_number": None,
+                "payment_terms": None,
+            }
+        )
+    else:
+        base.update({"receipt_date": None, "payment_method": None})
+    return base
+
+
+def _process(kind: str, img_bytes: bytes) -> Dict[str, Any]:
     start_time = time.time()
-    
     try:
-        b64 = base64.b64encode(img_bytes).decode()
-        
-        response = client.chat.completions.create(
-            model=VISION_MODEL,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": RECEIPT_PROMPT},
-                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{b64}"}},
-                    ],
-                }
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.1,
-        )
-        
+        response = client.chat.completions.create(**request_body(kind, img_bytes))
         result = json.loads(response.choices[0].message.content)
-        processing_time = int((time.time() - start_time) * 1000)
-        
-        # Validoi ja korjaa tulokset
-        validated_result = validate_receipt_data(result)
-        validated_result["processing_time_ms"] = processing_time
-        validated_result["vision_ai_model"] = VISION_MODEL
-        
-        return validated_result
-        
+        return finalize_result(kind, result, int((time.time() - start_time) * 1000))
     except Exception as e:
-        return {
-            "error": str(e),
-            "vendor": None,
-            "total_amount": None,
-            "vat_amount": None,
-            "vat_rate": None,
-            "net_amount": None,
-            "receipt_date": None,
-            "invoice_number": None,
-            "payment_method": None,
-            "currency": "EUR",
-            "items": [],
-            "confidence": 0.0,
-            "processing_time_ms": int((time.time() - start_time) * 1000),
-            "vision_ai_model": VISION_MODEL
-        }
+        return error_result(kind, str(e), int((time.time() - start_time) * 1000))
+
+
+def process_receipt(img_bytes: bytes) -> Dict[str, Any]:
+    """Käsittele kuitti Vision AI:lla"""
+    return _process("receipt", img_bytes)
 
 
 def process_invoice(img_bytes: bytes) -> Dict[str, Any]:
     """Käsittele lasku Vision AI:lla"""
-    start_time = time.time()
-    
-    try:
-        b64 = base64.b64encode(img_bytes).decode()
-        
-        response = client.chat.completions.create(
-            model=VISION_MODEL,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": INVOICE_PROMPT},
-                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{b64}"}},
-                    ],
-                }
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.1,
-        )
-        
-        result = json.loads(response.choices[0].message.content)
-        processing_time = int((time.time() - start_time) * 1000)
-        
-        # Validoi ja korjaa tulokset
-        validated_result = validate_invoice_data(result)
-        validated_result["processing_time_ms"] = processing_time
-        validated_result["vision_ai_model"] = VISION_MODEL
-        
-        return validated_result
-        
-    except Exception as e:
-        return {
-            "error": str(e),
-            "vendor": None,
-            "customer": None,
-            "total_amount": None,
-            "vat_amount": None,
-            "vat_rate": None,
-            "net_amount": None,
-            "invoice_date": None,
-            "due_date": None,
-            "invoice_number": None,
-            "reference_number": None,
-            "payment_terms": None,
-            "currency": "EUR",
-            "items": [],
-            "confidence": 0.0,
-            "processing_time_ms": int((time.time() - start_time) * 1000),
-            "vision_ai_model": VISION_MODEL
-        }
+    return _process("invoice", img_bytes)
 
 
 def validate_receipt_data(data: Dict[str, Any]) -> Dict[str, Any]:
@@ -291,6 +264,10 @@ def parse_date(date_str: Any) -> Optional[str]:
     return None
 
 
+PROMPTS = {"receipt": RECEIPT_PROMPT, "invoice": INVOICE_PROMPT}
+VALIDATORS = {"receipt": validate_receipt_data, "invoice": validate_invoice_data}
+
+
 def categorize_receipt(receipt_data: Dict[str, Any]) -> Dict[str, Any]:
     """Kategorisoi kuitti automaattisesti"""
     vendor = receipt_data.get("vendor", "").lower()
@@ -1,13 +1,17 @@
+import logging
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
+from sqlalchemy import Table, create_engine, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import DeclarativeBase, sessionmaker
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./local.db")
 
 engine = create_engine(DATABASE_URL, future=True)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
+logger = logging.getLogger("converto.db")
+
 
 class Base(DeclarativeBase):
     pass
@@ -19,3 +23,49 @@ def get_session():
         yield db
     finally:
         db.close()
+
+
+# create_all ei muuta olemassa olevia tauluja: myöhemmin lisätyt sarakkeet rekisteröidään tänne
+_ADDED_COLUMNS: dict[Table, list[str]] = {}
+
+
+def register_added_columns(table: Table, *names: str) -> None:
+    """Mark nullable columns added to an already deployed table.
+
+    :func:`upgrade_schema` adds them (and the table's missing indexes) to
+    databases created before the columns existed.
+    """
+    _ADDED_COLUMNS.setdefault(table, []).extend(names)
+
+
+def upgrade_schema(bind: Engine = engine) -> None:
+    """Idempotently ALTER registered columns into existing tables.
+
+    Run right after ``Base.metadata.create_all``. Tables that do not exist
+    yet are skipped (create_all already built them complete); indexes are
+    created with ``checkfirst`` so reruns are no-ops.
+    """
+    inspector = inspect(bind)
+    preparer = bind.dialect.identifier_preparer
+    with bind.begin() as conn:
+        for table, names in _ADDED_COLUMNS.items():
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for name in names:
+                if name in existing:
+                    continue
+                column = table.c[name]
+                conn.execute(
+                    text(
+                        f"ALTER TABLE {preparer.format_table(table)} "
+                        f"ADD COLUMN {preparer.format_column(column)} "
+                        f"{column.type.compile(dialect=bind.dialect)}"
+                    )
+                )
+                existing.add(name)
+                logger.info("schema upgrade: added column %s.%s", table.name, name)
+            for index in table.indexes:
+                # Indeksi luodaan vasta kun kaikki sen sarakkeet ovat taulussa
+                if all(c.name in existing for c in index.columns):
+                    index.create(conn, checkfirst=True)
@@ -0,0 +1,165 @@
+"""Perceptual image hashes and per-tenant near-duplicate lookup.
+
+``sha256`` only matches byte-identical uploads. A perceptual hash is computed
+from the decoded pixels, so the same receipt photographed twice or
+re-compressed by a phone lands within a few bits (Hamming distance) of the
+original.
+
+A near match is only a hint: different receipts printed from one store
+template can hash within a few bits of each other. Callers store the new
+upload and report the match; they skip the work only for byte-identical
+files, or for ``SAME_IMAGE_DISTANCE`` matches whose extracted fields agree.
+
+Hashes are 64-bit and stored as 16-character hex strings. Lookups use one
+BK-tree per tenant, kept in process and topped up incrementally from the
+database, so a check is O(log n) distance computations instead of a scan.
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+MAX_DISTANCE = int(os.getenv("IMAGE_DUP_MAX_DISTANCE", "6"))
+SAME_IMAGE_DISTANCE = int(os.getenv("IMAGE_DUP_SAME_DISTANCE", "1"))
+REFRESH_S = float(os.getenv("IMAGE_DUP_REFRESH_S", "10"))
+MAX_TENANTS = int(os.getenv("IMAGE_DUP_MAX_TENANTS", "256"))
+
+
+def _gray(b: bytes) -> np.ndarray:
+    img = Image.open(io.BytesIO(b))
+    img.draft("L", (256, 256))  # JPEG: dekoodaa suoraan pienennettynä
+    return np.asarray(img.convert("L"), dtype=np.float32)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.astype(np.uint8).ravel()).tobytes(), "big")
+
+
+def phash(b: bytes) -> int:
+    """DCT hash: low 8x8 frequencies of a 32x32 grayscale, thresholded at the median."""
+    small = cv2.resize(_gray(b), (32, 32), interpolation=cv2.INTER_AREA)
+    low = cv2.dct(small)[:8, :8]
+    return _bits_to_int(low > np.median(low))
+
+
+def dhash(b: bytes) -> int:
+    """Gradient hash: sign of horizontal differences on a 9x8 grayscale."""
+    small = cv2.resize(_gray(b), (9, 8), interpolation=cv2.INTER_AREA)
+    return _bits_to_int(small[:, 1:] > small[:, :-1])
+
+
+def to_hex(h: int) -> str:
+    return f"{h:016x}"
+
+
+def from_hex(s: str) -> int:
+    return int(s, 16)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """Burkhard-Keller tree over Hamming distance; values carry a payload (row id)."""
+
+    def __init__(self) -> None:
+        self._root: Optional[list] = None  # [hash, payload, {distance: child}]
+        self.size = 0
+
+    def add(self, h: int, payload: Any) -> None:
+        self.size += 1
+        if self._root is None:
+            self._root = [h, payload, {}]
+            return
+        node = self._root
+        while True:
+            d = hamming(h, node[0])
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [h, payload, {}]
+                return
+            node = child
+
+    def search(self, h: int, max_distance: int) -> List[Tuple[int, Any]]:
+        """All (distance, payload) within ``max_distance``, nearest first."""
+        out: List[Tuple[int, Any]] = []
+        stack = [self._root] if self._root else []
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= max_distance:
+                out.append((d, node[1]))
+            for cd, child in node[2].items():
+                if d - max_distance <= cd <= d + max_distance:
+                    stack.append(child)
+        out.sort(key=lambda t: t[0])
+        return out
+
+
+Loader = Callable[[Any, Optional[str], Any], Iterable[Tuple[str, Any, Any]]]
+
+
+class NearDuplicateIndex:
+    """Per-tenant BK-trees fed by ``loader(db, tenant_id, since)``.
+
+    The loader returns ``(hash_hex, row_id, created_at)`` rows created at or
+    after ``since`` (all rows when ``since`` is None). Trees are refreshed at
+    most every ``REFRESH_S`` seconds, so rows written by other workers show
+    up shortly; rows written by this process are added immediately via
+    :meth:`add`. Tenants are evicted least recently used.
+    """
+
+    def __init__(self, loader: Loader, max_tenants: int = MAX_TENANTS):
+        self._loader = loader
+        self._max_tenants = max_tenants
+        self._tenants: "OrderedDict[Optional[str], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _state(self, db: Any, tenant_id: Optional[str]) -> Dict[str, Any]:
+        with self._lock:
+            st = self._tenants.get(tenant_id)
+            if st is None:
+                st = {"tree": BKTree(), "ids": set(), "since": None, "checked": 0.0}
+                self._tenants[tenant_id] = st
+                while len(self._tenants) > self._max_tenants:
+                    self._tenants.popitem(last=False)
+            self._tenants.move_to_end(tenant_id)
+            if time.monotonic() - st["checked"] >= REFRESH_S:
+                for hex_hash, row_id, created_at in self._loader(db, tenant_id, st["since"]):
+                    self._add(st, hex_hash, row_id)
+                    if created_at is not None and (st["since"] is None or created_at > st["since"]):
+                        st["since"] = created_at
+                st["checked"] = time.monotonic()
+            return st
+
+    @staticmethod
+    def _add(st: Dict[str, Any], hex_hash: str, row_id: Any) -> None:
+        key = str(row_id)
+        if hex_hash and key not in st["ids"]:
+            st["ids"].add(key)
+            st["tree"].add(from_hex(hex_hash), key)
+
+    def find(
+        self, db: Any, tenant_id: Optional[str], h: int, max_distance: int = MAX_DISTANCE
+    ) -> Optional[Tuple[int, str]]:
+        """Nearest stored (distance, row_id) within ``max_distance``, or None."""
+        st = self._state(db, tenant_id)
+        with self._lock:
+            hits = st["tree"].search(h, max_distance)
+        return hits[0] if hits else None
+
+    def add(self, tenant_id: Optional[str], h: int, row_id: Any) -> None:
+        with self._lock:
+            st = self._tenants.get(tenant_id)
+            if st is not None:
+                self._add(st, to_hex(h), row_id)
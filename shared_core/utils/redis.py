@@ -10,10 +10,13 @@ Provides:
 
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
 import os
-from typing import Any, Optional, Callable
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional, Callable
 
 try:
     import redis  # type: ignore
@@ -24,18 +27,28 @@ logger = logging.getLogger("converto.redis")
 
 # Global Redis client instance
 _redis_client: redis.Redis | None = None
+_async_redis_client = None
+# Epäonnistuneen yhteyskokeilun jälkeen ei yritetä uudelleen ennen tätä (monotonic)
+_redis_retry_at = 0.0
+REDIS_RETRY_S = float(os.getenv("REDIS_RETRY_S", "30"))
 
 
 def get_redis_client() -> redis.Redis | None:
     """Get Redis client instance (singleton pattern).
 
+    After a failed connection attempt None is returned without retrying
+    for ``REDIS_RETRY_S`` seconds, so callers do not each wait for the
+    connect timeout while Redis is down.
+
     Returns:
         Redis client or None if not configured
     """
-    global _redis_client
+    global _redis_client, _redis_retry_at
 
     if _redis_client is not None:
         return _redis_client
+    if time.monotonic() < _redis_retry_at:
+        return None
 
     # Try to initialize Redis
     try:
@@ -73,8 +86,48 @@ def get_redis_client() -> redis.Redis | None:
         return None
     except Exception as e:
         logger.warning(f"Redis not available: {e}")
+        # Ei jätetä tavoittamatonta asiakasta singletoniksi
+        _redis_client = None
+        _redis_retry_at = time.monotonic() + REDIS_RETRY_S
+        return None
+
+
+def get_async_redis_client():
+    """Get asyncio Redis client built from the same settings (singleton pattern).
+
+    Unlike :func:`get_redis_client` the connection is not tested here;
+    the first command connects (and raises if Redis is unreachable).
+
+    Returns:
+        ``redis.asyncio.Redis`` client or None if redis is not installed
+    """
+    global _async_redis_client
+
+    if _async_redis_client is not None:
+        return _async_redis_client
+
+    if redis is None:
+        logger.warning("Redis not installed. Install with: pip install redis")
         return None
 
+    import redis.asyncio as aioredis  # type: ignore
+
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url:
+        _async_redis_client = aioredis.from_url(
+            redis_url, decode_responses=True, socket_connect_timeout=5
+        )
+    else:
+        _async_redis_client = aioredis.Redis(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", "6379")),
+            db=int(os.getenv("REDIS_DB", "0")),
+            password=os.getenv("REDIS_PASSWORD"),
+            decode_responses=True,
+            socket_connect_timeout=5,
+        )
+    return _async_redis_client
+
 
 class SessionManager:
     """Session management using Redis."""
@@ -288,18 +341,51 @@ class QueueManager:
             return 0
 
 
+class AsyncSubscription:
+    """Messages of an asyncio pub/sub subscription (see :meth:`PubSubManager.asubscribe`)."""
+
+    def __init__(self, pubsub: Any):
+        self.pubsub = pubsub
+
+    async def get(self, timeout: float | None = None) -> dict[str, Any] | None:
+        """Next message, or None if nothing arrived within ``timeout`` seconds."""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - loop.time())
+            message = await self.pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=remaining
+            )
+            # Tilausvahvistukset palautuvat None-arvoina ennen aikakatkaisua
+            if message is not None and message["type"] == "message":
+                return json.loads(message["data"])
+            if deadline is not None and loop.time() >= deadline:
+                return None
+
+
 class PubSubManager:
     """Pub/Sub messaging using Redis."""
 
-    def __init__(self, redis_client: redis.Redis | None = None):
+    def __init__(self, redis_client: redis.Redis | None = None, async_redis_client: Any = None):
         """Initialize pub/sub manager.
 
         Args:
             redis_client: Redis client (auto-connect if None)
+            async_redis_client: ``redis.asyncio`` client for the async API
+                (built from the same settings if None)
         """
         self.redis = redis_client or get_redis_client()
         self.enabled = self.redis is not None
         self.pubsub = None
+        self._thread = None
+        self._async_redis = async_redis_client
+
+    @property
+    def async_redis(self) -> Any:
+        """Asyncio client, created on first use when Redis is available."""
+        if self._async_redis is None and self.enabled:
+            self._async_redis = get_async_redis_client()
+        return self._async_redis
 
     def publish(self, channel: str, message: dict[str, Any]) -> bool:
         """Publish message to channel.
@@ -324,6 +410,9 @@ class PubSubManager:
     def subscribe(self, channel: str, callback: callable) -> bool:
         """Subscribe to channel.
 
+        Messages are delivered to ``callback`` from a background thread;
+        this call returns immediately.
+
         Args:
             channel: Channel name
             callback: Callback function(message)
@@ -334,23 +423,73 @@ class PubSubManager:
         if not self.enabled or not self.redis:
             return False
 
+        def handler(message: dict[str, Any]) -> None:
+            try:
+                callback(json.loads(message["data"]))
+            except Exception as e:
+                logger.error(f"Pub/sub callback failed on {channel}: {e}")
+
         try:
             if self.pubsub is None:
-                self.pubsub = self.redis.pubsub()
+                self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
 
-            self.pubsub.subscribe(channel)
+            self.pubsub.subscribe(**{channel: handler})
 
             # Process messages in background
-            for message in self.pubsub.listen():
-                if message["type"] == "message":
-                    data = json.loads(message["data"])
-                    callback(data)
+            if self._thread is None:
+                self._thread = self.pubsub.run_in_thread(sleep_time=0.5, daemon=True)
 
             return True
         except Exception as e:
             logger.error(f"Failed to subscribe: {e}")
             return False
 
+    async def apublish(self, channel: str, message: dict[str, Any]) -> bool:
+        """Publish message to channel without blocking the event loop.
+
+        Args:
+            channel: Channel name
+            message: Message data
+
+        Returns:
+            True if successful
+        """
+        client = self.async_redis
+        if client is None:
+            return False
+
+        try:
+            await client.publish(channel, json.dumps(message, default=str))
+            return True
+        except Exception as e:
+            logger.error(f"Failed to publish message: {e}")
+            return False
+
+    @asynccontextmanager
+    async def asubscribe(self, channel: str) -> AsyncIterator[AsyncSubscription]:
+        """Subscribe to channel for the duration of the block.
+
+        The subscription is active when the block starts, so messages
+        published after that are not missed.
+
+        Args:
+            channel: Channel name
+
+        Yields:
+            Subscription to read messages from
+        """
+        client = self.async_redis
+        if client is None:
+            raise RuntimeError("Redis pub/sub is not available")
+
+        pubsub = client.pubsub()
+        await pubsub.subscribe(channel)
+        try:
+            yield AsyncSubscription(pubsub)
+        finally:
+            await pubsub.unsubscribe(channel)
+            await pubsub.aclose()
+
 
 class AdvancedCache:
     """Advanced caching with Redis."""